@@ -1,49 +1,32 @@
 import streamlit as st
 import os
 from dotenv import load_dotenv
-import time
-from datetime import datetime
 
 # Load environment variables
 load_dotenv()
 
-# Import custom utilities
+# Import custom utilities (auth, the write queue and the navigator are imported where they are used)
 from utils.database import (
     get_filtered_songs,
-    save_user_classification,
     check_database_health,
     get_user_progress
 )
 from utils.session_manager import SessionManager
-from utils.auth import get_auth_service
 from utils.ui_components import (
     load_custom_css,
+    build_song_card_html,
+    build_player_html,
+    PLAYER_HEIGHT,
     render_song_info_card,
     render_completion_animation
 )
+from utils.telemetry import span, rerun_trace, traced, start_telemetry_exporters
+from utils.warmup import start_warmup
 
-import streamlit as st
-import os
-from dotenv import load_dotenv
-import time
-from datetime import datetime
-
-# Load environment variables
-load_dotenv()
-
-# Import custom utilities
-from utils.database import (
-    get_filtered_songs,
-    save_user_classification,
-    check_database_health,
-    get_user_progress
-)
-from utils.session_manager import SessionManager
-from utils.ui_components import (
-    load_custom_css,
-    render_song_info_card,
-    render_completion_animation
-)
+# Connect, load the catalog and start the bcrypt workers in the background (once per process)
+start_warmup()
+# Metrics endpoint/file, if configured (once per process)
+start_telemetry_exporters()
 
 def configure_page():
     """Configure Streamlit page settings"""
@@ -60,17 +43,6 @@ def configure_page():
 def render_header():
     """Render application header compacto"""
     st.markdown("""
-    <style>
-    .main-header h1 {
-        font-size: 1.7rem;
-        margin-bottom: 0.2rem;
-        margin-top: 0.5rem;
-    }
-    .main-header p {
-        font-size: 1rem;
-        margin-bottom: 0.2rem;
-    }
-    </style>
     <div class="main-header">
         <h1>🎵 Estudio de Clasificación Musical</h1>
         <p>Ayúdanos a clasificar el contenido de canciones en español</p>
@@ -117,6 +89,7 @@ def render_user_info_form():
                 # Persist to user profile if logged in
                 if st.session_state.get('authenticated'):
                     try:
+                        from utils.auth import get_auth_service
                         auth = get_auth_service()
                         auth._users.update_one(
                             {"_id": __import__('bson').objectid.ObjectId(st.session_state.account['id'])},
@@ -131,6 +104,21 @@ def render_user_info_form():
                 if not terms_accepted:
                     st.error("Por favor, acepta los términos para continuar.")
 
+def render_progress_header(current_index, total_songs):
+    """Save notices and progress metrics, as a fragment that refreshes itself while saves are pending.
+
+    Background writes finish after the rerun that queued them; polling only this
+    fragment shows their outcome without re-running the page (or the player).
+    """
+    pending = bool(st.session_state.get('pending_writes'))
+    run_every = float(os.getenv('SAVE_STATUS_REFRESH_SECONDS', '2')) if pending else None
+    st.fragment(_progress_header_fragment, run_every=run_every)(current_index, total_songs)
+
+@traced('fragment.progress_header')
+def _progress_header_fragment(current_index, total_songs):
+    render_save_status()
+    render_progress_indicator(current_index, total_songs)
+
 def render_progress_indicator(current_index, total_songs):
     """Render progress indicator"""
     progress_stats = SessionManager.get_progress_stats()
@@ -149,138 +137,114 @@ def render_progress_indicator(current_index, total_songs):
 
     st.progress(progress, text=f"Canción {current_index + 1} de {total_songs}")
 
-def render_audio_player(song):
+def render_audio_player(song, player_html=None):
     """Render solo el reproductor de YouTube usando id_yt"""
     st.subheader("🎧 Reproducir Canción")
 
     if song.get('id_yt'):
-        youtube_embed = f'''
-        <iframe width="100%" height="315"
-            src="https://www.youtube.com/embed/{song['id_yt']}"
-            frameborder="0"
-            allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture"
-            allowfullscreen>
-        </iframe>
-        '''
-        st.components.v1.html(youtube_embed, height=315)
+        youtube_embed = player_html or build_player_html(song)
+        st.components.v1.html(youtube_embed, height=PLAYER_HEIGHT)
     else:
         st.warning("⚠️ Video de YouTube no disponible para esta canción")
 
-def render_classification_form(song, song_index):
-    """Render classification form"""
-    st.subheader("📊 Clasificación")
-
-    with st.form(f"classification_form_{song_index}"):
-        # Explicit content classification
-        st.markdown("**¿Esta canción contiene contenido explícito?**")
-        st.caption("Considera lenguaje fuerte, violencia, referencias a drogas, etc.")
-        explicit_content = st.radio(
-            "Contenido explícito:",
-            ["No", "Sí", "No estoy seguro/a"],
-            key=f"explicit_{song_index}",
-            horizontal=True
-        )
-
-        # Sexual content classification
-        st.markdown("**¿Esta canción contiene contenido sexual?**")
-        st.caption("Considera referencias sexuales explícitas, insinuaciones, etc.")
-        sexual_content = st.radio(
-            "Contenido sexual:",
-            ["No", "Sí", "No estoy seguro/a"],
-            key=f"sexual_{song_index}",
-            horizontal=True
-        )
-
-        # Content suitability for children
-        st.markdown("**¿Consideras esta canción apta para niños?**")
-        st.caption("Considera referencias sexuales explícitas, insinuaciones, etc.")
-        children_suitability = st.radio(
-            "Apta para niños:",
-            ["No", "Sí", "No estoy seguro/a"],
-            key=f"children_{song_index}",
-            horizontal=True
-        )
+def get_song_markup(song, song_index):
+    """Card and player markup for a song, taken from the prefetch slot when it matches"""
+    prefetched = st.session_state.get('prefetched_song')
+    if prefetched and prefetched['index'] == song_index and prefetched['song_id'] == str(song['_id']):
+        return prefetched['card_html'], prefetched['player_html']
+    return build_song_card_html(song), build_player_html(song)
+
+def prefetch_next_song(songs):
+    """Prepare the markup of the song a submit/skip would lead to, while the user is still here"""
+    next_index = SessionManager.get_next_song_index()
+    if next_index is None:
+        st.session_state.prefetched_song = None
+        return
+    prefetched = st.session_state.get('prefetched_song')
+    if prefetched and prefetched['index'] == next_index:
+        return
+    next_song = songs[next_index]
+    st.session_state.prefetched_song = {
+        'index': next_index,
+        'song_id': str(next_song['_id']),
+        'card_html': build_song_card_html(next_song),
+        'player_html': build_player_html(next_song)
+    }
 
-        # Confidence level
-        confidence_level = st.select_slider(
-            "¿Qué tan seguro/a estás de tu clasificación?",
-            options=["Muy inseguro", "Inseguro", "Neutral", "Seguro", "Muy seguro"],
-            value="Neutral",
-            key=f"confidence_{song_index}"
-        )
+def render_save_status():
+    """Show the persistence state of the participant's recent classifications"""
+    from utils.write_queue import get_write_status
 
-        # Additional comments
-        comments = st.text_area(
-            "Comentarios adicionales (opcional):",
-            placeholder="Cualquier observación sobre la canción...",
-            key=f"comments_{song_index}",
-            max_chars=500
-        )
+    pending, flushed, failed = SessionManager.refresh_pending_writes(get_write_status)
+    for item in flushed:
+        if item['action'] == 'skipped':
+            st.toast(f"⏭️ Omitida: {item['title']}")
+        else:
+            st.toast(f"✅ Guardada: {item['title']}")
+    for item in failed:
+        # Reconcile the optimistic update: the song goes back to the unanswered pool
+        SessionManager.unmark_song(item['song_index'])
+        st.error(f"❌ No se pudo guardar tu respuesta para \"{item['title']}\". Por favor, clasifícala de nuevo.")
+    if pending:
+        st.caption(f"💾 Guardando {len(pending)} respuesta(s) en segundo plano...")
+
+def handle_classification_action(song_index, action):
+    """Form button callback: runs before the rerun, so that rerun already renders the next song"""
+    if action == 'previous':
+        if song_index - 1 >= 0:
+            SessionManager.navigate_to_song(song_index - 1)
+        return
 
-        # Form buttons
-        col1, col2, col3 = st.columns(3)
+    with span('save', action=action):
+        _save_classification(song_index, action)
+
+def _save_classification(song_index, action):
+    song = st.session_state.songs_data[song_index]
+    state = st.session_state
+    show_more = state.get(f"show_more_{song_index}", True)
+    classification_data = {
+        'explicit_content': state.get(f"explicit_{song_index}"),
+        'sexual_content': state.get(f"sexual_{song_index}") if show_more else None,
+        'children_suitability': state.get(f"children_{song_index}") if show_more else None,
+        'confidence_level': state.get(f"confidence_{song_index}") if show_more else None,
+        'comments': (state.get(f"comments_{song_index}") or "") if show_more else "",
+        'song_index': song_index,
+        'status': action,
+        'session_duration': SessionManager.get_session_duration()
+    }
+    if action == 'skipped':
+        # Guardar como omitida
+        classification_data['explicit_content'] = None
+        classification_data['sexual_content'] = None
+        classification_data['confidence_level'] = None
+        classification_data['comments'] = 'skipped'
 
-        with col1:
-            submit_button = st.form_submit_button(
-                "✅ Enviar Clasificación",
-                use_container_width=True,
-                type="primary"
-            )
+    from utils.write_queue import enqueue_classification
 
-        with col2:
-            skip_button = st.form_submit_button(
-                "⏭️ Omitir Canción",
-                use_container_width=True
-            )
+    # Persisted in the background; render_save_status reconciles the outcome later
+    event_id = enqueue_classification(SessionManager.get_user_data(), song, classification_data)
+    SessionManager.track_pending_write(event_id, song['title_songs_new'], action, song_index)
+    SessionManager.mark_song_completed(song_index, action)
+    SessionManager.update_activity()
 
-        with col3:
-            if song_index > 0:
-                prev_button = st.form_submit_button(
-                    "⬅️ Anterior",
-                    use_container_width=True
-                )
-            else:
-                prev_button = False
-
-        return submit_button, skip_button, prev_button, {
-            'explicit_content': explicit_content,
-            'sexual_content': sexual_content,
-            'children_suitability': children_suitability,
-            'confidence_level': confidence_level,
-            'comments': comments,
-            'song_index': song_index
-        }
-
-def handle_classification_submission(song, classification_data):
-    """Handle the submission of a classification"""
-    user_data = SessionManager.get_user_data()
-
-    # Add session duration
-    classification_data['session_duration'] = SessionManager.get_session_duration()
-
-    success = save_user_classification(user_data, song, classification_data)
-
-    if success:
-        SessionManager.mark_song_completed(classification_data['song_index'], 'completed')
-        SessionManager.update_activity()
-        st.success("✅ Clasificación guardada exitosamente!")
-        time.sleep(1)  # Brief pause for user feedback
-        return True
+    next_song_index = SessionManager.get_next_song_index()
+    if next_song_index is not None:
+        SessionManager.navigate_to_song(next_song_index)
     else:
-        st.error("❌ Error al guardar la clasificación. Inténtalo de nuevo.")
-        return False
+        st.session_state.study_completed = True
 
 def render_song_classification(song, song_index, total_songs):
     """Render complete song classification interface"""
-    # Progress indicator
-    render_progress_indicator(song_index, total_songs)
+    # Save notices + progress; a fragment is one stable block, so notices never shift the player
+    render_progress_header(song_index, total_songs)
 
     # Song information y reproductor juntos
     col1, col2 = st.columns([6, 1])
 
+    card_html, player_html = get_song_markup(song, song_index)
     with col1:
-        render_song_info_card(song)
-        render_audio_player(song)
+        render_song_info_card(song, card_html)
+        render_audio_player(song, player_html)
 
     with col2:
         # Song metadata
@@ -299,6 +263,20 @@ def render_song_classification(song, song_index, total_songs):
             st.metric("Año", year)
 
     st.markdown("---")
+    render_classification_fragment(song_index)
+
+    # Submit/skip/previous are handled in handle_classification_action before the rerun,
+    # so the song rendered here is already the next one; meanwhile prepare the one after it
+    prefetch_next_song(st.session_state.songs_data)
+
+@st.fragment
+@traced('fragment.classification')
+def render_classification_fragment(song_index):
+    """Classification questions and buttons; toggling or answering reruns only this fragment"""
+    # The button callbacks moved to another song (or finished the study): redraw the whole page
+    if st.session_state.current_song_index != song_index or st.session_state.study_completed:
+        st.rerun()
+
     st.subheader("📊 Clasificación")
 
     # Checkbox FUERA del formulario
@@ -312,7 +290,7 @@ def render_song_classification(song, song_index, total_songs):
         # Primera pregunta
         st.markdown("**¿Esta canción contiene contenido explícito?**")
         st.caption("Considera lenguaje fuerte, violencia, referencias a drogas, etc.")
-        explicit_content = st.radio(
+        st.radio(
             "Contenido explícito:",
             ["No", "Sí", "No estoy seguro/a"],
             key=f"explicit_{song_index}",
@@ -323,7 +301,7 @@ def render_song_classification(song, song_index, total_songs):
         if show_more:
             st.markdown("**¿Esta canción contiene contenido sexual?**")
             st.caption("Considera referencias sexuales explícitas, insinuaciones, etc.")
-            sexual_content = st.radio(
+            st.radio(
                 "Contenido sexual:",
                 ["No", "Sí", "No estoy seguro/a"],
                 key=f"sexual_{song_index}",
@@ -333,108 +311,98 @@ def render_song_classification(song, song_index, total_songs):
             # Content suitability for children
             st.markdown("**¿Consideras esta canción apta para niños?**")
             st.caption("Considera la canción apta para niños, según la letra, referencias, etc.")
-            children_suitability = st.radio(
+            st.radio(
                 "Apta para niños:",
                 ["No", "Sí", "No estoy seguro/a"],
                 key=f"children_{song_index}",
                 horizontal=True
             )
 
-            confidence_level = st.select_slider(
+            st.select_slider(
                 "¿Qué tan seguro/a estás de tu clasificación?",
                 options=["Muy inseguro", "Inseguro", "Neutral", "Seguro", "Muy seguro"],
                 value="Neutral",
                 key=f"confidence_{song_index}"
             )
 
-            comments = st.text_area(
+            st.text_area(
                 "Comentarios adicionales (opcional):",
                 placeholder="Cualquier observación sobre la canción...",
                 key=f"comments_{song_index}",
                 max_chars=500
             )
-        else:
-            sexual_content = None
-            children_suitability = None
-            confidence_level = None
-            comments = ""
 
         # Form buttons
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            submit_button = st.form_submit_button(
+            st.form_submit_button(
                 "✅ Enviar Clasificación",
                 use_container_width=True,
-                type="primary"
+                type="primary",
+                on_click=handle_classification_action,
+                args=(song_index, 'completed')
             )
 
         with col2:
-            skip_button = st.form_submit_button(
+            st.form_submit_button(
                 "⏭️ Omitir Canción",
-                use_container_width=True
+                use_container_width=True,
+                on_click=handle_classification_action,
+                args=(song_index, 'skipped')
             )
 
         with col3:
             if song_index > 0:
-                prev_button = st.form_submit_button(
+                st.form_submit_button(
                     "⬅️ Anterior",
-                    use_container_width=True
+                    use_container_width=True,
+                    on_click=handle_classification_action,
+                    args=(song_index, 'previous')
                 )
-            else:
-                prev_button = False
-
-        classification_data = {
-            'explicit_content': explicit_content,
-            'sexual_content': sexual_content,
-            'children_suitability': children_suitability,
-            'confidence_level': confidence_level,
-            'comments': comments,
-            'song_index': song_index
-        }
-
-    # Manejo de botones igual que antes...
-    # ... (resto del código de manejo de botones)
-
-    if submit_button:
-        # Guardar clasificación normal
-        classification_data['status'] = 'completed'
-        save_user_classification(SessionManager.get_user_data(), song, classification_data)
-        SessionManager.mark_song_completed(song_index, 'completed')
-        SessionManager.update_activity()
-        st.success("✅ Clasificación guardada exitosamente!")
-        time.sleep(1)
-        next_song_index = SessionManager.get_next_song_index()
-        if next_song_index is not None:
-            SessionManager.navigate_to_song(next_song_index)
-        else:
-            st.session_state.study_completed = True
-        st.rerun()
 
-    elif skip_button:
-        # Guardar como omitida
-        classification_data['status'] = 'skipped'
-        classification_data['explicit_content'] = None
-        classification_data['sexual_content'] = None
-        classification_data['confidence_level'] = None
-        classification_data['comments'] = 'skipped'
-        save_user_classification(SessionManager.get_user_data(), song, classification_data)
-        SessionManager.mark_song_completed(song_index, 'skipped')
-        SessionManager.update_activity()
-        st.info("⏭️ Canción omitida")
-        time.sleep(1)
-        next_song_index = SessionManager.get_next_song_index()
-        if next_song_index is not None:
-            SessionManager.navigate_to_song(next_song_index)
-        else:
-            st.session_state.study_completed = True
-        st.rerun()
+def get_song_navigator(songs):
+    """Sidebar navigator for this session, built once per song list"""
+    navigator = st.session_state.get('song_navigator')
+    if navigator is None or navigator.songs is not songs:
+        from utils.navigator import SongNavigator
+        navigator = SongNavigator(songs, page_size=int(os.getenv('NAV_PAGE_SIZE', '50')))
+        st.session_state.song_navigator = navigator
+    return navigator
+
+@st.fragment
+@traced('fragment.navigation')
+def render_navigation_fragment(songs):
+    """Search, page and jump-to selector; browsing reruns only this fragment"""
+    navigator = get_song_navigator(songs)
+    current_index = st.session_state.current_song_index
+
+    query = st.text_input("Buscar canción o artista:", key="nav_search")
+    if query:
+        positions = navigator.search(query, limit=navigator.page_size)
+        if not positions:
+            st.caption("Sin resultados")
+    else:
+        page = st.number_input(
+            f"Página (de {navigator.page_count}):",
+            min_value=1,
+            max_value=navigator.page_count,
+            value=navigator.page_of(current_index)
+        )
+        positions = list(navigator.page(int(page)))
 
-    elif prev_button:
-        # Ir a la canción anterior
-        prev_index = song_index - 1
-        if prev_index >= 0:
-            SessionManager.navigate_to_song(prev_index)
+    if positions:
+        progress = st.session_state.progress
+        selected_index = st.selectbox(
+            "Ir a canción:",
+            positions,
+            index=positions.index(current_index) if current_index in positions else None,
+            format_func=lambda x: navigator.label(x, progress),
+            placeholder="Selecciona una canción..."
+        )
+
+        if selected_index is not None and selected_index != current_index:
+            SessionManager.navigate_to_song(selected_index)
             st.rerun()
 
 def render_sidebar(songs):
@@ -470,30 +438,7 @@ def render_sidebar(songs):
 
         # Song navigation
         st.markdown("### 🎵 Navegación")
-        song_options = []
-        for i, song in enumerate(songs):
-            status = ""
-            if i in st.session_state.completed_songs:
-                status = "✅ "
-            elif i in st.session_state.skipped_songs:
-                status = "⏭️ "
-
-            title = song['title_songs_new']
-            if len(title) > 25:
-                title = title[:25] + "..."
-
-            song_options.append(f"{status}{i+1}. {title}")
-
-        selected_index = st.selectbox(
-            "Ir a canción:",
-            range(len(songs)),
-            index=st.session_state.current_song_index,
-            format_func=lambda x: song_options[x]
-        )
-
-        if selected_index != st.session_state.current_song_index:
-            SessionManager.navigate_to_song(selected_index)
-            st.rerun()
+        render_navigation_fragment(songs)
 
         st.markdown("---")
 
@@ -508,6 +453,8 @@ def render_sidebar(songs):
             st.rerun()
 
 def render_auth_panel():
+    from utils.auth import get_auth_service
+
     st.markdown("### 🔐 Acceso")
     auth = get_auth_service()
     tabs = st.tabs(["Iniciar sesión", "Registrarme"])
@@ -590,6 +537,11 @@ def render_completion_screen():
 
 def main():
     """Main application function"""
+    with rerun_trace():
+        render_app()
+
+def render_app():
+    """Render the page for the current session state"""
     # Configure page
     configure_page()
 
@@ -599,16 +551,20 @@ def main():
     # Render header
     render_header()
 
-    # Check database health
-    if not check_database_health():
-        st.error("❌ No se puede conectar a la base de datos. Verifica la configuración.")
-        st.stop()
+    # Check database health (cached state from the background monitor)
+    with span('health_check'):
+        database_healthy = check_database_health()
+    if not database_healthy:
+        if not st.session_state.songs_data:
+            st.error("❌ No se puede conectar a la base de datos. Verifica la configuración.")
+            st.stop()
+        # Degraded mode: keep the already loaded songs instead of blocking the participant
+        st.warning("⚠️ La base de datos no responde en este momento. Tus respuestas podrían no guardarse hasta que se restablezca la conexión.")
 
     # Load songs if not already loaded
     if not st.session_state.songs_data:
-        with st.spinner("Cargando canciones del estudio..."):
-            st.session_state.songs_data = get_filtered_songs()
-            SessionManager.set_song_id_map(st.session_state.songs_data)
+        with st.spinner("Cargando canciones del estudio..."), span('catalog_load'):
+            SessionManager.set_session_songs(get_filtered_songs())
 
     songs = st.session_state.songs_data
 
@@ -623,9 +579,14 @@ def main():
 
     # Sync previous progress once per session
     if not st.session_state.progress_synced:
-        # pull previous responses and mark completed
-        prev_ids = get_user_progress(st.session_state.user_id)
-        SessionManager.sync_progress_from_db([{ 'song_id': sid } for sid in prev_ids])
+        # pull previous (song_id, status) pairs and mark completed/skipped
+        with span('progress_sync'):
+            synced = SessionManager.sync_progress_from_db(get_user_progress(st.session_state.user_id))
+        if not synced:
+            # Without it, songs already answered would be served (and overwritten) again
+            st.warning("⚠️ No se pudo cargar tu progreso anterior. Espera a que se restablezca la conexión e inténtalo de nuevo.")
+            st.button("🔄 Reintentar")
+            st.stop()
 
     # Collect user information (if missing in profile)
     if not st.session_state.user_info_collected:
@@ -638,15 +599,17 @@ def main():
         return
 
     # Render sidebar
-    render_sidebar(songs)
+    with span('sidebar'):
+        render_sidebar(songs)
 
     # Render current song classification
     current_song = songs[st.session_state.current_song_index]
-    render_song_classification(
-        current_song,
-        st.session_state.current_song_index,
-        len(songs)
-    )
+    with span('song_render'):
+        render_song_classification(
+            current_song,
+            st.session_state.current_song_index,
+            len(songs)
+        )
 
 if __name__ == "__main__":
     main()
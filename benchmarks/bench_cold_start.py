@@ -0,0 +1,127 @@
+"""Measure import time and time to first render of a fresh app process.
+
+Usage:
+    python benchmarks/bench_cold_start.py [--runs 5] [--importtime 15]
+
+Every measurement runs in a new interpreter, so nothing is cached between
+runs. Reported:
+  imports      - `import streamlit`, then `import app` on top of it
+  cold render  - first AppTest run of app.py with nothing warmed up
+  warm render  - first AppTest run after utils.warmup finished in the same
+                 process (what `python manage.py serve` gives a new replica)
+The render measurements use MONGODB_URI from the environment or .env.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORTS = """
+import json, time
+started = time.perf_counter()
+import streamlit
+streamlit_done = time.perf_counter()
+import app
+print(json.dumps({'streamlit': streamlit_done - started, 'app': time.perf_counter() - streamlit_done}))
+"""
+
+RENDER = """
+import json, os, time
+from dotenv import load_dotenv
+load_dotenv()
+from streamlit.testing.v1 import AppTest
+result = {}
+if os.environ['BENCH_MODE'] == 'warm':
+    from utils import warmup
+    started = time.perf_counter()
+    warmup.start_warmup()
+    warmup.wait_for_warmup()
+    result['warmup'] = time.perf_counter() - started
+    result['steps'] = warmup.get_warmup_status()['timings']
+at = AppTest.from_file(os.path.join(os.getcwd(), 'app.py'), default_timeout=60)
+started = time.perf_counter()
+at.run()
+result['render'] = time.perf_counter() - started
+result['errors'] = [e.value for e in at.error]
+print(json.dumps(result))
+"""
+
+
+def run_snippet(code, **env):
+    completed = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=ROOT,
+        env={**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])), **env},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def top_imports(count, max_depth=2):
+    """Slowest imports of `import app` by cumulative time (python -X importtime), up to max_depth"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=ROOT,
+        env={**os.environ, 'PYTHONPATH': ROOT, 'PREWARM_ON_START': 'false'},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Each nesting level adds two spaces of indentation; depth 0 is `app` itself
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if 1 <= depth <= max_depth:
+            rows.append((int(cumulative_us), int(self_us), '  ' * (depth - 1) + name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def summary(values):
+    return f"{statistics.median(values) * 1000:8.0f} ms (min {min(values) * 1000:.0f})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help="Mostrar los N módulos más lentos de importar")
+    parser.add_argument('--skip-render', action='store_true', help="Solo medir importaciones")
+    args = parser.parse_args()
+
+    imports = [run_snippet(IMPORTS, PREWARM_ON_START='false') for _ in range(args.runs)]
+    print(f"import streamlit : {summary([r['streamlit'] for r in imports])}")
+    print(f"import app       : {summary([r['app'] for r in imports])}")
+
+    if args.importtime:
+        print()
+        print(f"{'cumulative':>12} {'self':>10}  module")
+        for cumulative_us, self_us, name in top_imports(args.importtime):
+            print(f"{cumulative_us / 1000:>9.1f} ms {self_us / 1000:>7.1f} ms  {name}")
+
+    if args.skip_render:
+        return
+
+    print()
+    cold = [run_snippet(RENDER, BENCH_MODE='cold', PREWARM_ON_START='false') for _ in range(args.runs)]
+    warm = [run_snippet(RENDER, BENCH_MODE='warm') for _ in range(args.runs)]
+    print(f"cold first render: {summary([r['render'] for r in cold])}")
+    print(f"warm first render: {summary([r['render'] for r in warm])}")
+    print(f"warm-up (background, before the first session): {summary([r['warmup'] for r in warm])}")
+    steps = warm[-1]['steps']
+    print("  " + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in steps.items()))
+    errors = cold[-1]['errors'] or warm[-1]['errors']
+    if errors:
+        print(f"Errores mostrados por la app (¿base de datos disponible?): {errors[:2]}")
+
+
+if __name__ == "__main__":
+    main()
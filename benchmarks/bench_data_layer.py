@@ -0,0 +1,161 @@
+"""Benchmark the data layer at increasing numbers of stored responses.
+
+Usage:
+    python benchmarks/bench_data_layer.py --mongomock [--scales 1000 10000 100000]
+    python benchmarks/bench_data_layer.py --mongodb-uri mongodb://localhost:27017 --db bench \\
+        --scales 1000 10000 100000 1000000 --json results.json [--baseline previous.json]
+
+For every scale the study collections are replaced by a synthetic dataset
+(see synthetic.py) and each operation is timed --repeat times (median
+reported):
+  get_filtered_songs      cold (catalog reloaded) and warm (cached catalog)
+  save_user_classification one upsert plus its counter update
+  get_user_progress       cold (cache invalidated) and warm, for a user with
+                          --per-user responses
+  sync_progress_from_db   marking that user's responses in a session tracker
+  get_next_song_index / get_progress_stats   per call
+With --baseline, operations slower than the baseline by more than
+--tolerance are listed and the exit status is 1. Against a real server use
+a throwaway database: its collections are dropped.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import add_backend_arguments, populate, setup_backend  # noqa: E402
+
+
+def timed(fn, repeat, setup=None):
+    """Median seconds of fn() over `repeat` runs; setup() runs untimed before each one"""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def per_call(fn, calls, repeat):
+    return timed(lambda: [fn() for _ in range(calls)], repeat) / calls
+
+
+def bench_scale(db, responses, args):
+    import streamlit as st
+    from utils.catalog import CatalogCache
+    from utils.database import get_filtered_songs, get_user_progress, progress_cache, save_user_classification
+    from utils.session_manager import SessionManager
+
+    started = time.perf_counter()
+    dataset = populate(db, songs=args.songs, responses=responses, per_user=args.per_user)
+    load_seconds = time.perf_counter() - started
+    user_id = dataset['users'][0]
+    results = {}
+
+    results['get_filtered_songs (cold)'] = timed(get_filtered_songs, args.repeat, setup=CatalogCache.invalidate)
+    results['get_filtered_songs (warm)'] = timed(get_filtered_songs, args.repeat)
+
+    # A new participant classifying songs nobody else answered in this run
+    writer = {'user_id': 'benchmark-user', 'gender': 'Otro', 'age': 30}
+    songs = iter(dataset['songs'])
+    classification = {
+        'explicit_content': 'No', 'sexual_content': 'No', 'children_suitability': 'Sí',
+        'comments': '', 'confidence_level': 'Seguro', 'song_index': 0, 'status': 'completed',
+    }
+    results['save_user_classification'] = timed(
+        lambda: save_user_classification(writer, next(songs), classification), args.repeat
+    )
+
+    results['get_user_progress (cold)'] = timed(
+        lambda: get_user_progress(user_id), args.repeat, setup=lambda: progress_cache.invalidate(user_id)
+    )
+    results['get_user_progress (warm)'] = timed(lambda: get_user_progress(user_id), args.repeat)
+
+    # Session state works outside `streamlit run` (bare mode), one state per process
+    SessionManager.initialize_session()
+    session_songs = get_filtered_songs()
+    progress = get_user_progress(user_id)
+
+    def fresh_session():
+        SessionManager.set_session_songs(session_songs)
+
+    results['sync_progress_from_db'] = timed(
+        lambda: SessionManager.sync_progress_from_db(progress), args.repeat, setup=fresh_session
+    )
+    st.session_state.current_song_index = len(session_songs) // 2
+    results['get_next_song_index'] = per_call(SessionManager.get_next_song_index, args.calls, args.repeat)
+    results['get_progress_stats'] = per_call(SessionManager.get_progress_stats, args.calls, args.repeat)
+    return load_seconds, len(progress), results
+
+
+def format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for scale, operations in results.items():
+        for name, seconds in operations.items():
+            previous = baseline.get(scale, {}).get(name)
+            if previous and seconds > previous * (1 + tolerance):
+                regressions.append((scale, name, previous, seconds))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_backend_arguments(parser)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                        help="Respuestas almacenadas en cada escala")
+    parser.add_argument('--songs', type=int, default=2_000, help="Canciones del catálogo")
+    parser.add_argument('--per-user', type=int, default=200, help="Respuestas por usuario")
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--calls', type=int, default=1_000, help="Llamadas por medición de las operaciones en memoria")
+    parser.add_argument('--json', help="Guardar los resultados en este archivo")
+    parser.add_argument('--baseline', help="Resultados previos (--json) con los que comparar")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Empeoramiento tolerado (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    # Bare-mode session state warns on every access
+    logging.getLogger('streamlit.runtime.scriptrunner_utils.script_run_context').addFilter(
+        lambda record: 'missing ScriptRunContext' not in record.getMessage())
+    db = setup_backend(args)
+
+    results = {}
+    for responses in args.scales:
+        load_seconds, user_responses, operations = bench_scale(db, responses, args)
+        results[str(responses)] = operations
+        print(f"\n== {responses:,} responses ({load_seconds:.1f}s to generate; "
+              f"benchmark user has {user_responses}) ==")
+        for name, seconds in operations.items():
+            print(f"{name:>28} {format_seconds(seconds):>12}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\nRegressions (> {args.tolerance:.0%} slower than {args.baseline}):")
+            for scale, name, previous, seconds in regressions:
+                print(f"  {scale:>10} {name}: {format_seconds(previous)} -> {format_seconds(seconds)}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
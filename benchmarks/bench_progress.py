@@ -0,0 +1,96 @@
+"""Benchmark session progress bookkeeping: set scans vs. ProgressTracker.
+
+Usage:
+    python benchmarks/bench_progress.py [--sizes 1000 100000] [--fractions 0.5 0.999]
+
+The legacy scan degrades as a session nears the end, when most songs after
+the current one are already classified; the tracker stays O(log n).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.progress import ProgressTracker  # noqa: E402
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def legacy_next(current, total, completed, skipped):
+    """Previous SessionManager.get_next_song_index: linear scan over two sets"""
+    for i in range(current + 1, total):
+        if i not in completed and i not in skipped:
+            return i
+    for i in range(0, current):
+        if i not in completed and i not in skipped:
+            return i
+    return None
+
+
+def legacy_stats(total, completed, skipped):
+    return {
+        'total': total,
+        'completed': len(completed),
+        'skipped': len(skipped),
+        'remaining': total - len(completed) - len(skipped),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--fractions', type=float, nargs='+', default=[0.5, 0.999],
+                        help="Fracción de canciones ya clasificadas antes de medir")
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    print(f"{'songs':>10} {'done':>6} {'legacy next':>14} {'tracker next':>14} {'tracker mark':>14} {'agree':>6}")
+    for n, fraction in [(n, f) for n in args.sizes for f in args.fractions]:
+        done = rnd.sample(range(n), int(n * fraction))
+        completed = set(done[::2])
+        skipped = set(done[1::2])
+        tracker = ProgressTracker(n)
+        for i in completed:
+            tracker.mark(i, 'completed')
+        for i in skipped:
+            tracker.mark(i, 'skipped')
+
+        currents = [rnd.randrange(n) for _ in range(args.lookups)]
+        agree = all(
+            legacy_next(c, n, completed, skipped) == tracker.next_unvisited(c) for c in currents[:20]
+        ) and legacy_stats(n, completed, skipped)['remaining'] == tracker.remaining
+
+        t_legacy = best_of(lambda: [legacy_next(c, n, completed, skipped) for c in currents], args.repeat)
+        t_tracker = best_of(lambda: [tracker.next_unvisited(c) for c in currents], args.repeat)
+
+        def mark_unmark():
+            for c in currents:
+                previous = tracker.status(c)
+                tracker.mark(c, 'completed')
+                if previous is None:
+                    tracker.unmark(c)
+                else:
+                    tracker.mark(c, previous)
+        t_mark = best_of(mark_unmark, args.repeat)
+
+        per = 1e6 / len(currents)
+        print(f"{n:>10} {fraction:>6.1%} {t_legacy * per:11.1f} us {t_tracker * per:11.1f} us "
+              f"{t_mark * per:11.1f} us {str(agree):>6}")
+    print()
+    print("Tiempos por operación (mejor de --repeat). 'agree' compara ambos resultados.")
+
+
+if __name__ == "__main__":
+    main()
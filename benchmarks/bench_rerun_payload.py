@@ -0,0 +1,80 @@
+"""Measure the bytes Streamlit sends per rerun for the styled parts of the page.
+
+Usage:
+    python benchmarks/bench_rerun_payload.py [--reruns 10]
+
+Runs the header, stylesheet and song card through streamlit's AppTest and
+sums the serialized size of the delta messages of each rerun, once with
+CSS_DELIVERY=inline (stylesheet embedded on every rerun) and once
+with CSS_DELIVERY=static (a link to the content-hashed static file, the default).
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+from streamlit.testing.v1 import local_script_runner  # noqa: E402
+
+PAGE = f"""
+import sys
+sys.path.insert(0, {ROOT!r})
+import streamlit as st
+from app import render_header
+from utils.ui_components import load_custom_css, render_song_info_card
+
+load_custom_css()
+render_header()
+index = st.session_state.get('i', 0)
+render_song_info_card({{
+    '_id': f'song-{{index}}',
+    'title_songs_new': f'Canción número {{index}}',
+    'artist': 'Artista de prueba',
+    'release_date': '2019-05-01',
+}})
+st.session_state.i = index + 1
+"""
+
+_payloads = []
+_parse_tree = local_script_runner.parse_tree_from_messages
+
+
+def _measuring_parse_tree(messages):
+    _payloads.append(sum(msg.ByteSize() for msg in messages if msg.WhichOneof('type') == 'delta'))
+    return _parse_tree(messages)
+
+
+local_script_runner.parse_tree_from_messages = _measuring_parse_tree
+
+
+def measure(delivery, reruns):
+    os.environ['CSS_DELIVERY'] = delivery
+    _payloads.clear()
+    at = AppTest.from_string(PAGE, default_timeout=30)
+    started = time.perf_counter()
+    for _ in range(reruns):
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+    elapsed = time.perf_counter() - started
+    return list(_payloads), elapsed / reruns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reruns', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'delivery':>10} {'first rerun':>12} {'next reruns':>12} {'script time':>12}")
+    for delivery in ('inline', 'static'):
+        payloads, per_run = measure(delivery, args.reruns)
+        later = payloads[1:] or payloads
+        print(f"{delivery:>10} {payloads[0]:>10} B {sum(later) / len(later):>10.0f} B "
+              f"{per_run * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
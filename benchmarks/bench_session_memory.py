@@ -0,0 +1,110 @@
+"""Measure per-session memory of the song list and progress state.
+
+Usage:
+    python benchmarks/bench_session_memory.py [--songs 2000] [--sessions 1000]
+
+Compares, for the same synthetic catalog:
+  copies  - every session holds its own list of song dicts (shallow copies,
+            a lower bound for documents decoded per session), an id -> index
+            dict and completed/skipped sets (the original layout)
+  refs    - a list referencing the shared catalog documents plus the dict/sets
+  compact - SessionSongs (array('I') of catalog slots) + ProgressTracker
+The shared catalog is built before measuring and is not counted.
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from datetime import date, timedelta
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.catalog import SongCatalog, SessionSongs  # noqa: E402
+from utils.progress import ProgressTracker  # noqa: E402
+
+
+def synthetic_songs(n, rnd):
+    genres = ['pop', 'rock', 'reggaeton', 'salsa', 'hip hop', 'cumbia']
+    return [
+        {
+            '_id': ObjectId(),
+            'artist': f"Artist {rnd.randrange(n // 4 + 1)}",
+            'title_songs_new': f"Song title number {i}",
+            'genre': rnd.choice(genres),
+            'spotify_id': f"{rnd.getrandbits(110):022x}",
+            'id_yt': f"{rnd.getrandbits(60):011x}",
+            'release_date': str(date(1990, 1, 1) + timedelta(days=rnd.randrange(12000))),
+            'popularity': rnd.randrange(100),
+            'duration_ms': rnd.randrange(120_000, 360_000),
+        }
+        for i in range(n)
+    ]
+
+
+def copies_session(raw_songs, order, marked):
+    songs = [dict(raw_songs[slot]) for slot in order]
+    song_id_to_index = {str(song['_id']): idx for idx, song in enumerate(songs)}
+    return songs, song_id_to_index, set(marked[::2]), set(marked[1::2])
+
+
+def refs_session(catalog, order, marked):
+    songs = [catalog.songs[slot] for slot in order]
+    song_id_to_index = {str(song['_id']): idx for idx, song in enumerate(songs)}
+    return songs, song_id_to_index, set(marked[::2]), set(marked[1::2])
+
+
+def compact_session(catalog, order, marked):
+    songs = SessionSongs(catalog, order)
+    progress = ProgressTracker(len(songs), songs.position_of)
+    for position in marked[::2]:
+        progress.mark(position, 'completed')
+    for position in marked[1::2]:
+        progress.mark(position, 'skipped')
+    return songs, progress
+
+
+def measure(build, sessions):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(i) for i in range(sessions)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--songs', type=int, default=2_000, help="Canciones en el catálogo")
+    parser.add_argument('--sessions', type=int, default=1_000, help="Sesiones concurrentes")
+    parser.add_argument('--done', type=float, default=0.5, help="Fracción clasificada por sesión")
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    raw_songs = synthetic_songs(args.songs, rnd)
+    catalog = SongCatalog(raw_songs, version=1)
+    orders = [rnd.sample(range(args.songs), args.songs) for _ in range(8)]
+    marked = rnd.sample(range(args.songs), int(args.songs * args.done))
+
+    layouts = [
+        ('copies', lambda i: copies_session(raw_songs, orders[i % 8], marked)),
+        ('refs', lambda i: refs_session(catalog, orders[i % 8], marked)),
+        ('compact', lambda i: compact_session(catalog, orders[i % 8], marked)),
+    ]
+
+    print(f"{args.sessions} sessions x {args.songs} songs ({args.done:.0%} classified)")
+    print(f"{'layout':>8} {'total':>12} {'per session':>14} {'per song':>10}")
+    for name, build in layouts:
+        total = measure(build, args.sessions)
+        per_session = total / args.sessions
+        print(f"{name:>8} {total / 2**20:9.1f} MiB {per_session / 2**10:11.1f} KiB "
+              f"{per_session / args.songs:7.1f} B")
+
+
+if __name__ == "__main__":
+    main()
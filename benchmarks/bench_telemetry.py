@@ -0,0 +1,58 @@
+"""Measure the per-span overhead of the rerun telemetry.
+
+Usage:
+    python benchmarks/bench_telemetry.py [--spans 200000]
+
+Times an empty `with span(...)` block under:
+  disabled  - TELEMETRY_ENABLED=false (a shared no-op context manager)
+  unsampled - histograms only, TELEMETRY_SAMPLE_RATE=0 (the default)
+  sampled   - every span also appended to a JSONL span log
+and the cost of rendering the Prometheus exposition text afterwards.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.telemetry import Telemetry, SpanLog  # noqa: E402
+
+PHASES = ('health_check', 'progress_sync', 'sidebar', 'song_render', 'save')
+
+
+def measure(telemetry, spans):
+    started = time.perf_counter()
+    with telemetry.rerun():
+        for i in range(spans):
+            with telemetry.span(PHASES[i % len(PHASES)]):
+                pass
+    return (time.perf_counter() - started) / spans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--spans', type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        span_log = SpanLog(os.path.join(directory, 'spans.jsonl'))
+        configurations = [
+            ('disabled', Telemetry(enabled=False)),
+            ('unsampled', Telemetry(sample_rate=0.0)),
+            ('sampled', Telemetry(sample_rate=1.0, span_log=span_log)),
+        ]
+        print(f"{'mode':>10} {'per span':>10}")
+        for name, telemetry in configurations:
+            print(f"{name:>10} {measure(telemetry, args.spans) * 1e6:7.2f} us")
+        span_log.close()
+
+        telemetry = configurations[1][1]
+        started = time.perf_counter()
+        text = telemetry.render_prometheus()
+        print(f"\n/metrics render: {(time.perf_counter() - started) * 1000:.2f} ms, {len(text)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Check the classification journal and writer: crash and replay, acks, dead letters, compaction.
+
+Usage:
+    python benchmarks/check_journal.py [--verbose]
+
+Runs the real ClassificationJournal and ClassificationWriter in a temporary
+directory against the in-memory mongomock client (pip install mongomock).
+The crashed writer is a child process that journals events and dies with
+os._exit while holding its journal slot. Prints one line per check and
+exits with status 1 if any check fails.
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import setup_mongomock  # noqa: E402
+from utils.database import ResponseBatcher  # noqa: E402
+from utils.write_queue import ClassificationJournal, ClassificationWriter, FAILED, FLUSHED  # noqa: E402
+
+# An int BSON cannot encode: the whole bulk write raises OverflowError, like a real poison document
+POISON = 2 ** 70
+
+
+def response(user_id, song_id, answer='No', **extra):
+    return {'user_id': user_id, 'song_id': song_id, 'status': 'completed',
+            'explicit_content': answer, **extra}
+
+
+def expect(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def new_writer(journal, **kwargs):
+    writer = ClassificationWriter(journal, batcher=ResponseBatcher(window_ms=1), backoff_base=0.01, **kwargs)
+    writer.start()
+    return writer
+
+
+def stored(db, user_id):
+    return {doc['song_id']: doc['explicit_content'] for doc in db.user_responses.find({'user_id': user_id})}
+
+
+def crashing_writer(path):
+    """Child process: journal three events, ack one, tear the last line and die holding the slot"""
+    journal = ClassificationJournal.claim(path)
+    print(journal.path, flush=True)
+    for song_id in ('s1', 's2', 's3'):
+        journal.append_event(f'crash-{song_id}', response('crash-user', song_id))
+    journal.append_acks(['crash-s1'])
+    with open(journal.path, 'a', encoding='utf-8') as fh:
+        fh.write('{"op": "event", "id": "crash-s4", "doc": {"user_')
+    sys.stdin.readline()
+    os._exit(1)
+
+
+def check_crash_replay(db, directory):
+    path = os.path.join(directory, 'crash', 'journal.jsonl')
+    child = subprocess.Popen([sys.executable, __file__, '--crashing-writer', path],
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    expect(child.stdout.readline().strip() == path, "the first process did not get slot 0")
+
+    # While the slot is locked a second process gets a journal of its own
+    other = ClassificationJournal.claim(path, fsync=False)
+    expect(other.path != path, "a second process claimed a locked journal slot")
+
+    child.stdin.write('\n')
+    child.stdin.flush()
+    child.wait(timeout=30)
+
+    restarted = ClassificationJournal.claim(path, fsync=False)
+    expect(restarted.path == path, "the slot of the crashed process was not released")
+    replayed = [record['id'] for record in restarted.replay()]
+    expect(replayed == ['crash-s2', 'crash-s3'], f"replayed {replayed}, expected the two un-acked events")
+
+    writer = new_writer(restarted)
+    try:
+        expect(writer.flush(10), "replayed events were not written")
+    finally:
+        writer.stop()
+    expect(stored(db, 'crash-user') == {'s2': 'No', 's3': 'No'}, "acked event written again or replay lost")
+    expect(restarted.replay() == [], "replayed events were not acked (torn line swallowed the ack?)")
+
+
+def check_acks(db, directory):
+    journal = ClassificationJournal(os.path.join(directory, 'acks', 'journal.jsonl'), fsync=False)
+    writer = new_writer(journal)
+    try:
+        ids = [writer.submit(response('ack-user', f's{i}')) for i in range(20)]
+        ids.append(writer.submit(response('ack-user', 's0', answer='Sí')))
+        expect(writer.flush(10), "events were not written")
+        states = {writer.status(event_id)['state'] for event_id in ids}
+    finally:
+        writer.stop()
+    expect(states == {FLUSHED}, f"event states {states}")
+    expect(journal.replay() == [], "flushed events left un-acked in the journal")
+    answers = stored(db, 'ack-user')
+    expect(len(answers) == 20 and answers['s0'] == 'Sí', "latest answer per song not stored")
+
+
+def check_dead_letter_compaction(db, directory):
+    path = os.path.join(directory, 'dead-letter', 'journal.jsonl')
+    journal = ClassificationJournal(path, fsync=False, compact_bytes=1)
+    writer = new_writer(journal, max_item_attempts=2)
+    try:
+        poison = writer.submit(response('dl-user', 'p', answer='Sí', extra=POISON))
+        good = [writer.submit(response('dl-user', f's{i}')) for i in range(5)]
+        expect(writer.flush(10), "a failing batch was retried forever")
+        expect(writer.status(poison)['state'] == FAILED, "the poison event did not fail")
+        expect({writer.status(event_id)['state'] for event_id in good} == {FLUSHED},
+               "good events of the failing batch were not isolated and written")
+
+        # The participant answers the song again after the failure
+        writer.submit(response('dl-user', 'p', answer='No'))
+        expect(writer.flush(10), "the newer answer was not written")
+    finally:
+        writer.stop()
+
+    expect(os.path.getsize(path) == 0, "journal not compacted with a dead-lettered event")
+    with open(journal.dead_letter_path, encoding='utf-8') as fh:
+        dead = fh.read()
+    expect(dead.count('\n') == 1 and poison in dead, "poison event missing from the dead-letter file")
+
+    # A restart must not replay the failed event over the newer answer
+    restarted = new_writer(ClassificationJournal(path, fsync=False))
+    try:
+        expect(restarted.pending_count() == 0 and restarted.flush(10), "a failed event was replayed")
+    finally:
+        restarted.stop()
+    expect(stored(db, 'dl-user').get('p') == 'No', "the newer answer was overwritten")
+
+
+CHECKS = (
+    ('crash, slot lock and replay', check_crash_replay),
+    ('acks', check_acks),
+    ('dead letter and compaction', check_dead_letter_compaction),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--verbose', action='store_true', help="Mostrar el log del writer")
+    parser.add_argument('--crashing-writer', metavar='PATH', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.crashing_writer:
+        crashing_writer(args.crashing_writer)
+        return
+
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.CRITICAL)
+    db = setup_mongomock()
+
+    failed = 0
+    with tempfile.TemporaryDirectory() as directory:
+        for name, check in CHECKS:
+            started = time.perf_counter()
+            try:
+                check(db, directory)
+            except AssertionError as e:
+                failed += 1
+                print(f"FAIL  {name}: {e}")
+            else:
+                print(f"ok    {name} ({time.perf_counter() - started:.2f}s)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
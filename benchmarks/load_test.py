@@ -0,0 +1,243 @@
+"""Drive simulated participants through app.py and report latency and throughput.
+
+Usage:
+    python benchmarks/load_test.py --mongomock [--participants 1 4 16] [--actions 20]
+    python benchmarks/load_test.py --mongodb-uri mongodb://localhost:27017 --db loadtest
+
+Every participant is a separate Streamlit session (AppTest) that loads the
+page, registers, logs out, logs in again and then classifies, skips and
+navigates through songs, pausing --think-ms between actions. All sessions
+share this process, like the sessions of one server process, so the run at
+each concurrency level shows where throughput stops growing. Reported per
+action:
+  p50/p95/p99  - time from the widget interaction to the end of the rerun,
+                 including the wait for the runner (see below)
+  run p50      - the rerun alone
+  round trips  - MongoDB commands issued by the rerun (saves are written in
+                 the background and are not part of it)
+
+AppTest is not thread-safe, so reruns of different participants take turns;
+the background writer, health monitor and bcrypt workers still run
+concurrently. With a real server, reruns waiting on MongoDB overlap, so the
+ceiling measured here is a lower bound.
+
+--mongomock needs `pip install mongomock`; against a real mongod use a
+throwaway database, the harness creates users and responses in it.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import add_backend_arguments, setup_backend, song_documents  # noqa: E402
+
+ROUND_TRIPS_KEY = '_load_test_round_trips'
+
+# AppTest swaps process-wide Streamlit state (runtime, config) on every run, so
+# runs are serialized; participants still think, queue and save concurrently
+_runner_lock = threading.Lock()
+
+
+def seed_songs(db, count):
+    from utils.catalog import STUDY_FILTER
+    missing = count - db.songs_lang.count_documents(STUDY_FILTER)
+    if missing <= 0:
+        return 0
+    db.songs_lang.insert_many(song_documents(missing, seed=missing))
+    return missing
+
+
+def register_round_trip_hook():
+    """Store the command count of each rerun in the session, where the harness can read it"""
+    import streamlit as st
+    from utils.command_monitor import RoundTripCounter
+    from utils.telemetry import get_telemetry
+
+    class SessionRoundTrips(RoundTripCounter):
+        __slots__ = ()
+
+        def __exit__(self, exc_type, exc, tb):
+            super().__exit__(exc_type, exc, tb)
+            # A run that calls st.rerun() continues in a second pass: add both
+            st.session_state[ROUND_TRIPS_KEY] = st.session_state.get(ROUND_TRIPS_KEY, 0) + self.total
+            return False
+
+    get_telemetry().register_rerun_hook(SessionRoundTrips)
+
+
+class Participant:
+    """One simulated participant: an AppTest session plus the timings of its actions."""
+
+    def __init__(self, number, run_id, seed):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=120)
+        self.email = f"carga-{run_id}-{number}@example.com"
+        self.password = f"clave-{number}"
+        self.rnd = random.Random(seed)
+        self.results = []
+        self.errors = []
+
+    def _run(self, action):
+        self.at.session_state[ROUND_TRIPS_KEY] = 0
+        started = time.perf_counter()
+        with _runner_lock:
+            ran = time.perf_counter()
+            self.at.run()
+            finished = time.perf_counter()
+            round_trips = self.at.session_state[ROUND_TRIPS_KEY]
+        self.results.append((action, finished - started, finished - ran, round_trips))
+        for element in list(self.at.exception) + list(self.at.error):
+            self.errors.append(f"{action}: {element.value}")
+
+    def _button(self, label):
+        for button in self.at.button:
+            if button.label == label:
+                return button
+        raise LookupError(f"button {label!r} not found")
+
+    def load(self):
+        self._run('load')
+
+    def register(self):
+        self.at.text_input[2].input(self.email)
+        self.at.text_input[3].input(self.password)
+        self.at.selectbox[0].select(self.rnd.choice(["Masculino", "Femenino", "Otro"]))
+        self._button("Crear cuenta").click()
+        self._run('register')
+
+    def logout(self):
+        self._button("🚪 Cerrar sesión").click()
+        self._run('logout')
+
+    def login(self):
+        self.at.text_input[0].input(self.email)
+        self.at.text_input[1].input(self.password)
+        self._button("Ingresar").click()
+        self._run('login')
+
+    def classify(self):
+        self._button("✅ Enviar Clasificación").click()
+        self._run('classify')
+
+    def skip(self):
+        self._button("⏭️ Omitir Canción").click()
+        self._run('skip')
+
+    def navigate(self):
+        selector = next(s for s in self.at.sidebar.selectbox if s.label == "Ir a canción:")
+        selector.select_index(self.rnd.randrange(len(selector.options)))
+        self._run('navigate')
+
+    def session(self, actions, think):
+        self.load()
+        self.register()
+        self.logout()
+        self.login()
+        steps = [self.classify] * 6 + [self.skip] * 2 + [self.navigate] * 2
+        for _ in range(actions):
+            if think:
+                time.sleep(self.rnd.uniform(0.5, 1.5) * think)
+            if not self.at.session_state.authenticated or self.at.session_state.study_completed:
+                break
+            try:
+                self.rnd.choice(steps)()
+            except LookupError as e:
+                self.errors.append(str(e))
+                break
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_level(participants, actions, think, run_id):
+    people = [Participant(i, run_id, seed=i) for i in range(participants)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=participants) as pool:
+        list(pool.map(lambda person: person.session(actions, think), people))
+    wall = time.perf_counter() - started
+    return people, wall
+
+
+def report(people, wall):
+    by_action = defaultdict(list)
+    for person in people:
+        for action, elapsed, run, round_trips in person.results:
+            by_action[action].append((elapsed, run, round_trips))
+
+    print(f"{'action':>10} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'run p50':>8} {'round trips':>12}")
+    for action in ('load', 'register', 'logout', 'login', 'classify', 'skip', 'navigate'):
+        rows = by_action.get(action)
+        if not rows:
+            continue
+        seconds = [elapsed for elapsed, _, _ in rows]
+        runs = [run for _, run, _ in rows]
+        trips = [n for _, _, n in rows]
+        print(f"{action:>10} {len(rows):>5} " + " ".join(
+            f"{percentile(values, q) * 1000:>6.0f}ms" for values, q in
+            ((seconds, 0.5), (seconds, 0.95), (seconds, 0.99), (runs, 0.5))
+        ) + f" {sum(trips) / len(trips):>12.1f}")
+
+    total = sum(len(rows) for rows in by_action.values())
+    errors = [error for person in people for error in person.errors]
+    print(f"{total} reruns in {wall:.1f}s: {total / wall:.1f} reruns/s")
+    if errors:
+        print(f"{len(errors)} errores, p. ej.: {errors[:3]}")
+    return total / wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_backend_arguments(parser)
+    parser.add_argument('--participants', type=int, nargs='+', default=[1, 4, 16],
+                        help="Niveles de concurrencia a medir")
+    parser.add_argument('--actions', type=int, default=20, help="Acciones por participante tras el login")
+    parser.add_argument('--think-ms', type=float, default=0,
+                        help="Pausa media entre acciones (0 = medir el techo de rendimiento)")
+    parser.add_argument('--songs', type=int, default=200, help="Canciones a sembrar si faltan")
+    parser.add_argument('--bcrypt-rounds', type=int, default=None,
+                        help="Coste de bcrypt (por defecto BCRYPT_ROUNDS o 12)")
+    args = parser.parse_args()
+
+    journal_dir = tempfile.mkdtemp(prefix='load-test-')
+    os.environ['JOURNAL_PATH'] = os.path.join(journal_dir, 'classifications.jsonl')
+    os.environ.setdefault('TELEMETRY_SAMPLE_RATE', '0')
+    if args.bcrypt_rounds is not None:
+        os.environ['BCRYPT_ROUNDS'] = str(args.bcrypt_rounds)
+
+    db = setup_backend(args)
+    seeded = seed_songs(db, args.songs)
+    # AppTest sessions run in worker threads, outside any Streamlit script context
+    logging.getLogger('streamlit.runtime.scriptrunner_utils.script_run_context').addFilter(
+        lambda record: 'missing ScriptRunContext' not in record.getMessage())
+    print(f"{db.songs_lang.count_documents({})} songs ({seeded} seeded), journal in {journal_dir}")
+    register_round_trip_hook()
+
+    from utils.write_queue import get_classification_writer
+    run_id = f"{int(time.time()):x}"
+    throughput = {}
+    for level in args.participants:
+        print(f"\n== {level} participant(s), {args.actions} actions each ==")
+        people, wall = run_level(level, args.actions, args.think_ms / 1000, f"{run_id}-{level}")
+        throughput[level] = report(people, wall)
+        started = time.perf_counter()
+        drained = get_classification_writer().flush(timeout=60)
+        print(f"background saves {'drained' if drained else 'NOT drained'} in {time.perf_counter() - started:.2f}s")
+
+    best = max(throughput, key=throughput.get)
+    print(f"\nThroughput ceiling: {throughput[best]:.1f} reruns/s at {best} participant(s) "
+          f"(" + ", ".join(f"{level}: {value:.1f}" for level, value in throughput.items()) + ")")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Synthetic songs_lang / user_responses datasets and database backends for the benchmarks.
+
+Documents have the fields the app reads and writes; values are random but
+reproducible for a given seed. Every user classifies a different sample of
+songs, so (user_id, song_id) stays unique as it is in the real collection.
+"""
+import os
+import random
+import sys
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bson import ObjectId  # noqa: E402
+
+GENRES = ['pop', 'rock', 'reggaeton', 'salsa', 'hip hop', 'cumbia', 'bachata', 'trap']
+ANSWERS = ['No', 'Sí', 'No estoy seguro/a']
+CONFIDENCE = ['Muy inseguro', 'Inseguro', 'Neutral', 'Seguro', 'Muy seguro']
+GENDERS = ['Masculino', 'Femenino', 'Otro', 'Prefiero no decir']
+
+
+def song_documents(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Study songs (spotify_found / is_human_study set) with the catalog's fields"""
+    from utils.catalog import STUDY_FILTER
+    rnd = random.Random(seed)
+    return [
+        {
+            '_id': ObjectId(),
+            'artist': f"Artista {rnd.randrange(count // 4 + 1)}",
+            'title_songs_new': f"Canción de prueba {i}",
+            'genre': rnd.choice(GENRES),
+            'spotify_id': f"{rnd.getrandbits(110):022x}",
+            'id_yt': f"{rnd.getrandbits(60):011x}",
+            'release_date': f"{rnd.randrange(1990, 2024)}-{rnd.randrange(1, 13):02d}-01",
+            'popularity': rnd.randrange(100),
+            'duration_ms': rnd.randrange(120_000, 360_000),
+            **STUDY_FILTER,
+        }
+        for i in range(count)
+    ]
+
+
+def response_documents(songs, count: int, per_user: int = 200, seed: int = 7) -> Iterator[Dict[str, Any]]:
+    """`count` responses from count / per_user users, each over a different sample of songs"""
+    rnd = random.Random(seed)
+    per_user = max(1, min(per_user, len(songs)))
+    started = datetime(2025, 1, 1)
+    produced = 0
+    while produced < count:
+        user_id = f"{rnd.getrandbits(96):024x}"
+        gender, age = rnd.choice(GENDERS), rnd.randrange(18, 70)
+        when = started + timedelta(seconds=rnd.randrange(30_000_000))
+        for index, song in enumerate(rnd.sample(songs, min(per_user, count - produced))):
+            skipped = rnd.random() < 0.15
+            when += timedelta(seconds=rnd.randrange(20, 240))
+            yield {
+                'user_id': user_id,
+                'user_gender': gender,
+                'user_age': age,
+                'song_id': str(song['_id']),
+                'spotify_id': song['spotify_id'],
+                'artist': song['artist'],
+                'title': song['title_songs_new'],
+                'genre': song['genre'],
+                'release_date': song['release_date'],
+                'popularity': song['popularity'],
+                'explicit_content': None if skipped else rnd.choice(ANSWERS),
+                'sexual_content': None if skipped else rnd.choice(ANSWERS),
+                'children_suitability': rnd.choice(ANSWERS),
+                'comments': 'skipped' if skipped else '',
+                'confidence_level': None if skipped else rnd.choice(CONFIDENCE),
+                'timestamp': when,
+                'song_index': index,
+                'session_duration_seconds': float(index * 60),
+                'classification_source': 'human_study_frontend',
+                'status': 'skipped' if skipped else 'completed',
+                'created_at': when,
+                'updated_at': when,
+            }
+            produced += 1
+
+
+def populate(db, songs: int, responses: int, per_user: int = 200, batch: int = 5_000, seed: int = 7) -> Dict[str, Any]:
+    """Replace the study collections with a synthetic dataset; counters, rollups and indexes included"""
+    from utils.indexes import ensure_indexes
+    from utils.label_rollups import get_rollups_collection, rebuild_label_rollups
+    from utils.response_counts import get_counts_collection, rebuild_response_counts
+
+    songs_collection = db[os.getenv('SONGS_COLLECTION', 'songs_lang')]
+    responses_collection = db[os.getenv('RESPONSES_COLLECTION', 'user_responses')]
+    for collection in (songs_collection, responses_collection, get_counts_collection(db), get_rollups_collection(db)):
+        collection.drop()
+
+    song_docs = song_documents(songs, seed)
+    songs_collection.insert_many(song_docs)
+    pending, users = [], set()
+    for document in response_documents(song_docs, responses, per_user, seed):
+        pending.append(document)
+        if len(pending) >= batch:
+            responses_collection.insert_many(pending, ordered=False)
+            users.update(doc['user_id'] for doc in pending)
+            pending = []
+    if pending:
+        responses_collection.insert_many(pending, ordered=False)
+        users.update(doc['user_id'] for doc in pending)
+
+    rebuild_response_counts(db)
+    rebuild_label_rollups(db)
+    ensure_indexes(db)
+    return {'songs': song_docs, 'users': sorted(users)}
+
+
+def setup_mongomock():
+    """Install an in-memory mongomock client as the app's shared client (pip install mongomock)"""
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("--mongomock necesita mongomock: pip install mongomock")
+    from utils.command_monitor import count_command
+    from utils.connection import ClientRegistry
+
+    # mongomock emits no command events: count its collection calls instead
+    commands = {
+        'find': 'find', 'find_one': 'find', 'aggregate': 'aggregate', 'count_documents': 'aggregate',
+        'distinct': 'distinct', 'insert_one': 'insert', 'insert_many': 'insert', 'update_one': 'update',
+        'update_many': 'update', 'replace_one': 'update', 'delete_one': 'delete', 'delete_many': 'delete',
+        'bulk_write': 'bulkWrite', 'find_one_and_update': 'findAndModify', 'create_index': 'createIndexes',
+    }
+    inside = threading.local()
+
+    def counted(method, command_name):
+        def wrapper(self, *args, **kwargs):
+            # find_one calls find, update_one calls internal helpers: count the outermost call
+            if getattr(inside, 'depth', 0):
+                return method(self, *args, **kwargs)
+            inside.depth = 1
+            try:
+                count_command(command_name, self.name)
+                return method(self, *args, **kwargs)
+            finally:
+                inside.depth = 0
+        return wrapper
+
+    for name, command_name in commands.items():
+        setattr(mongomock.Collection, name, counted(getattr(mongomock.Collection, name), command_name))
+
+    os.environ['MONGODB_URI'] = 'mongodb://mongomock'
+    ClientRegistry._client = mongomock.MongoClient()
+    return ClientRegistry.get_database()
+
+
+def setup_mongodb(uri, db_name):
+    """Point the app's shared client at a (throwaway) database on a real server"""
+    os.environ['MONGODB_URI'] = uri
+    os.environ['MONGODB_DB'] = db_name
+    from utils.connection import ClientRegistry
+    return ClientRegistry.get_database()
+
+
+def add_backend_arguments(parser):
+    backend = parser.add_mutually_exclusive_group(required=True)
+    backend.add_argument('--mongomock', action='store_true', help="Base de datos en memoria (mongomock)")
+    backend.add_argument('--mongodb-uri', help="URI de un mongod local o de pruebas")
+    parser.add_argument('--db', default='loadtest', help="Base de datos a usar con --mongodb-uri")
+
+
+def setup_backend(args):
+    return setup_mongomock() if args.mongomock else setup_mongodb(args.mongodb_uri, args.db)
@@ -0,0 +1,199 @@
+"""Maintenance commands for the study database.
+
+Usage:
+    python manage.py rebuild-counts [--dry-run]
+    python manage.py rebuild-rollups [--dry-run]
+    python manage.py bump-catalog
+    python manage.py ensure-indexes
+    python manage.py verify-indexes
+    python manage.py export-responses [--format parquet|csv] [--output-dir exports] [--incremental]
+    python manage.py agreement [--state exports/agreement.pkl] [--per-song agreement.csv]
+    python manage.py serve [streamlit options...]
+"""
+import argparse
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from utils.connection import ClientRegistry
+from utils.export import FORMATS
+
+
+def cmd_rebuild_counts(args):
+    """Recompute per-song response counters from user_responses"""
+    from utils.response_counts import rebuild_response_counts
+
+    summary = rebuild_response_counts(ClientRegistry.get_database(), dry_run=args.dry_run)
+    if not args.verbose:
+        summary.pop('drift')
+    print(json.dumps(summary, indent=2, default=str))
+    return 0
+
+
+def cmd_rebuild_rollups(args):
+    """Verify the per-song label rollups against user_responses and repair any drift"""
+    from utils.label_rollups import rebuild_label_rollups
+
+    summary = rebuild_label_rollups(ClientRegistry.get_database(), dry_run=args.dry_run)
+    if not args.verbose:
+        summary.pop('drift')
+    print(json.dumps(summary, indent=2, default=str, ensure_ascii=False))
+    return 1 if args.dry_run and summary['drifted'] else 0
+
+
+def cmd_bump_catalog(args):
+    """Invalidate every process' cached song catalog after editing songs_lang"""
+    from utils.catalog import bump_catalog_version
+
+    version = bump_catalog_version(ClientRegistry.get_database())
+    print(f"Catalog version: {version}")
+    return 0
+
+
+def cmd_ensure_indexes(args):
+    """Create the indexes used by the study queries (idempotent)"""
+    from utils.indexes import ensure_indexes
+
+    results = ensure_indexes(ClientRegistry.get_database())
+    for result in results:
+        line = f"{result['status']:>8}  {result['collection']}.{result['name']}"
+        if result.get('error'):
+            line += f"  ({result['error']})"
+        print(line)
+    return 1 if any(result['status'] == 'error' for result in results) else 0
+
+
+def cmd_verify_indexes(args):
+    """Explain every query shape and fail if any of them scans a whole collection"""
+    from utils.indexes import verify_query_plans
+
+    results = verify_query_plans(ClientRegistry.get_database())
+    for result in results:
+        mark = "OK  " if result['ok'] else "FAIL"
+        line = f"{mark}  {result['name']}: {' > '.join(result['stages'])}"
+        if result.get('error'):
+            line += f"  ({result['error']})"
+        print(line)
+    return 0 if all(result['ok'] for result in results) else 1
+
+
+def cmd_export_responses(args):
+    """Stream user_responses to a Parquet/CSV file; --incremental reads only what changed since the last export"""
+    from utils.export import export_responses
+
+    summary = export_responses(
+        ClientRegistry.get_database(),
+        args.output_dir,
+        fmt=args.format,
+        incremental=args.incremental,
+        batch_size=args.batch_size,
+    )
+    if summary['file'] is None:
+        print(f"No new responses ({summary['kind']} export)")
+    else:
+        print(f"{summary['rows']} responses -> {summary['file']} ({summary['kind']} export)")
+    return 0
+
+
+def cmd_agreement(args):
+    """Inter-annotator agreement per question (Fleiss' kappa, Krippendorff's alpha) and optionally per song"""
+    import csv
+    from utils.agreement import AgreementEngine
+
+    engine = AgreementEngine.load(args.state, unsure_as_missing=args.unsure_as_missing)
+    read = engine.update_from_db(ClientRegistry.get_database(), batch_size=args.batch_size)
+    if args.state:
+        engine.save(args.state)
+    print(f"{read} responses read; {engine.responses} answered responses over {engine.songs} songs")
+
+    print(f"{'question':>22} {'kappa':>8} {'alpha':>8} {'songs':>8} {'pairable':>9} {'labels':>8}")
+    for stats in engine.summary():
+        print(f"{stats['question']:>22} {stats['fleiss_kappa']:>8.3f} {stats['krippendorff_alpha']:>8.3f} "
+              f"{stats['songs_rated']:>8} {stats['songs_pairable']:>9} {stats['labels']:>8}")
+
+    if args.per_song:
+        rows = engine.song_rows(min_raters=args.min_raters)
+        with open(args.per_song, 'w', encoding='utf-8', newline='') as f:
+            fieldnames = list(rows[0]) if rows else ['song_id']
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"{len(rows)} songs -> {args.per_song}")
+    return 0
+
+
+def cmd_serve(args):
+    """Run the app with `streamlit run`, warming up the process before the first participant connects"""
+    from streamlit.web import cli as streamlit_cli
+    from utils.warmup import start_warmup
+
+    # Same process as the server: app reruns reuse the connected client, catalog and bcrypt workers
+    start_warmup()
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+    sys.argv = ['streamlit', 'run', app_path, *args.streamlit_args]
+    return streamlit_cli.main()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Herramientas de mantenimiento del estudio")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rebuild = subparsers.add_parser('rebuild-counts', help="Reconstruir contadores de respuestas por canción")
+    rebuild.add_argument('--dry-run', action='store_true', help="Solo reportar diferencias, sin escribir")
+    rebuild.add_argument('--verbose', action='store_true', help="Mostrar cada contador con diferencias")
+    rebuild.set_defaults(func=cmd_rebuild_counts)
+
+    rollups = subparsers.add_parser('rebuild-rollups', help="Verificar y reconstruir los totales de respuestas por canción")
+    rollups.add_argument('--dry-run', action='store_true', help="Solo reportar diferencias, sin escribir (sale con 1 si las hay)")
+    rollups.add_argument('--verbose', action='store_true', help="Mostrar cada canción con diferencias")
+    rollups.set_defaults(func=cmd_rebuild_rollups)
+
+    bump = subparsers.add_parser('bump-catalog', help="Invalidar el catálogo de canciones en caché")
+    bump.set_defaults(func=cmd_bump_catalog)
+
+    ensure = subparsers.add_parser('ensure-indexes', help="Crear los índices del estudio")
+    ensure.set_defaults(func=cmd_ensure_indexes)
+
+    verify = subparsers.add_parser('verify-indexes', help="Verificar con explain() que ninguna consulta haga COLLSCAN")
+    verify.set_defaults(func=cmd_verify_indexes)
+
+    export = subparsers.add_parser('export-responses', help="Exportar las respuestas a Parquet o CSV")
+    export.add_argument('--format', choices=FORMATS, default='parquet')
+    export.add_argument('--output-dir', default='exports', help="Carpeta de los archivos y de la marca de agua")
+    export.add_argument('--incremental', action='store_true',
+                        help="Solo respuestas nuevas o modificadas desde la última exportación")
+    export.add_argument('--batch-size', type=int, default=5000, help="Documentos por lote del cursor")
+    export.set_defaults(func=cmd_export_responses)
+
+    agreement = subparsers.add_parser('agreement', help="Acuerdo entre anotadores por pregunta y por canción")
+    agreement.add_argument('--state', default=None,
+                           help="Archivo de estado (p. ej. exports/agreement.pkl): las siguientes ejecuciones "
+                                "solo leen respuestas nuevas o modificadas")
+    agreement.add_argument('--per-song', default=None, help="Escribir el acuerdo por canción en este CSV")
+    agreement.add_argument('--min-raters', type=int, default=2, help="Mínimo de anotadores por canción en --per-song")
+    agreement.add_argument('--unsure-as-missing', action='store_true',
+                           help="Tratar 'No estoy seguro/a' como respuesta ausente en lugar de una categoría")
+    agreement.add_argument('--batch-size', type=int, default=5000, help="Documentos por lote del cursor")
+    agreement.set_defaults(func=cmd_agreement)
+
+    # Unknown options after `serve` are passed to `streamlit run` (e.g. --server.port 8501)
+    serve = subparsers.add_parser('serve', help="Iniciar la app con precalentamiento en segundo plano")
+    serve.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command != 'serve':
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.streamlit_args = extra
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
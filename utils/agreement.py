@@ -0,0 +1,245 @@
+import os
+import pickle
+from datetime import timedelta
+from typing import Dict, Any, List, Tuple, Iterable
+
+import numpy as np
+
+from utils.export import Watermark, iter_responses, server_time
+
+# Categorical questions of a classification and their answers, in code order
+QUESTIONS = ('explicit_content', 'sexual_content', 'children_suitability')
+CATEGORIES = ('No', 'Sí', 'No estoy seguro/a')
+UNSURE = 'No estoy seguro/a'
+CONFIDENCE_LEVELS = ('Muy inseguro', 'Inseguro', 'Neutral', 'Seguro', 'Muy seguro')
+
+MISSING = -1
+
+
+def fleiss_kappa(counts: np.ndarray) -> float:
+    """Fleiss' kappa from a units x categories count matrix.
+
+    Units with fewer than two ratings are ignored. With a varying number of
+    raters per unit this is the usual generalization (mean per-unit agreement,
+    chance from the pooled category shares); prefer Krippendorff's alpha then.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    raters = counts.sum(axis=1)
+    rated = counts[raters >= 2]
+    if not len(rated):
+        return float('nan')
+    raters = raters[raters >= 2]
+    per_unit = (rated * (rated - 1)).sum(axis=1) / (raters * (raters - 1))
+    shares = rated.sum(axis=0) / rated.sum()
+    expected = float((shares ** 2).sum())
+    if expected >= 1.0:
+        return float('nan')
+    return float((per_unit.mean() - expected) / (1.0 - expected))
+
+
+def krippendorff_alpha_nominal(counts: np.ndarray) -> float:
+    """Krippendorff's alpha (nominal) from a units x categories count matrix; handles missing ratings"""
+    counts = np.asarray(counts, dtype=np.float64)
+    raters = counts.sum(axis=1)
+    pairable = raters >= 2
+    counts, raters = counts[pairable], raters[pairable]
+    if not len(counts):
+        return float('nan')
+    # Coincidence matrix: o_ck = sum_u (n_uc * n_uk - [c == k] * n_uc) / (m_u - 1)
+    weighted = counts / (raters - 1)[:, None]
+    coincidences = weighted.T @ counts - np.diag(weighted.sum(axis=0))
+    marginals = coincidences.sum(axis=1)
+    total = marginals.sum()
+    disagreement_expected = total ** 2 - (marginals ** 2).sum()
+    if disagreement_expected <= 0:
+        return float('nan')
+    disagreement_observed = coincidences.sum() - np.trace(coincidences)
+    return float(1.0 - (total - 1) * disagreement_observed / disagreement_expected)
+
+
+def per_unit_agreement(counts: np.ndarray) -> np.ndarray:
+    """Share of agreeing rater pairs per unit (NaN below two ratings)"""
+    counts = np.asarray(counts, dtype=np.float64)
+    raters = counts.sum(axis=1)
+    pairs = raters * (raters - 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(raters >= 2, (counts * (counts - 1)).sum(axis=1) / pairs, np.nan)
+
+
+class AgreementEngine:
+    """Song x category label counts per question, updated incrementally from user_responses.
+
+    Every (user, song) keeps its latest codes, so a re-submitted response
+    replaces its earlier labels instead of being counted twice. Statistics
+    are computed from the count matrices with NumPy in O(#songs).
+    """
+
+    def __init__(self, questions=QUESTIONS, categories=CATEGORIES, unsure_as_missing=False):
+        self.questions = tuple(questions)
+        self.categories = tuple(categories)
+        self.unsure_as_missing = unsure_as_missing
+        self._codes = {
+            category: (MISSING if unsure_as_missing and category == UNSURE else code)
+            for code, category in enumerate(self.categories)
+        }
+        self._confidence_codes = {level: code + 1 for code, level in enumerate(CONFIDENCE_LEVELS)}
+        self._song_index: Dict[str, int] = {}
+        self._song_ids: List[str] = []
+        self._user_index: Dict[str, int] = {}
+        # (user slot, song slot) -> (code per question..., confidence 1-5 or 0)
+        self._labels: Dict[Tuple[int, int], Tuple[int, ...]] = {}
+        self._counts = np.zeros((1024, len(self.questions), len(self.categories)), dtype=np.int32)
+        self._confidence = np.zeros((1024, 2), dtype=np.int64)  # sum, count
+        self.watermark = Watermark()
+
+    # Building
+    def _song_slot(self, song_id) -> int:
+        slot = self._song_index.get(song_id)
+        if slot is None:
+            slot = self._song_index[song_id] = len(self._song_ids)
+            self._song_ids.append(song_id)
+            if slot >= len(self._counts):
+                self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)])
+                self._confidence = np.concatenate([self._confidence, np.zeros_like(self._confidence)])
+        return slot
+
+    def _user_slot(self, user_id) -> int:
+        slot = self._user_index.get(user_id)
+        if slot is None:
+            slot = self._user_index[user_id] = len(self._user_index)
+        return slot
+
+    def add_responses(self, docs: Iterable[Dict[str, Any]]) -> int:
+        """Apply responses (latest answer per user and song wins); returns how many were read"""
+        songs, questions, codes, deltas = [], [], [], []
+        confidence_songs, confidence_values, confidence_deltas = [], [], []
+        read = 0
+
+        def apply(song, labels, sign):
+            for question, code in enumerate(labels[:-1]):
+                if code != MISSING:
+                    songs.append(song)
+                    questions.append(question)
+                    codes.append(code)
+                    deltas.append(sign)
+            if labels[-1]:
+                confidence_songs.append(song)
+                confidence_values.append(labels[-1] * sign)
+                confidence_deltas.append(sign)
+
+        for doc in docs:
+            read += 1
+            song = self._song_slot(str(doc['song_id']))
+            key = (self._user_slot(doc['user_id']), song)
+            previous = self._labels.pop(key, None)
+            if previous is not None:
+                apply(song, previous, -1)
+            if doc.get('status') == 'skipped':
+                # Skipped songs carry form defaults, not answers
+                continue
+            labels = tuple(self._codes.get(doc.get(question), MISSING) for question in self.questions)
+            labels += (self._confidence_codes.get(doc.get('confidence_level'), 0),)
+            self._labels[key] = labels
+            apply(song, labels, 1)
+
+        if songs:
+            np.add.at(self._counts, (np.array(songs), np.array(questions), np.array(codes)), np.array(deltas))
+        if confidence_songs:
+            np.add.at(self._confidence[:, 0], np.array(confidence_songs), np.array(confidence_values))
+            np.add.at(self._confidence[:, 1], np.array(confidence_songs), np.array(confidence_deltas))
+        return read
+
+    def update_from_db(self, db, batch_size=5000, settle_seconds=5.0, chunk=50_000) -> int:
+        """Read the responses saved or changed since the last update, in watermark order"""
+        until = server_time(db) - timedelta(seconds=settle_seconds)
+        read, pending = 0, []
+        for doc in iter_responses(db, self.watermark, until=until, batch_size=batch_size):
+            pending.append(doc)
+            self.watermark.advance(doc)
+            if len(pending) >= chunk:
+                read += self.add_responses(pending)
+                pending = []
+        return read + self.add_responses(pending)
+
+    def save(self, path):
+        """Persist counts, latest labels and watermark so the next run only reads new responses"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, unsure_as_missing=False) -> 'AgreementEngine':
+        """State saved by save(), or a fresh engine if there is none or it was built with other options"""
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                engine = pickle.load(f)
+            if isinstance(engine, cls) and engine.unsure_as_missing == unsure_as_missing:
+                return engine
+        return cls(unsure_as_missing=unsure_as_missing)
+
+    # Statistics
+    @property
+    def songs(self) -> int:
+        return len(self._song_ids)
+
+    @property
+    def responses(self) -> int:
+        return len(self._labels)
+
+    def counts(self, question) -> np.ndarray:
+        """songs x categories counts for one question"""
+        return self._counts[:self.songs, self.questions.index(question)]
+
+    def label_matrix(self, question) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sparse song x annotator matrix of one question as COO arrays (song slots, user slots, codes)"""
+        position = self.questions.index(question)
+        entries = [(song, user, labels[position]) for (user, song), labels in self._labels.items()
+                   if labels[position] != MISSING]
+        if not entries:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty, empty
+        return tuple(np.array(column, dtype=np.int64) for column in zip(*entries))
+
+    def question_stats(self, question) -> Dict[str, Any]:
+        counts = self.counts(question)
+        raters = counts.sum(axis=1)
+        return {
+            'question': question,
+            'fleiss_kappa': fleiss_kappa(counts),
+            'krippendorff_alpha': krippendorff_alpha_nominal(counts),
+            'songs_rated': int((raters >= 1).sum()),
+            'songs_pairable': int((raters >= 2).sum()),
+            'labels': int(raters.sum()),
+        }
+
+    def summary(self) -> List[Dict[str, Any]]:
+        return [self.question_stats(question) for question in self.questions]
+
+    def song_rows(self, min_raters=2) -> List[Dict[str, Any]]:
+        """Per-song agreement: raters, share of agreeing pairs and majority answer per question"""
+        n = self.songs
+        columns = {}
+        keep = np.zeros(n, dtype=bool)
+        for question in self.questions:
+            counts = self.counts(question)
+            raters = counts.sum(axis=1)
+            keep |= raters >= min_raters
+            columns[question] = (raters, per_unit_agreement(counts), counts.argmax(axis=1))
+        confidence_sum, confidence_count = self._confidence[:n, 0], self._confidence[:n, 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            confidence_mean = np.where(confidence_count > 0, confidence_sum / confidence_count, np.nan)
+
+        rows = []
+        for slot in np.flatnonzero(keep):
+            row = {'song_id': self._song_ids[slot]}
+            for question, (raters, agreement, majority) in columns.items():
+                row[f'{question}_raters'] = int(raters[slot])
+                row[f'{question}_agreement'] = None if np.isnan(agreement[slot]) else round(float(agreement[slot]), 4)
+                row[f'{question}_majority'] = self.categories[majority[slot]] if raters[slot] else None
+            row['confidence_mean'] = None if np.isnan(confidence_mean[slot]) else round(float(confidence_mean[slot]), 3)
+            rows.append(row)
+        return rows
@@ -1,10 +1,27 @@
 import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any
 from datetime import datetime
 
-import bcrypt
 from pymongo import MongoClient
-import streamlit as st
+from pymongo.errors import DuplicateKeyError
+
+from utils.connection import get_client
+from utils.indexes import ensure_indexes_once, ensure_unique_email_index
+from utils.passwords import HasherBusy, get_password_hasher
+
+logger = logging.getLogger(__name__)
+
+# Fields needed to authenticate and to restore the participant profile
+LOGIN_PROJECTION = {"email": 1, "password_hash": 1, "gender": 1, "age": 1, "is_active": 1}
+
+# Shown when the bcrypt pool is backed up past BCRYPT_TIMEOUT_SECONDS (login bursts)
+BUSY_MESSAGE = "El servidor está ocupado, inténtalo de nuevo en unos segundos"
+
+# Fire-and-forget account updates after a successful login
+_post_login_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="post-login")
 
 
 class AuthService:
@@ -14,45 +31,32 @@ class AuthService:
         self._client: Optional[MongoClient] = None
         self._db = None
         self._users = None
-        self._responses = None
+        self._email_unique = False
         self._connect()
 
     def _connect(self):
         mongodb_uri = os.getenv("MONGODB_URI")
         db_name = os.getenv("MONGODB_DB", "ml-workshop")
         users_collection = os.getenv("USERS_COLLECTION", "users")
-        responses_collection = os.getenv("RESPONSES_COLLECTION", "user_responses")
 
         if not mongodb_uri:
             raise RuntimeError("MONGODB_URI is not set")
 
-        self._client = MongoClient(mongodb_uri)
+        # Shared pool: every session reuses the same process-wide client
+        self._client = get_client()
         self._db = self._client[db_name]
         self._users = self._db[users_collection]
-        self._responses = self._db[responses_collection]
 
-        # Indexes for performance and uniqueness
-        try:
-            # Enforce unique emails only (username no longer used)
-            # Use partial filter to ignore docs without an email
-            self._users.create_index(
-                "email",
-                unique=True,
-                partialFilterExpression={"email": {"$exists": True, "$type": "string"}}
-            )
-        except Exception:
-            # Ignore if already exists / insufficient privileges
-            pass
+        # Indexes for performance and uniqueness (email, responses, songs); once per process
+        ensure_indexes_once(self._db)
+        # Registration depends on this one, so it is ensured even with AUTO_CREATE_INDEXES=false
+        self._email_unique = ensure_unique_email_index(self._db)
 
     def _hash_password(self, password: str) -> bytes:
-        salt = bcrypt.gensalt(rounds=12)
-        return bcrypt.hashpw(password.encode("utf-8"), salt)
+        return get_password_hasher().hash(password)
 
     def _check_password(self, password: str, hashed: bytes) -> bool:
-        try:
-            return bcrypt.checkpw(password.encode("utf-8"), hashed)
-        except Exception:
-            return False
+        return get_password_hasher().verify(password, hashed)
 
     def register_user(self, email: str, password: str, gender: Optional[str], age: Optional[int]) -> Dict[str, Any]:
         """Create a user account with required unique email. Returns dict with success, message, user."""
@@ -64,11 +68,17 @@ class AuthService:
         if "@" not in email or "." not in email.split("@")[-1]:
             return {"success": False, "message": "Correo inválido"}
 
-        existing = self._users.find_one({"email": email})
-        if existing:
-            return {"success": False, "message": "El correo ya está registrado"}
+        if not self._email_unique:
+            # Unique index not confirmed (server unreachable at connect, or existing duplicates):
+            # try again, and check for the email first while it is missing
+            self._email_unique = ensure_unique_email_index(self._db)
+            if not self._email_unique and self._users.find_one({"email": email}, projection={"_id": 1}):
+                return {"success": False, "message": "El correo ya está registrado"}
 
-        hashed = self._hash_password(password)
+        try:
+            hashed = self._hash_password(password)
+        except HasherBusy:
+            return {"success": False, "message": BUSY_MESSAGE}
         user_doc = {
             "email": email,
             "username": email,
@@ -79,37 +89,57 @@ class AuthService:
             "last_login_at": None,
             "is_active": True,
         }
-        res = self._users.insert_one(user_doc)
+        # Once the unique email index is confirmed it rejects duplicates; no pre-check round trip
+        try:
+            res = self._users.insert_one(user_doc)
+        except DuplicateKeyError:
+            return {"success": False, "message": "El correo ya está registrado"}
         user_doc["_id"] = res.inserted_id
+        user_doc.pop("password_hash")
         return {"success": True, "message": "Registro exitoso", "user": user_doc}
 
     def login_user(self, email: str, password: str) -> Dict[str, Any]:
         email = (email or "").strip().lower()
-        user = self._users.find_one({"email": email})
+        # A read only: failed attempts cost no write, last_login_at is written after success
+        user = self._users.find_one({"email": email}, projection=LOGIN_PROJECTION)
         if not user:
             return {"success": False, "message": "Correo no encontrado"}
 
         if not user.get("is_active", True):
             return {"success": False, "message": "Cuenta inactiva"}
 
-        if not self._check_password(password, user["password_hash"]):
+        hashed = user.pop("password_hash")
+        try:
+            password_ok = self._check_password(password, hashed)
+        except HasherBusy:
+            return {"success": False, "message": BUSY_MESSAGE}
+        if not password_ok:
             return {"success": False, "message": "Credenciales inválidas"}
 
-        self._users.update_one({"_id": user["_id"]}, {"$set": {"last_login_at": datetime.now()}})
+        # last_login_at (and a rehash when BCRYPT_ROUNDS changed) are written off the login path
+        _post_login_executor.submit(self._after_login, user["_id"], password, hashed)
         return {"success": True, "message": "Login exitoso", "user": user}
 
-    def get_user_progress_song_ids(self, user_id: str):
-        """Return set of song_ids already answered by this user_id."""
+    def _after_login(self, user_id, password: str, hashed: bytes):
+        update = {"last_login_at": datetime.now()}
         try:
-            docs = self._responses.find({"user_id": user_id}, {"song_id": 1})
-            return {d.get("song_id") for d in docs}
-        except Exception:
-            return set()
+            hasher = get_password_hasher()
+            if hasher.needs_rehash(hashed):
+                update["password_hash"] = hasher.hash(password)
+            self._users.update_one({"_id": user_id}, {"$set": update})
+        except Exception as e:
+            logger.warning("Post-login update failed for %s: %s", user_id, e)
+
 
+_auth_service: Optional[AuthService] = None
+_auth_service_lock = threading.Lock()
 
 
 def get_auth_service() -> AuthService:
-    # Cache in session to reuse connection
-    if "_auth_service" not in st.session_state:
-        st.session_state._auth_service = AuthService()
-    return st.session_state._auth_service
+    # One service per process; it holds no per-user state and shares the client pool
+    global _auth_service
+    if _auth_service is None:
+        with _auth_service_lock:
+            if _auth_service is None:
+                _auth_service = AuthService()
+    return _auth_service
@@ -0,0 +1,226 @@
+import os
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from types import MappingProxyType
+from typing import Optional, Dict, Tuple, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Fields read by the UI and by save_user_classification; everything else stays in Mongo
+CATALOG_FIELDS = (
+    '_id',
+    'artist',
+    'title_songs_new',
+    'genre',
+    'spotify_id',
+    'id_yt',
+    'release_date',
+    'popularity',
+    'duration_ms',
+)
+
+STUDY_FILTER = {
+    "spotify_found": True,
+    "is_human_study": True
+}
+
+CATALOG_META_ID = 'songs_catalog'
+
+
+def get_meta_collection(db):
+    return db[os.getenv('STUDY_META_COLLECTION', 'study_meta')]
+
+
+def get_catalog_version(db) -> int:
+    """Read the catalog version counter (0 if it was never bumped)"""
+    doc = get_meta_collection(db).find_one({'_id': CATALOG_META_ID}, {'version': 1})
+    return doc.get('version', 0) if doc else 0
+
+
+def bump_catalog_version(db) -> int:
+    """Increment the catalog version so every process reloads its cached catalog"""
+    from pymongo import ReturnDocument
+
+    doc = get_meta_collection(db).find_one_and_update(
+        {'_id': CATALOG_META_ID},
+        {'$inc': {'version': 1}, '$currentDate': {'updated_at': True}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc['version']
+
+
+class SongCatalog:
+    """Immutable snapshot of the study songs, shared by every session of the process."""
+
+    __slots__ = ('songs', 'version', 'loaded_at', 'ids', 'index_by_id', '__weakref__')
+
+    def __init__(self, songs, version):
+        self.songs: Tuple[MappingProxyType, ...] = tuple(MappingProxyType(song) for song in songs)
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.ids: Tuple[str, ...] = tuple(str(song['_id']) for song in self.songs)
+        self.index_by_id: Dict[str, int] = {song_id: idx for idx, song_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.songs)
+
+    def get(self, song_id) -> Optional[MappingProxyType]:
+        idx = self.index_by_id.get(str(song_id))
+        return None if idx is None else self.songs[idx]
+
+
+class SessionSongs:
+    """A session's song order as catalog slots in an array('I').
+
+    Behaves like a read-only list of songs; the songs themselves live in the
+    shared catalog, so a session costs a few bytes per song instead of a copy
+    of every document.
+    """
+
+    __slots__ = ('catalog', '_order', '_sorted_slots', '_sorted_positions')
+
+    def __init__(self, catalog: SongCatalog, order: Iterable[int]):
+        self.catalog = catalog
+        self._order = array('I', order)
+        # slot -> position lookups bisect a sorted copy instead of keeping a dict
+        pairs = sorted((slot, position) for position, slot in enumerate(self._order))
+        self._sorted_slots = array('I', (slot for slot, _ in pairs))
+        self._sorted_positions = array('I', (position for _, position in pairs))
+
+    @classmethod
+    def empty(cls) -> 'SessionSongs':
+        return cls(SongCatalog((), version=None), ())
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, position) -> MappingProxyType:
+        return self.catalog.songs[self._order[position]]
+
+    def __iter__(self):
+        songs = self.catalog.songs
+        return (songs[slot] for slot in self._order)
+
+    def slot(self, position) -> int:
+        return self._order[position]
+
+    def position_of_slot(self, slot) -> Optional[int]:
+        i = bisect_left(self._sorted_slots, slot)
+        if i < len(self._sorted_slots) and self._sorted_slots[i] == slot:
+            return self._sorted_positions[i]
+        return None
+
+    def position_of(self, song_id) -> Optional[int]:
+        """Position of a song in this session's order, or None if it is not part of it"""
+        slot = self.catalog.index_by_id.get(str(song_id))
+        return None if slot is None else self.position_of_slot(slot)
+
+
+class CatalogCache:
+    """Process-level song catalog cache, invalidated by version, TTL or change stream."""
+
+    _lock = threading.Lock()
+    _catalog: Optional[SongCatalog] = None
+    _last_version_check = 0.0
+    _invalidated = False
+    _watcher: Optional[threading.Thread] = None
+    _watch_attempted = False
+
+    @classmethod
+    def _ttl(cls) -> float:
+        return float(os.getenv('CATALOG_TTL_SECONDS', '3600'))
+
+    @classmethod
+    def _version_check_interval(cls) -> float:
+        return float(os.getenv('CATALOG_VERSION_CHECK_SECONDS', '30'))
+
+    @classmethod
+    def _load(cls, db, version) -> SongCatalog:
+        songs_collection = db[os.getenv('SONGS_COLLECTION', 'songs_lang')]
+        projection = {field: 1 for field in CATALOG_FIELDS}
+        songs = list(songs_collection.find(STUDY_FILTER, projection))
+        return SongCatalog(songs, version)
+
+    @classmethod
+    def _is_stale(cls, db, now) -> bool:
+        catalog = cls._catalog
+        if catalog is None or cls._invalidated:
+            return True
+        if now - catalog.loaded_at >= cls._ttl():
+            return True
+        if now - cls._last_version_check >= cls._version_check_interval():
+            cls._last_version_check = now
+            return get_catalog_version(db) != catalog.version
+        return False
+
+    @classmethod
+    def get(cls, db) -> SongCatalog:
+        now = time.monotonic()
+        catalog = cls._catalog
+        # Fast path: no lock, no I/O
+        if (catalog is not None and not cls._invalidated
+                and now - catalog.loaded_at < cls._ttl()
+                and now - cls._last_version_check < cls._version_check_interval()):
+            return catalog
+
+        with cls._lock:
+            if not cls._is_stale(db, now):
+                return cls._catalog
+            try:
+                version = get_catalog_version(db)
+                cls._catalog = cls._load(db, version)
+                cls._last_version_check = time.monotonic()
+                cls._invalidated = False
+            except Exception:
+                # Keep serving the previous snapshot if the reload fails
+                if cls._catalog is None:
+                    raise
+                logger.exception("Catalog reload failed; serving cached version %s", cls._catalog.version)
+            return cls._catalog
+
+    @classmethod
+    def invalidate(cls):
+        cls._invalidated = True
+
+    @classmethod
+    def start_change_stream_watcher(cls, db) -> bool:
+        """Invalidate the cache on any change to the songs collection.
+
+        Change streams need a replica set (a single-node local replica set is
+        enough). Returns False when the watcher could not be started.
+        """
+        with cls._lock:
+            if cls._watcher is not None and cls._watcher.is_alive():
+                return True
+            cls._watch_attempted = True
+
+            songs_collection = db[os.getenv('SONGS_COLLECTION', 'songs_lang')]
+            try:
+                stream = songs_collection.watch()
+            except Exception as e:
+                logger.warning("Catalog change stream unavailable: %s", e)
+                return False
+
+            def _watch():
+                try:
+                    with stream:
+                        for _change in stream:
+                            cls.invalidate()
+                except Exception as e:
+                    logger.warning("Catalog change stream stopped: %s", e)
+
+            cls._watcher = threading.Thread(target=_watch, name="catalog-change-stream", daemon=True)
+            cls._watcher.start()
+            return True
+
+
+def get_song_catalog(db) -> SongCatalog:
+    """Get the shared song catalog, starting the change stream watcher if enabled"""
+    if os.getenv('CATALOG_CHANGE_STREAM', 'false').lower() in ('1', 'true', 'yes'):
+        if not CatalogCache._watch_attempted:
+            CatalogCache.start_change_stream_watcher(db)
+    return CatalogCache.get(db)
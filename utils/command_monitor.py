@@ -0,0 +1,268 @@
+import os
+import json
+import logging
+import threading
+import contextvars
+from collections import Counter, deque
+from typing import Dict, Any, Optional, List, Tuple
+
+from pymongo import monitoring
+
+from utils.telemetry import Histogram, get_telemetry, histogram_lines, format_labels
+
+logger = logging.getLogger(__name__)
+
+COMMAND_METRIC = 'app_mongo_command_duration_seconds'
+ROUND_TRIPS_METRIC = 'app_mongo_round_trips_per_rerun'
+
+COMMAND_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# Where each command keeps its filter (the first statement for update/delete)
+_FILTER_FIELDS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+    'update': 'updates',
+    'delete': 'deletes',
+}
+
+# Counters ({(command, collection): n}) of the round-trip scopes active in this context
+_round_trips: contextvars.ContextVar = contextvars.ContextVar('mongo_round_trips', default=())
+
+
+def _shape(value, depth=0):
+    """Replace the values of a filter by '?', keeping field names and operators"""
+    if isinstance(value, dict):
+        if depth > 6:
+            return '...'
+        return {key: _shape(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $and/$or/$nor hold filters; any other list is a value
+        if value and all(isinstance(item, dict) for item in value):
+            return [_shape(item, depth + 1) for item in value[:5]]
+        return '?'
+    return '?'
+
+
+def filter_shape(command_name: str, command) -> Optional[Dict[str, Any]]:
+    """Shape of the filter of a command (values stripped), None for commands without one"""
+    if command_name == 'aggregate':
+        pipeline = command.get('pipeline') or []
+        stages = [next(iter(stage), '?') for stage in pipeline if isinstance(stage, dict)]
+        match = next((stage['$match'] for stage in pipeline if isinstance(stage, dict) and '$match' in stage), None)
+        return {'$match': _shape(match), 'stages': stages} if match is not None else {'stages': stages}
+    field = _FILTER_FIELDS.get(command_name)
+    if field is None:
+        return None
+    value = command.get(field)
+    if isinstance(value, list):
+        # update/delete: one statement per document; the first is representative
+        value = value[0].get('q') if value and isinstance(value[0], dict) else None
+    return _shape(value) if value is not None else None
+
+
+def _collection_of(command_name: str, command) -> str:
+    if command_name == 'getMore':
+        return str(command.get('collection', ''))
+    target = command.get(command_name)
+    return target if isinstance(target, str) else ''
+
+
+def count_command(command_name: str, collection: str = ''):
+    """Count one command in every round-trip scope active in this context"""
+    for counts in _round_trips.get():
+        counts[(command_name, collection)] += 1
+
+
+class RoundTripCounter:
+    """Counts the commands issued inside the block (pymongo runs listeners in the calling thread)."""
+
+    __slots__ = ('name', 'counts', '_token')
+
+    def __init__(self, name=''):
+        self.name = name
+        self.counts: Counter = Counter()
+        self._token = None
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def __enter__(self):
+        self._token = _round_trips.set(_round_trips.get() + (self.counts,))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _round_trips.reset(self._token)
+        return False
+
+
+class RoundTripScope(RoundTripCounter):
+    """A RoundTripCounter around one rerun that reports its count to the monitor."""
+
+    __slots__ = ('_monitor',)
+
+    def __init__(self, monitor, name):
+        super().__init__(name)
+        self._monitor = monitor
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        self._monitor.record_rerun(self.name, self.counts)
+        return False
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Latency per command and collection, round trips per rerun and a slow-operation log.
+
+    Durations come from pymongo's own measurement (duration_micros). The
+    filter of each command is kept only until its reply arrives and is
+    reduced to its shape (field names and operators) only for slow commands.
+    """
+
+    def __init__(self, slow_ms=100.0, round_trips_warn=20, slow_log_size=100):
+        self.slow_seconds = slow_ms / 1000.0
+        self.round_trips_warn = round_trips_warn
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._failures: Counter = Counter()
+        self._slow: Counter = Counter()
+        self._round_trips: Dict[str, Histogram] = {}
+        self._pending: Dict[Tuple[int, Any], Tuple[str, Any]] = {}
+        self.slow_log: deque = deque(maxlen=slow_log_size)
+
+    # Listener callbacks
+    def started(self, event):
+        command_name = event.command_name
+        collection = _collection_of(command_name, event.command)
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = (collection, event.command)
+        count_command(command_name, collection)
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed):
+        with self._lock:
+            collection, command = self._pending.pop((event.request_id, event.connection_id), ('', None))
+        key = (event.command_name, collection)
+        seconds = event.duration_micros / 1_000_000
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(COMMAND_BUCKETS))
+        histogram.observe(seconds)
+        if failed:
+            with self._lock:
+                self._failures[key] += 1
+        if seconds >= self.slow_seconds:
+            self._log_slow(event, collection, command, seconds, failed)
+
+    def _log_slow(self, event, collection, command, seconds, failed):
+        entry = {
+            'command': event.command_name,
+            'collection': collection,
+            'duration_ms': round(seconds * 1000, 1),
+            'filter': filter_shape(event.command_name, command) if command else None,
+        }
+        if failed:
+            entry['failure'] = str(getattr(event, 'failure', ''))[:200]
+        with self._lock:
+            self._slow[(event.command_name, collection)] += 1
+            self.slow_log.append(entry)
+        logger.warning("Slow MongoDB command: %s", json.dumps(entry, default=str))
+
+    # Per-rerun round trips
+    def rerun_scope(self, name='rerun') -> RoundTripScope:
+        return RoundTripScope(self, name)
+
+    def record_rerun(self, name, counts: Counter):
+        total = sum(counts.values())
+        histogram = self._round_trips.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._round_trips.setdefault(name, Histogram(ROUND_TRIP_BUCKETS))
+        histogram.observe(total)
+        if self.round_trips_warn and total >= self.round_trips_warn:
+            # Many round trips in one rerun usually means a query inside a loop (N+1)
+            top = ', '.join(f"{command} {collection or '-'} x{n}" for (command, collection), n in counts.most_common(3))
+            logger.warning("%s issued %d MongoDB commands (%s)", name, total, top)
+
+    # Reporting
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            histograms = dict(self._histograms)
+            failures = dict(self._failures)
+            slow = dict(self._slow)
+            round_trips = dict(self._round_trips)
+            slow_log = list(self.slow_log)
+        commands = {}
+        for (command, collection), histogram in sorted(histograms.items()):
+            data = histogram.snapshot()
+            commands[f"{command} {collection}".strip()] = {
+                'count': data['count'],
+                'avg_ms': data['sum'] / data['count'] * 1000 if data['count'] else 0.0,
+                'failures': failures.get((command, collection), 0),
+                'slow': slow.get((command, collection), 0),
+            }
+        reruns = {}
+        for name, histogram in sorted(round_trips.items()):
+            data = histogram.snapshot()
+            reruns[name] = {
+                'reruns': data['count'],
+                'avg_round_trips': data['sum'] / data['count'] if data['count'] else 0.0,
+            }
+        return {'commands': commands, 'round_trips': reruns, 'slow_log': slow_log}
+
+    def prometheus_lines(self) -> List[str]:
+        """Command latency, failures, slow commands and round trips per rerun (telemetry collector)"""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            failures = sorted(self._failures.items())
+            slow = sorted(self._slow.items())
+            round_trips = sorted(self._round_trips.items())
+        lines = histogram_lines(
+            COMMAND_METRIC, "Latency of MongoDB commands by command and collection.",
+            (({'command': command, 'collection': collection}, histogram.snapshot())
+             for (command, collection), histogram in histograms)
+        )
+        for metric, description, counts in (
+            ('app_mongo_command_failures_total', "MongoDB commands that failed.", failures),
+            ('app_mongo_slow_commands_total', "MongoDB commands slower than MONGO_SLOW_MS.", slow),
+        ):
+            lines += [f"# HELP {metric} {description}", f"# TYPE {metric} counter"]
+            for (command, collection), count in counts:
+                lines.append(f"{metric}{format_labels({'command': command, 'collection': collection})} {count}")
+        lines += histogram_lines(
+            ROUND_TRIPS_METRIC, "MongoDB commands issued by one script or fragment rerun.",
+            (({'rerun': name}, histogram.snapshot()) for name, histogram in round_trips)
+        )
+        return lines
+
+
+_monitor: Optional[CommandMonitor] = None
+_monitor_lock = threading.Lock()
+
+
+def get_command_monitor() -> Optional[CommandMonitor]:
+    """Get the process-wide command monitor (None when MONGO_COMMAND_MONITORING is off)"""
+    global _monitor
+    if os.getenv('MONGO_COMMAND_MONITORING', 'true').lower() not in ('1', 'true', 'yes'):
+        return None
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                monitor = CommandMonitor(
+                    slow_ms=float(os.getenv('MONGO_SLOW_MS', '100')),
+                    round_trips_warn=int(os.getenv('MONGO_ROUND_TRIPS_WARN', '20'))
+                )
+                telemetry = get_telemetry()
+                telemetry.register_collector(monitor.prometheus_lines)
+                telemetry.register_rerun_hook(monitor.rerun_scope)
+                _monitor = monitor
+    return _monitor
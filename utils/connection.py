@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from typing import Optional, Dict, Any
+
+from pymongo import MongoClient
+from pymongo import monitoring
+
+
+def _env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+def get_client_options() -> Dict[str, Any]:
+    """Pool size and timeout options for the shared client, read from the environment."""
+    options = {
+        "maxPoolSize": _env_int("MONGODB_MAX_POOL_SIZE", 50),
+        "minPoolSize": _env_int("MONGODB_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": _env_int("MONGODB_MAX_IDLE_TIME_MS", 300000),
+        "waitQueueTimeoutMS": _env_int("MONGODB_WAIT_QUEUE_TIMEOUT_MS", 5000),
+        "serverSelectionTimeoutMS": _env_int("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "connectTimeoutMS": _env_int("MONGODB_CONNECT_TIMEOUT_MS", 5000),
+        "socketTimeoutMS": _env_int("MONGODB_SOCKET_TIMEOUT_MS", 20000),
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Collect connection pool counters so the pool can be sized from real traffic."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools = 0
+        self.connections_open = 0
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.pool_clears = 0
+        self._waits = {}
+
+    # Pool lifecycle
+    def pool_created(self, event):
+        with self._lock:
+            self.pools += 1
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools = max(0, self.pools - 1)
+
+    # Connection lifecycle
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+            self.connections_open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+            self.connections_open = max(0, self.connections_open - 1)
+
+    # Checkout / checkin
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._waits[threading.get_ident()] = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._waits.pop(threading.get_ident(), None)
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            started = self._waits.pop(threading.get_ident(), None)
+            if started is not None:
+                waited = time.perf_counter() - started
+                self.checkout_wait_total += waited
+                self.checkout_wait_max = max(self.checkout_wait_max, waited)
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pools": self.pools,
+                "connections_open": self.connections_open,
+                "connections_created": self.connections_created,
+                "connections_closed": self.connections_closed,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_checkout_wait_ms": (self.checkout_wait_total / self.checkouts * 1000) if self.checkouts else 0.0,
+                "max_checkout_wait_ms": self.checkout_wait_max * 1000,
+                "pool_clears": self.pool_clears,
+            }
+
+
+class ClientRegistry:
+    """Process-wide, lazily created MongoClient shared by every session and service."""
+
+    _lock = threading.Lock()
+    _client: Optional[MongoClient] = None
+    _uri: Optional[str] = None
+    _stats = PoolStatsListener()
+
+    @classmethod
+    def get_client(cls) -> MongoClient:
+        client = cls._client
+        if client is not None:
+            return client
+
+        with cls._lock:
+            # Another thread may have created it while we waited for the lock
+            if cls._client is None:
+                mongodb_uri = os.getenv("MONGODB_URI")
+                if not mongodb_uri:
+                    raise ValueError("MongoDB URI not found in environment variables")
+                from utils.command_monitor import get_command_monitor
+                listeners = [cls._stats]
+                command_monitor = get_command_monitor()
+                if command_monitor is not None:
+                    listeners.append(command_monitor)
+                cls._client = MongoClient(
+                    mongodb_uri,
+                    event_listeners=listeners,
+                    **get_client_options()
+                )
+                cls._uri = mongodb_uri
+            return cls._client
+
+    @classmethod
+    def get_database(cls, db_name: Optional[str] = None):
+        return cls.get_client()[db_name or os.getenv("MONGODB_DB", "ml-workshop")]
+
+    @classmethod
+    def pool_stats(cls) -> Dict[str, Any]:
+        stats = cls._stats.snapshot()
+        stats["client_created"] = cls._client is not None
+        stats["options"] = get_client_options()
+        return stats
+
+    @classmethod
+    def close(cls):
+        """Close the shared client (tests, shutdown hooks)."""
+        with cls._lock:
+            if cls._client is not None:
+                cls._client.close()
+            cls._client = None
+            cls._uri = None
+
+
+def get_client() -> MongoClient:
+    """Get the shared MongoClient for this process"""
+    return ClientRegistry.get_client()
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Get connection pool statistics for the shared client"""
+    return ClientRegistry.pool_stats()
@@ -1,80 +1,406 @@
 import os
-from pymongo import MongoClient
+import threading
+import time
 import streamlit as st
+from collections import Counter, OrderedDict
 from datetime import datetime
-import random 
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from utils.connection import get_client, get_pool_stats
+from utils.catalog import get_song_catalog, SessionSongs
+from utils.health import get_health_monitor, get_circuit_breaker
+from utils.indexes import ensure_derived_data_once, ensure_indexes_once
+from utils.sampler import get_sampler, get_session_song_limit, response_weights
+from utils.response_counts import get_response_counts, increment_response_count, increment_response_counts
+from utils.label_rollups import ROLLUP_FIELDS, apply_rollup_delta, apply_rollup_deltas, rollup_delta
+from utils.telemetry import get_telemetry
 
 class DatabaseConnection:
     _instance = None
+    _lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(DatabaseConnection, cls).__new__(cls)
-            cls._instance.client = None
-            cls._instance.db = None
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super(DatabaseConnection, cls).__new__(cls)
+                    instance.client = None
+                    instance.db = None
+                    cls._instance = instance
         return cls._instance
 
     def connect(self):
-        """Establish MongoDB connection"""
-        if self.client is None:
-            try:
-                mongodb_uri = os.getenv('MONGODB_URI')
-                if not mongodb_uri:
-                    raise ValueError("MongoDB URI not found in environment variables")
-
-                self.client = MongoClient(mongodb_uri)
-                self.db = self.client[os.getenv('MONGODB_DB', 'ml-workshop')]
-
-                # Test connection
-                self.client.admin.command('ping')
-                return True
-            except Exception as e:
-                st.error(f"Database connection error: {str(e)}")
-                return False
+        """Establish MongoDB connection using the shared process-wide client"""
+        if self.db is None:
+            with self._lock:
+                if self.db is not None:
+                    return True
+                try:
+                    client = get_client()
+
+                    # Test connection
+                    client.admin.command('ping')
+                    self.client = client
+                    self.db = client[os.getenv('MONGODB_DB', 'ml-workshop')]
+                    ensure_indexes_once(self.db)
+                    ensure_derived_data_once(self.db)
+                    return True
+                except Exception as e:
+                    st.error(f"Database connection error: {str(e)}")
+                    return False
         return True
 
     def get_database(self):
-        """Get database instance"""
+        """Get database instance, or None right away while the circuit breaker is open"""
+        if not get_circuit_breaker().allow_request():
+            return None
         if self.connect():
             return self.db
         return None
 
+    @staticmethod
+    def pool_stats():
+        """Get connection pool statistics of the shared client"""
+        return get_pool_stats()
+
+    @staticmethod
+    def command_stats():
+        """Get per-command latency, round trips per rerun and recent slow commands"""
+        from utils.command_monitor import get_command_monitor
+        monitor = get_command_monitor()
+        return monitor.snapshot() if monitor is not None else {}
+
 def get_filtered_songs():
     """Get songs filtered for human study, favoring those with fewer responses"""
     db = DatabaseConnection().get_database()
     if db is None:
-        return []
+        return SessionSongs.empty()
 
     try:
-        songs_collection = db[os.getenv('SONGS_COLLECTION', 'songs_lang')]
-        responses_collection = db[os.getenv('RESPONSES_COLLECTION', 'user_responses')]
+        # Shared, projected snapshot of the study songs (memory lookup after the first load)
+        catalog = get_song_catalog(db)
+
+        # Counters are maintained on save, so this is O(#songs) rather than O(#responses)
+        response_counts = get_response_counts(db)
+
+        # Weighted sample without replacement; only the first MAX_SONGS_PER_SESSION are drawn
+        weights = response_weights(catalog.ids, response_counts)
+        order = get_sampler().sample(weights, k=get_session_song_limit())
+
+        get_circuit_breaker().record_success()
+        # The session keeps only catalog slots; song documents stay shared
+        return SessionSongs(catalog, order)
+
+    except Exception as e:
+        get_circuit_breaker().record_error(e)
+        st.error(f"Error fetching songs: {str(e)}")
+        return SessionSongs.empty()
+
+def build_response_document(user_data, song_data, classification_data):
+    """Build the user_responses document for one classification"""
+    response_document = {
+        # User information
+        'user_id': user_data['user_id'],
+        'user_gender': user_data['gender'],
+        'user_age': user_data['age'],
+
+        # Song information
+        'song_id': str(song_data['_id']),
+        'spotify_id': song_data.get('spotify_id'),
+        'artist': song_data['artist'],
+        'title': song_data['title_songs_new'],
+        'genre': song_data.get('genre'),
+        'release_date': song_data.get('release_date'),
+        'popularity': song_data.get('popularity'),
+
+        # Classification data
+        'explicit_content': classification_data['explicit_content'],
+        'sexual_content': classification_data['sexual_content'],
+        'children_suitability': classification_data['children_suitability'],
+        'comments': classification_data.get('comments', ''),
+        'confidence_level': classification_data.get('confidence_level'),
+
+        # Metadata
+        'timestamp': datetime.now(),
+        'song_index': classification_data['song_index'],
+        'session_duration_seconds': classification_data.get('session_duration'),
+        'classification_source': 'human_study_frontend'
+    }
+
+    # Add status (completed/skipped)
+    response_document['status'] = classification_data.get('status', 'completed')
+    return response_document
+
+def write_response_document(db, response_document):
+    """Upsert one response by (user_id, song_id) and keep counters in sync. Raises on failure."""
+    collection = db[os.getenv('RESPONSES_COLLECTION', 'user_responses')]
+    song_id = response_document['song_id']
+
+    # Upsert by unique key (user_id + song_id)
+    filter_doc = {
+        'user_id': response_document['user_id'],
+        'song_id': song_id
+    }
+    update_doc = {
+        '$set': response_document,
+        '$setOnInsert': {'created_at': datetime.now()},
+        '$currentDate': {'updated_at': True}
+    }
+    # The version being replaced (None on first answer) tells which rollup counters move
+    previous = collection.find_one_and_update(
+        filter_doc,
+        update_doc,
+        projection=dict.fromkeys(ROLLUP_FIELDS, 1),
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
 
-        filter_criteria = {
-            "spotify_found": True,
-            "is_human_study": True
-        }
-        songs = list(songs_collection.find(filter_criteria))
+    # First answer for this user+song: bump the song's response counter
+    if previous is None:
+        try:
+            increment_response_count(db, song_id)
+        except Exception:
+            # Counters are advisory and repaired by `manage.py rebuild-counts`
+            pass
 
-        pipeline = [
-            {"$group": {"_id": "$song_id", "count": {"$sum": 1}}}
+    try:
+        apply_rollup_delta(db, song_id, rollup_delta(previous, response_document))
+    except Exception:
+        # The response is saved; rollups are repaired by `manage.py rebuild-rollups`
+        pass
+
+    return True
+
+def _previous_versions(collection, entries):
+    """Stored rollup fields of a batch's (user_id, song_id) pairs, read just before it is written"""
+    keys = [{'user_id': entry['doc']['user_id'], 'song_id': entry['doc']['song_id']} for entry in entries]
+    projection = {'_id': 0, 'user_id': 1, 'song_id': 1, **dict.fromkeys(ROLLUP_FIELDS, 1)}
+    return {(doc['user_id'], doc['song_id']): doc for doc in collection.find({'$or': keys}, projection)}
+
+class BatchMetrics:
+    """Batch size and flush latency counters for the bulk response writer"""
+
+    LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self.items = 0
+        self.operations = 0
+        self.item_errors = 0
+        self.flush_failures = 0
+        self.max_batch = 0
+        self.latency_total_ms = 0.0
+        self.latency_max_ms = 0.0
+        self.latency_buckets = [0] * (len(self.LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, items, operations, errors, latency_ms, failed=False):
+        with self._lock:
+            self.latency_total_ms += latency_ms
+            self.latency_max_ms = max(self.latency_max_ms, latency_ms)
+            bucket = next(
+                (i for i, bound in enumerate(self.LATENCY_BUCKETS_MS) if latency_ms <= bound),
+                len(self.LATENCY_BUCKETS_MS)
+            )
+            self.latency_buckets[bucket] += 1
+            if failed:
+                self.flush_failures += 1
+                return
+            self.flushes += 1
+            self.items += items
+            self.operations += operations
+            self.item_errors += errors
+            self.max_batch = max(self.max_batch, items)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'flushes': self.flushes,
+                'items': self.items,
+                'operations': self.operations,
+                'coalesced': self.items - self.operations,
+                'item_errors': self.item_errors,
+                'flush_failures': self.flush_failures,
+                'avg_batch_size': (self.items / self.flushes) if self.flushes else 0.0,
+                'max_batch_size': self.max_batch,
+                'avg_flush_ms': (self.latency_total_ms / (self.flushes + self.flush_failures))
+                if (self.flushes + self.flush_failures) else 0.0,
+                'max_flush_ms': self.latency_max_ms,
+                'flush_ms_buckets': dict(zip(
+                    [str(b) for b in self.LATENCY_BUCKETS_MS] + ['+Inf'],
+                    self.latency_buckets
+                )),
+            }
+
+    def prometheus_lines(self):
+        """Counters and flush latency histogram in Prometheus text format (telemetry collector)"""
+        with self._lock:
+            counters = (
+                ('flushes', "Successful bulk flushes.", self.flushes),
+                ('items', "Classifications written by bulk flushes.", self.items),
+                ('operations', "Upserts sent after coalescing.", self.operations),
+                ('item_errors', "Classifications rejected inside a bulk write.", self.item_errors),
+                ('flush_failures', "Bulk flushes that failed as a whole.", self.flush_failures),
+            )
+            buckets = list(self.latency_buckets)
+            total_seconds = self.latency_total_ms / 1000
+        lines = []
+        for name, description, value in counters:
+            lines += [
+                f"# HELP app_write_{name}_total {description}",
+                f"# TYPE app_write_{name}_total counter",
+                f"app_write_{name}_total {value}",
+            ]
+        lines += [
+            "# HELP app_write_flush_duration_seconds Latency of bulk response flushes.",
+            "# TYPE app_write_flush_duration_seconds histogram",
         ]
-        response_counts = {doc["_id"]: doc["count"] for doc in responses_collection.aggregate(pipeline)}
+        running = 0
+        for bound, count in zip(list(self.LATENCY_BUCKETS_MS) + [None], buckets):
+            running += count
+            le = '+Inf' if bound is None else repr(bound / 1000)
+            lines.append(f'app_write_flush_duration_seconds_bucket{{le="{le}"}} {running}')
+        lines.append(f"app_write_flush_duration_seconds_sum {total_seconds!r}")
+        lines.append(f"app_write_flush_duration_seconds_count {running}")
+        return lines
 
-        for song in songs:
-            song_id = str(song["_id"])
-            count = response_counts.get(song_id, 0)
-            song["_weight"] = 1 / (count + 1)
 
-        weighted_songs = sorted(
-            songs,
-            key=lambda s: random.random() * (1 / s["_weight"])  
-        )
+batch_metrics = BatchMetrics()
+get_telemetry().register_collector(batch_metrics.prometheus_lines)
 
-        return weighted_songs
 
-    except Exception as e:
-        st.error(f"Error fetching songs: {str(e)}")
-        return []
+class ResponseBatcher:
+    """Coalesce response upserts by (user_id, song_id) and send them as unordered bulk_writes.
+
+    Items are added with a caller token; flush() returns {token: None | error}
+    so every caller learns the outcome of its own write, even when several
+    tokens were coalesced into one operation.
+    """
+
+    def __init__(self, max_batch=100, window_ms=50, metrics: BatchMetrics = None):
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self.metrics = metrics or batch_metrics
+        self._ops = {}
+        self._items = 0
+        self._opened_at = None
+
+    @property
+    def pending(self):
+        return self._items
+
+    @property
+    def full(self):
+        return len(self._ops) >= self.max_batch
+
+    def time_until_due(self):
+        if self._opened_at is None:
+            return self.window
+        return max(0.0, self._opened_at + self.window - time.monotonic())
+
+    @property
+    def due(self):
+        return self._opened_at is not None and self.time_until_due() == 0.0
+
+    def add(self, token, response_document):
+        key = (response_document['user_id'], response_document['song_id'])
+        if self._opened_at is None:
+            self._opened_at = time.monotonic()
+        entry = self._ops.get(key)
+        if entry is None:
+            self._ops[key] = {'doc': dict(response_document), 'tokens': [token]}
+        else:
+            # Later answers for the same user+song win, as with sequential upserts
+            entry['doc'].update(response_document)
+            entry['tokens'].append(token)
+        self._items += 1
+
+    def clear(self):
+        """Drop the pending batch without writing it"""
+        self._ops = {}
+        self._items = 0
+        self._opened_at = None
+
+    def flush(self, db):
+        """Send the pending batch; returns {token: None on success, error message otherwise}.
+
+        Connection-level failures are raised and the batch is kept for a retry.
+        """
+        entries = list(self._ops.values())
+        items = self._items
+        if not entries:
+            return {}
+
+        collection = db[os.getenv('RESPONSES_COLLECTION', 'user_responses')]
+        now = datetime.now()
+        operations = [
+            UpdateOne(
+                {'user_id': entry['doc']['user_id'], 'song_id': entry['doc']['song_id']},
+                {
+                    '$set': entry['doc'],
+                    '$setOnInsert': {'created_at': now},
+                    '$currentDate': {'updated_at': True}
+                },
+                upsert=True
+            )
+            for entry in entries
+        ]
+
+        errors = {}
+        upserted_indexes = []
+        started = time.perf_counter()
+        try:
+            previous = _previous_versions(collection, entries)
+            result = collection.bulk_write(operations, ordered=False)
+            upserted_indexes = list(result.upserted_ids.keys())
+        except BulkWriteError as e:
+            # Unordered: failed operations are reported by index, the rest were applied
+            for write_error in e.details.get('writeErrors', []):
+                errors[write_error['index']] = write_error.get('errmsg', 'write error')
+            upserted_indexes = [item['index'] for item in e.details.get('upserted', [])]
+        except Exception:
+            latency_ms = (time.perf_counter() - started) * 1000
+            self.metrics.record(items, len(operations), 0, latency_ms, failed=True)
+            raise
+
+        self._ops = {}
+        self._items = 0
+        self._opened_at = None
+
+        # First answers in this batch: bump their songs' response counters together
+        increments = Counter(entries[idx]['doc']['song_id'] for idx in upserted_indexes)
+        try:
+            increment_response_counts(db, increments)
+        except Exception:
+            # Counters are advisory and repaired by `manage.py rebuild-counts`
+            pass
+
+        # Label rollups: each applied upsert moves its song's counters from the prefetched version.
+        # A concurrent write of the same pair from another process in between is repaired by
+        # `manage.py rebuild-rollups`
+        deltas = [
+            (entry['doc']['song_id'],
+             rollup_delta(previous.get((entry['doc']['user_id'], entry['doc']['song_id'])), entry['doc']))
+            for idx, entry in enumerate(entries)
+            if idx not in errors
+        ]
+        try:
+            apply_rollup_deltas(db, deltas)
+        except Exception:
+            pass
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        results = {}
+        for idx, entry in enumerate(entries):
+            for token in entry['tokens']:
+                results[token] = errors.get(idx)
+        self.metrics.record(items, len(operations), sum(len(entries[idx]['tokens']) for idx in errors), latency_ms)
+        return results
+
+def get_batch_metrics():
+    """Get batch size and flush latency metrics of the bulk response writer"""
+    return batch_metrics.snapshot()
 
 def save_user_classification(user_data, song_data, classification_data):
     """Save user classification to database. Upsert to avoid duplicate entries per user+song."""
@@ -83,96 +409,130 @@ def save_user_classification(user_data, song_data, classification_data):
         return False
 
     try:
-        collection = db[os.getenv('RESPONSES_COLLECTION', 'user_responses')]
-        response_document = {
-            # User information
-            'user_id': user_data['user_id'],
-            'user_gender': user_data['gender'],
-            'user_age': user_data['age'],
-
-            # Song information
-            'song_id': str(song_data['_id']),
-            'spotify_id': song_data.get('spotify_id'),
-            'artist': song_data['artist'],
-            'title': song_data['title_songs_new'],
-            'genre': song_data.get('genre'),
-            'release_date': song_data.get('release_date'),
-            'popularity': song_data.get('popularity'),
-
-            # Classification data
-            'explicit_content': classification_data['explicit_content'],
-            'sexual_content': classification_data['sexual_content'],
-            'children_suitability': classification_data['children_suitability'],
-            'comments': classification_data.get('comments', ''),
-            'confidence_level': classification_data.get('confidence_level'),
-
-            # Metadata
-            'timestamp': datetime.now(),
-            'song_index': classification_data['song_index'],
-            'session_duration_seconds': classification_data.get('session_duration'),
-            'classification_source': 'human_study_frontend'
-    }
-
-        # Add status (completed/skipped)
-        response_document['status'] = classification_data.get('status', 'completed')
-
-        # Upsert by unique key (user_id + song_id)
-        filter_doc = {
-            'user_id': response_document['user_id'],
-            'song_id': response_document['song_id']
-        }
-        update_doc = {
-            '$set': response_document,
-            '$setOnInsert': {'created_at': datetime.now()},
-            '$currentDate': {'updated_at': True}
-        }
-        result = collection.update_one(filter_doc, update_doc, upsert=True)
-        return result.acknowledged
+        response_document = build_response_document(user_data, song_data, classification_data)
+        acknowledged = write_response_document(db, response_document)
+        get_circuit_breaker().record_success()
+        record_progress(response_document)
+        return acknowledged
 
     except Exception as e:
+        get_circuit_breaker().record_error(e)
         st.error(f"Error saving classification: {str(e)}")
         return False
 
+class ProgressCache:
+    """Per-user (song_id -> status) cache, kept in sync by the save path.
+
+    Entries expire after PROGRESS_CACHE_TTL_SECONDS so progress written by
+    another process is picked up eventually; at most PROGRESS_CACHE_MAX_USERS
+    users are kept (least recently used are evicted first).
+    """
+
+    def __init__(self, max_users=5000, ttl=600.0):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            loaded_at, progress = entry
+            if time.monotonic() - loaded_at >= self.ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return list(progress.items())
+
+    def put(self, user_id, pairs):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), dict(pairs))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def record(self, user_id, song_id, status):
+        """Write-through from the save path; only users already cached are updated"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[1][song_id] = status
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+progress_cache = ProgressCache(
+    max_users=int(os.getenv('PROGRESS_CACHE_MAX_USERS', '5000')),
+    ttl=float(os.getenv('PROGRESS_CACHE_TTL_SECONDS', '600'))
+)
+
+def record_progress(response_document):
+    """Keep the progress cache in sync with a response that is being saved"""
+    progress_cache.record(
+        response_document['user_id'],
+        response_document['song_id'],
+        response_document.get('status', 'completed')
+    )
+
 def get_user_progress(user_id):
-    """Get user's classification progress"""
+    """Get user's classification progress as a list of (song_id, status) pairs.
+
+    One covered query on the (user_id, song_id, status) index, or no query at
+    all when the user's progress is already cached in this process. Returns
+    None when the database is unavailable or the query fails.
+    """
+    cached = progress_cache.get(user_id)
+    if cached is not None:
+        return cached
+
     db = DatabaseConnection().get_database()
     if db is None:
-        return []
+        return None
 
     try:
         collection = db[os.getenv('RESPONSES_COLLECTION', 'user_responses')]
-        classified_songs = list(collection.find(
+        query = collection.find(
             {'user_id': user_id},
-            {'song_id': 1, 'song_index': 1}
-        ))
+            {'_id': 0, 'song_id': 1, 'status': 1}
+        )
+        try:
+            docs = list(query.hint('user_progress_covering'))
+        except OperationFailure:
+            # Index not created yet (AUTO_CREATE_INDEXES disabled): same query, planner's choice
+            docs = list(collection.find({'user_id': user_id}, {'_id': 0, 'song_id': 1, 'status': 1}))
 
-        return [song['song_id'] for song in classified_songs]
+        get_circuit_breaker().record_success()
+        progress = [(doc['song_id'], doc.get('status') or 'completed') for doc in docs]
+        progress_cache.put(user_id, progress)
+        return progress
 
     except Exception as e:
+        get_circuit_breaker().record_error(e)
         st.error(f"Error fetching user progress: {str(e)}")
-        return []
+        return None
 
 def check_database_health():
-    """Check if database is accessible and collections exist"""
-    db = DatabaseConnection().get_database()
-    if db is None:
-        return False
+    """Check database health from the cached background probe (no I/O on the rerun path)"""
+    monitor = get_health_monitor()
+    # Only the very first rerun of the process waits for a probe result
+    monitor.wait_for_first_probe(timeout=float(os.getenv('HEALTH_INITIAL_WAIT_SECONDS', '5')))
+    status = monitor.status()
 
-    try:
-        # Check if songs collection exists and has data
-        songs_collection = db[os.getenv('SONGS_COLLECTION', 'songs_lang')]
-        songs_count = songs_collection.count_documents({
-            "spotify_found": True,
-            "is_human_study": True
-        })
-
-        if songs_count == 0:
-            st.warning("⚠️ No songs found with the required criteria (spotify_found: true, is_human_study: true)")
-            return False
-
-        st.success(f"✅ Database connected successfully. Found {songs_count} songs for the study.")
-        return True
+    if not status['healthy']:
+        if status['error']:
+            st.error(f"Database health check failed: {status['error']}")
+        return False
 
-    except Exception as e:
-        st.error(f"Database health check failed: {str(e)}")
+    if status['songs_count'] == 0:
+        st.warning("⚠️ No songs found with the required criteria (spotify_found: true, is_human_study: true)")
         return False
+
+    st.success(f"✅ Database connected successfully. Found {status['songs_count']} songs for the study.")
+    return True
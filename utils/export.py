@@ -0,0 +1,221 @@
+import os
+import csv
+import json
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, Optional, Iterator, List, Tuple
+
+from bson import ObjectId
+
+# Exported columns and their types, in file order
+EXPORT_COLUMNS: List[Tuple[str, str]] = [
+    ('_id', 'string'),
+    ('user_id', 'string'),
+    ('user_gender', 'string'),
+    ('user_age', 'int'),
+    ('song_id', 'string'),
+    ('spotify_id', 'string'),
+    ('artist', 'string'),
+    ('title', 'string'),
+    ('genre', 'string'),
+    ('release_date', 'string'),
+    ('popularity', 'int'),
+    ('status', 'string'),
+    ('explicit_content', 'string'),
+    ('sexual_content', 'string'),
+    ('children_suitability', 'string'),
+    ('confidence_level', 'string'),
+    ('comments', 'string'),
+    ('song_index', 'int'),
+    ('session_duration_seconds', 'float'),
+    ('classification_source', 'string'),
+    ('timestamp', 'datetime'),
+    ('created_at', 'datetime'),
+    ('updated_at', 'datetime'),
+]
+
+FORMATS = ('parquet', 'csv')
+
+
+def _coerce(value, kind):
+    """Cast a stored value to the column type; values that do not fit become None"""
+    if value is None:
+        return None
+    try:
+        if kind == 'string':
+            return str(value)
+        if kind == 'int':
+            return int(value)
+        if kind == 'float':
+            return float(value)
+        if kind == 'datetime':
+            return value if isinstance(value, datetime) else None
+    except (TypeError, ValueError):
+        return None
+    return value
+
+
+def export_row(doc) -> Dict[str, Any]:
+    return {name: _coerce(doc.get(name), kind) for name, kind in EXPORT_COLUMNS}
+
+
+class Watermark:
+    """Position of the last exported response: (updated_at, _id), the sort key of the export.
+
+    Stored as JSON; a run only reads documents strictly after it, so nightly
+    exports touch new and re-submitted responses only.
+    """
+
+    def __init__(self, updated_at: Optional[datetime] = None, last_id: Optional[ObjectId] = None):
+        self.updated_at = updated_at
+        self.last_id = last_id
+
+    def query(self) -> Dict[str, Any]:
+        if self.updated_at is None:
+            return {}
+        return {'$or': [
+            {'updated_at': {'$gt': self.updated_at}},
+            {'updated_at': self.updated_at, '_id': {'$gt': self.last_id}},
+        ]}
+
+    def advance(self, doc):
+        self.updated_at = doc.get('updated_at')
+        self.last_id = doc['_id']
+
+    @classmethod
+    def load(cls, path) -> 'Watermark':
+        if not path or not os.path.exists(path):
+            return cls()
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(datetime.fromisoformat(data['updated_at']), ObjectId(data['_id']))
+
+    def save(self, path, **extra):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {'updated_at': self.updated_at.isoformat(), '_id': str(self.last_id), **extra}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, default=str)
+        os.replace(tmp_path, path)
+
+
+def server_time(db) -> datetime:
+    """Current time on the server (naive UTC, like the stored updated_at values)"""
+    try:
+        return db.command('hello')['localTime']
+    except Exception:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def iter_responses(db, watermark: Watermark, until: Optional[datetime] = None,
+                   batch_size=5000) -> Iterator[Dict[str, Any]]:
+    """Responses after the watermark in (updated_at, _id) order, fetched batch_size at a time"""
+    collection = db[os.getenv('RESPONSES_COLLECTION', 'user_responses')]
+    query = watermark.query()
+    if until is not None:
+        # Leave out writes of the last seconds: one still in flight could commit with an older
+        # updated_at than a document already read, and the next run would skip it
+        settled = {'updated_at': {'$lt': until}}
+        if not query:
+            # Full export: responses saved before updated_at existed (null) sort first
+            settled = {'$or': [settled, {'updated_at': None}]}
+        query = {'$and': [query, settled]} if query else settled
+    projection = {name: 1 for name, _ in EXPORT_COLUMNS}
+    cursor = collection.find(query, projection)
+    cursor = cursor.sort([('updated_at', 1), ('_id', 1)]).batch_size(batch_size)
+    with cursor:
+        yield from cursor
+
+
+class CsvWriter:
+    def __init__(self, path):
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=[name for name, _ in EXPORT_COLUMNS])
+        self._writer.writeheader()
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """One row group per batch, so memory stays bounded by the batch size"""
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow) or use --format csv") from e
+        types = {'string': pa.string(), 'int': pa.int64(), 'float': pa.float64(), 'datetime': pa.timestamp('ms')}
+        self._pa = pa
+        self._schema = pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS])
+        self._writer = pq.ParquetWriter(path, self._schema, compression='zstd')
+
+    def write(self, rows):
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def _open_writer(fmt, path):
+    if fmt == 'parquet':
+        return ParquetWriter(path)
+    if fmt == 'csv':
+        return CsvWriter(path)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def export_responses(db, output_dir, fmt='parquet', incremental=False, batch_size=5000,
+                     settle_seconds=5.0) -> Dict[str, Any]:
+    """Stream user_responses to a new file in output_dir and move the watermark past it.
+
+    Full exports (incremental=False) read everything and also set the
+    watermark, so the next incremental run starts where they ended. The file
+    is written under a temporary name and the watermark saved only once it is
+    complete; a failed run leaves both untouched. Re-submitted responses
+    appear again in a later file: keep the last row per _id.
+    """
+    state_path = os.path.join(output_dir, 'user_responses.watermark.json')
+    watermark = Watermark.load(state_path) if incremental else Watermark()
+    until = server_time(db) - timedelta(seconds=settle_seconds)
+
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+    kind = 'incremental' if incremental and watermark.updated_at is not None else 'full'
+    path = os.path.join(output_dir, f"user_responses-{kind}-{stamp}.{fmt}")
+    tmp_path = f"{path}.part"
+
+    writer = None
+    rows, batch = 0, []
+    try:
+        for doc in iter_responses(db, watermark, until=until, batch_size=batch_size):
+            if writer is None:
+                writer = _open_writer(fmt, tmp_path)
+            batch.append(export_row(doc))
+            watermark.advance(doc)
+            if len(batch) >= batch_size:
+                writer.write(batch)
+                rows += len(batch)
+                batch = []
+        if batch:
+            writer.write(batch)
+            rows += len(batch)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            os.remove(tmp_path)
+        raise
+
+    if writer is None:
+        return {'rows': 0, 'file': None, 'kind': kind, 'watermark': watermark.updated_at}
+
+    writer.close()
+    os.replace(tmp_path, path)
+    if watermark.updated_at is not None:
+        watermark.save(state_path, file=os.path.basename(path), rows=rows, exported_at=datetime.now())
+    return {'rows': rows, 'file': path, 'kind': kind, 'watermark': watermark.updated_at}
@@ -0,0 +1,166 @@
+import os
+import logging
+import threading
+import time
+from typing import Optional, Dict, Any
+
+from pymongo.errors import AutoReconnect, ConnectionFailure, NetworkTimeout, ServerSelectionTimeoutError
+
+from utils.catalog import STUDY_FILTER
+from utils.connection import ClientRegistry
+
+logger = logging.getLogger(__name__)
+
+# Errors meaning the server could not be reached; bad data, duplicate keys or config mistakes are not
+CONNECTION_ERRORS = (ConnectionFailure, ServerSelectionTimeoutError, NetworkTimeout, AutoReconnect)
+
+
+class CircuitBreaker:
+    """Fail fast while the database is down instead of waiting on server-selection timeouts."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def allow_request(self) -> bool:
+        """True while closed; a half-open breaker lets a single trial call through.
+
+        Other calls are refused until the trial records a success or a
+        failure (or, if it never reports, until another reset timeout passes).
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_timeout:
+                return False
+            if self._trial_started is not None and now - self._trial_started < self.reset_timeout:
+                return False
+            self._trial_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+            self._trial_started = None
+
+    def record_error(self, error: BaseException):
+        """Count an exception against the breaker only if it means the server is unreachable"""
+        if isinstance(error, CONNECTION_ERRORS):
+            self.record_failure()
+
+    def record_failure(self):
+        with self._lock:
+            self._trial_started = None
+            self._failures += 1
+            if self._state != self.CLOSED or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class HealthMonitor:
+    """Background thread that probes the database on an interval and caches the result."""
+
+    def __init__(self, interval=15.0, probe_timeout_ms=2000, breaker: Optional[CircuitBreaker] = None):
+        self.interval = interval
+        self.probe_timeout_ms = probe_timeout_ms
+        self.breaker = breaker or CircuitBreaker()
+        self._status: Dict[str, Any] = {
+            'healthy': False,
+            'songs_count': 0,
+            'error': None,
+            'checked_at': None,
+            'latency_ms': None,
+        }
+        self._first_probe = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def probe(self):
+        """Run one ping + study song count and update the cached status"""
+        started = time.perf_counter()
+        try:
+            db = ClientRegistry.get_database()
+            db.command('ping')
+            songs_collection = db[os.getenv('SONGS_COLLECTION', 'songs_lang')]
+            songs_count = songs_collection.count_documents(STUDY_FILTER, maxTimeMS=self.probe_timeout_ms)
+            status = {'healthy': True, 'songs_count': songs_count, 'error': None}
+            self.breaker.record_success()
+        except Exception as e:
+            status = {'healthy': False, 'songs_count': self._status['songs_count'], 'error': str(e)}
+            self.breaker.record_failure()
+            logger.warning("Database health probe failed: %s", e)
+
+        status['checked_at'] = time.time()
+        status['latency_ms'] = (time.perf_counter() - started) * 1000
+        self._status = status
+        self._first_probe.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="db-health-monitor", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def wait_for_first_probe(self, timeout: float) -> bool:
+        return self._first_probe.wait(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        """Cached health status; never performs I/O"""
+        status = dict(self._status)
+        status['breaker_state'] = self.breaker.state
+        return status
+
+
+_monitor: Optional[HealthMonitor] = None
+_monitor_lock = threading.Lock()
+
+
+def get_health_monitor() -> HealthMonitor:
+    """Get the process-wide health monitor, starting it on first use"""
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                breaker = CircuitBreaker(
+                    failure_threshold=int(os.getenv('DB_BREAKER_FAILURE_THRESHOLD', '3')),
+                    reset_timeout=float(os.getenv('DB_BREAKER_RESET_SECONDS', '30'))
+                )
+                monitor = HealthMonitor(
+                    interval=float(os.getenv('HEALTH_CHECK_INTERVAL_SECONDS', '15')),
+                    probe_timeout_ms=int(os.getenv('HEALTH_PROBE_TIMEOUT_MS', '2000')),
+                    breaker=breaker
+                )
+                monitor.start()
+                _monitor = monitor
+    return _monitor
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    return get_health_monitor().breaker
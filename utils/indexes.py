@@ -0,0 +1,309 @@
+import os
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from utils.catalog import STUDY_FILTER, CATALOG_FIELDS
+from utils.label_rollups import ROLLUP_FIELDS, bootstrap_label_rollups
+from utils.response_counts import bootstrap_response_counts, get_counts_collection
+
+logger = logging.getLogger(__name__)
+
+
+def _collection_names() -> Dict[str, str]:
+    return {
+        'songs': os.getenv('SONGS_COLLECTION', 'songs_lang'),
+        'responses': os.getenv('RESPONSES_COLLECTION', 'user_responses'),
+        'users': os.getenv('USERS_COLLECTION', 'users'),
+    }
+
+
+def get_index_specs() -> List[Dict[str, Any]]:
+    """Indexes backing every query the app runs. Names are fixed so bootstrap is idempotent."""
+    names = _collection_names()
+    return [
+        {
+            'collection': names['responses'],
+            'name': 'user_song_unique',
+            'keys': [('user_id', 1), ('song_id', 1)],
+            'options': {'unique': True},
+        },
+        {
+            # Progress sync reads only song_id + status for a user: answered from the index alone
+            'collection': names['responses'],
+            'name': 'user_progress_covering',
+            'keys': [('user_id', 1), ('song_id', 1), ('status', 1)],
+            'options': {},
+        },
+        {
+            # Per-song grouping (counter rebuild) walks this index instead of the documents
+            'collection': names['responses'],
+            'name': 'song_id',
+            'keys': [('song_id', 1)],
+            'options': {},
+        },
+        {
+            # Incremental export walks responses after a (updated_at, _id) watermark in this order
+            'collection': names['responses'],
+            'name': 'updated_at_id',
+            'keys': [('updated_at', 1), ('_id', 1)],
+            'options': {},
+        },
+        {
+            'collection': names['songs'],
+            'name': 'study_songs_partial',
+            'keys': [('spotify_found', 1), ('is_human_study', 1)],
+            'options': {'partialFilterExpression': dict(STUDY_FILTER)},
+        },
+        {
+            'collection': names['users'],
+            'name': 'email_1',
+            'keys': [('email', 1)],
+            # Use partial filter to ignore docs without an email
+            'options': {
+                'unique': True,
+                'partialFilterExpression': {"email": {"$exists": True, "$type": "string"}},
+            },
+        },
+    ]
+
+
+def ensure_indexes(db, collections: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Create any missing index. Safe to run repeatedly; returns one result per index."""
+    results = []
+    for spec in get_index_specs():
+        if collections is not None and spec['collection'] not in collections:
+            continue
+        result = {'collection': spec['collection'], 'name': spec['name']}
+        try:
+            collection = db[spec['collection']]
+            existed = spec['name'] in collection.index_information()
+            collection.create_index(spec['keys'], name=spec['name'], **spec['options'])
+            result['status'] = 'exists' if existed else 'created'
+        except OperationFailure as e:
+            # Conflicting definition, duplicate keys for a unique index, missing privileges...
+            result['status'] = 'error'
+            result['error'] = str(e)
+        results.append(result)
+    return results
+
+
+def ensure_unique_email_index(db) -> bool:
+    """Create users.email_1 whatever AUTO_CREATE_INDEXES says; True once it is confirmed to exist.
+
+    Registration relies on it to reject duplicate accounts.
+    """
+    try:
+        results = ensure_indexes(db, collections=[_collection_names()['users']])
+    except Exception as e:
+        logger.warning("Unique email index not confirmed: %s", e)
+        return False
+    for result in results:
+        if result['name'] == 'email_1':
+            if result['status'] == 'error':
+                logger.warning("Unique email index not created: %s", result['error'])
+            return result['status'] in ('exists', 'created')
+    return False
+
+
+_ensured = False
+_ensure_lock = threading.Lock()
+
+
+def ensure_indexes_once(db):
+    """Bootstrap indexes once per process (AUTO_CREATE_INDEXES).
+
+    Only a run that reached the server counts: after a connection-level error
+    the next call tries again.
+    """
+    global _ensured
+    if _ensured or os.getenv('AUTO_CREATE_INDEXES', 'true').lower() not in ('1', 'true', 'yes'):
+        return
+    with _ensure_lock:
+        if _ensured:
+            return
+        try:
+            results = ensure_indexes(db)
+        except Exception as e:
+            logger.warning("Index bootstrap failed, retrying on next use: %s", e)
+            return
+        _ensured = True
+        for result in results:
+            if result['status'] == 'error':
+                logger.warning("Index %s.%s not created: %s",
+                               result['collection'], result['name'], result['error'])
+
+
+_derived_ready = False
+_derived_lock = threading.Lock()
+
+
+def ensure_derived_data_once(db):
+    """Build the response counters and label rollups once per process if they are still empty.
+
+    Unlike the indexes this does not depend on AUTO_CREATE_INDEXES: the song
+    sampler and the rollups are wrong without them. After an error the next call tries again.
+    """
+    global _derived_ready
+    if _derived_ready:
+        return
+    with _derived_lock:
+        if _derived_ready:
+            return
+        try:
+            for name, bootstrap in (('response counters', bootstrap_response_counts),
+                                    ('label rollups', bootstrap_label_rollups)):
+                if bootstrap(db):
+                    logger.info("Built %s from existing responses", name)
+        except Exception as e:
+            logger.warning("Derived data bootstrap failed, retrying on next use: %s", e)
+            return
+        _derived_ready = True
+
+
+def get_query_shapes(db) -> List[Dict[str, Any]]:
+    """Every query shape issued by the app, as explain commands with placeholder values"""
+    from utils.auth import LOGIN_PROJECTION  # utils.auth imports this module
+    names = _collection_names()
+    user_id = '000000000000000000000000'
+    song_id = '000000000000000000000000'
+    return [
+        {
+            'name': 'catalog load (songs by study filter)',
+            'command': {
+                'find': names['songs'],
+                'filter': dict(STUDY_FILTER),
+                'projection': {field: 1 for field in CATALOG_FIELDS},
+            },
+        },
+        {
+            'name': 'health probe (count study songs)',
+            'command': {'count': names['songs'], 'query': dict(STUDY_FILTER)},
+        },
+        {
+            'name': 'response upsert by (user_id, song_id)',
+            'command': {
+                'update': names['responses'],
+                'updates': [{
+                    'q': {'user_id': user_id, 'song_id': song_id},
+                    'u': {'$set': {'status': 'completed'}},
+                    'upsert': True,
+                }],
+            },
+        },
+        {
+            'name': 'response upsert returning the previous version (findAndModify)',
+            'command': {
+                'findAndModify': names['responses'],
+                'query': {'user_id': user_id, 'song_id': song_id},
+                'update': {'$set': {'status': 'completed'}},
+                'fields': dict.fromkeys(ROLLUP_FIELDS, 1),
+                'upsert': True,
+            },
+        },
+        {
+            'name': 'previous versions of a response batch (for label rollups)',
+            'command': {
+                'find': names['responses'],
+                'filter': {'$or': [
+                    {'user_id': user_id, 'song_id': song_id},
+                    {'user_id': user_id, 'song_id': '111111111111111111111111'},
+                ]},
+                'projection': {'_id': 0, 'user_id': 1, 'song_id': 1, **dict.fromkeys(ROLLUP_FIELDS, 1)},
+            },
+        },
+        {
+            'name': 'user progress (song_id, status by user_id)',
+            'command': {
+                'find': names['responses'],
+                'filter': {'user_id': user_id},
+                'projection': {'_id': 0, 'song_id': 1, 'status': 1},
+                'hint': 'user_progress_covering',
+            },
+            'covered': True,
+        },
+        {
+            'name': 'response counts rebuild ($group by song_id)',
+            'command': {
+                'aggregate': names['responses'],
+                'pipeline': [
+                    {'$sort': {'song_id': 1}},
+                    {'$group': {'_id': '$song_id', 'count': {'$sum': 1}}},
+                ],
+                'cursor': {},
+            },
+        },
+        {
+            'name': 'incremental export (responses after an updated_at watermark)',
+            'command': {
+                'find': names['responses'],
+                'filter': {'$or': [
+                    {'updated_at': {'$gt': datetime(2000, 1, 1)}},
+                    {'updated_at': datetime(2000, 1, 1), '_id': {'$gt': ObjectId(song_id)}},
+                ]},
+                'sort': {'updated_at': 1, '_id': 1},
+            },
+        },
+        {
+            # Reads every counter on purpose (one small document per song)
+            'name': 'response counters read',
+            'command': {'find': get_counts_collection(db).name, 'filter': {}, 'projection': {'count': 1}},
+            'allow_collscan': True,
+        },
+        {
+            'name': 'login (user by email)',
+            'command': {
+                'find': names['users'],
+                'filter': {'email': 'participant@example.com'},
+                'projection': dict(LOGIN_PROJECTION),
+                'limit': 1,
+            },
+        },
+    ]
+
+
+def _plan_stages(node, stages):
+    """Collect stage names of the winning plan(s), ignoring rejected plans"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in ('rejectedPlans', 'executionStats', 'serverInfo', 'command'):
+                continue
+            if key == 'stage' and isinstance(value, str):
+                stages.append(value)
+            else:
+                _plan_stages(value, stages)
+    elif isinstance(node, list):
+        for item in node:
+            _plan_stages(item, stages)
+    return stages
+
+
+def verify_query_plans(db) -> List[Dict[str, Any]]:
+    """Run explain() on every query shape; a shape fails if its plan uses COLLSCAN.
+
+    Shapes marked covered also fail when the plan has to FETCH documents. The
+    only allowed full scan is the counters read, which wants every document.
+    """
+    results = []
+    for shape in get_query_shapes(db):
+        result = {'name': shape['name']}
+        try:
+            explain = db.command('explain', shape['command'], verbosity='queryPlanner')
+            stages = _plan_stages(explain, [])
+            result['stages'] = stages
+            result['ok'] = shape.get('allow_collscan', False) or 'COLLSCAN' not in stages
+            if shape.get('covered') and 'FETCH' in stages:
+                result['ok'] = False
+                result['error'] = 'not covered by an index (FETCH stage)'
+            elif not result['ok']:
+                result['error'] = 'collection scan (COLLSCAN)'
+        except Exception as e:
+            result['ok'] = False
+            result['stages'] = []
+            result['error'] = str(e)
+        results.append(result)
+    return results
@@ -0,0 +1,173 @@
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterable
+
+from pymongo import ReplaceOne, UpdateOne
+
+# Counted answers per question; other values (e.g. legacy free text) are left out of the rollup
+ROLLUP_ANSWERS = {
+    'explicit_content': ('No', 'Sí', 'No estoy seguro/a'),
+    'sexual_content': ('No', 'Sí', 'No estoy seguro/a'),
+    'children_suitability': ('No', 'Sí', 'No estoy seguro/a'),
+    'confidence_level': ('Muy inseguro', 'Inseguro', 'Neutral', 'Seguro', 'Muy seguro'),
+}
+
+# Fields of a stored response the rollup depends on (projection of the previous version)
+ROLLUP_FIELDS = ('status', *ROLLUP_ANSWERS)
+
+
+def get_rollups_collection(db):
+    return db[os.getenv('LABEL_ROLLUPS_COLLECTION', 'song_label_rollups')]
+
+
+def rollup_counters(doc: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """Counters one response contributes to its song's rollup, as dotted $inc paths.
+
+    Skipped songs only count as skipped: their form defaults are not answers.
+    """
+    if not doc:
+        return {}
+    if doc.get('status') == 'skipped':
+        return {'skipped': 1}
+    counters = {'answered': 1}
+    for question, answers in ROLLUP_ANSWERS.items():
+        if doc.get(question) in answers:
+            counters[f"{question}.{doc[question]}"] = 1
+    return counters
+
+
+def rollup_delta(previous: Optional[Dict[str, Any]], current: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """Counter changes when a response goes from `previous` (None if new) to `current`"""
+    delta = dict(rollup_counters(current))
+    for path, amount in rollup_counters(previous).items():
+        delta[path] = delta.get(path, 0) - amount
+    return {path: amount for path, amount in delta.items() if amount}
+
+
+def _rollup_update(delta):
+    return {'$inc': delta, '$currentDate': {'updated_at': True}}
+
+
+def apply_rollup_delta(db, song_id, delta: Dict[str, int]):
+    """Atomically apply one response's counter changes (no-op when nothing changed)"""
+    if delta:
+        get_rollups_collection(db).update_one({'_id': song_id}, _rollup_update(delta), upsert=True)
+
+
+def apply_rollup_deltas(db, deltas: Iterable):
+    """Merge (song_id, delta) pairs per song and apply them in one unordered bulk_write"""
+    merged = defaultdict(dict)
+    for song_id, delta in deltas:
+        for path, amount in delta.items():
+            merged[song_id][path] = merged[song_id].get(path, 0) + amount
+    operations = []
+    for song_id, delta in merged.items():
+        delta = {path: amount for path, amount in delta.items() if amount}
+        if delta:
+            operations.append(UpdateOne({'_id': song_id}, _rollup_update(delta), upsert=True))
+    if operations:
+        get_rollups_collection(db).bulk_write(operations, ordered=False)
+
+
+def get_label_rollups(db, song_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Rollup documents by song_id (all songs, or only song_ids)"""
+    query = {} if song_ids is None else {'_id': {'$in': list(song_ids)}}
+    return {doc.pop('_id'): doc for doc in get_rollups_collection(db).find(query, {'updated_at': 0})}
+
+
+def majority_answer(rollup: Dict[str, Any], question) -> Optional[str]:
+    """Most frequent answer to a question in a rollup document (None without answers)"""
+    counts = {answer: count for answer, count in (rollup.get(question) or {}).items() if count > 0}
+    return max(counts, key=counts.get) if counts else None
+
+
+def _rollup_pipeline():
+    """$group computing every counter from user_responses ($group output names cannot contain dots)"""
+    answered = {'$ne': ['$status', 'skipped']}
+    group = {
+        '_id': '$song_id',
+        'answered': {'$sum': {'$cond': [answered, 1, 0]}},
+        'skipped': {'$sum': {'$cond': [answered, 0, 1]}},
+    }
+    for question, answers in ROLLUP_ANSWERS.items():
+        for position, answer in enumerate(answers):
+            matches = {'$and': [answered, {'$eq': [f"${question}", answer]}]}
+            group[f"{question}__{position}"] = {'$sum': {'$cond': [matches, 1, 0]}}
+    return [{'$group': group}]
+
+
+def _nested(flat: Dict[str, Any]) -> Dict[str, Any]:
+    """Aggregation row -> rollup document body, without zero counters (as $inc leaves them)"""
+    rollup = {}
+    for key in ('answered', 'skipped'):
+        if flat.get(key):
+            rollup[key] = flat[key]
+    for question, answers in ROLLUP_ANSWERS.items():
+        counts = {answer: flat.get(f"{question}__{position}", 0) for position, answer in enumerate(answers)}
+        counts = {answer: count for answer, count in counts.items() if count}
+        if counts:
+            rollup[question] = counts
+    return rollup
+
+
+def _normalized(rollup: Dict[str, Any]) -> Dict[str, Any]:
+    """Stored rollup without zero counters, so it compares equal to a freshly computed one"""
+    normalized = {}
+    for key in ('answered', 'skipped'):
+        if rollup.get(key):
+            normalized[key] = rollup[key]
+    for question in ROLLUP_ANSWERS:
+        counts = {answer: count for answer, count in (rollup.get(question) or {}).items() if count}
+        if counts:
+            normalized[question] = counts
+    return normalized
+
+
+def bootstrap_label_rollups(db) -> bool:
+    """Build the rollups when there are none yet but responses exist (deployments predating them).
+
+    True if they were built.
+    """
+    if get_rollups_collection(db).find_one({}, {'_id': 1}) is not None:
+        return False
+    if db[os.getenv('RESPONSES_COLLECTION', 'user_responses')].find_one({}, {'_id': 1}) is None:
+        return False
+    rebuild_label_rollups(db)
+    return True
+
+
+def rebuild_label_rollups(db, dry_run=False) -> Dict[str, Any]:
+    """Recompute rollups from user_responses and repair any drift.
+
+    Returns a summary with the number of songs checked and the rollups that
+    differed from the raw data. With dry_run=True nothing is written.
+    """
+    responses_collection = db[os.getenv('RESPONSES_COLLECTION', 'user_responses')]
+    actual = {
+        doc['_id']: _nested(doc)
+        for doc in responses_collection.aggregate(_rollup_pipeline(), allowDiskUse=True)
+    }
+    stored = {song_id: _normalized(rollup) for song_id, rollup in get_label_rollups(db).items()}
+
+    drift = {}
+    for song_id in set(actual) | set(stored):
+        expected = actual.get(song_id, {})
+        found = stored.get(song_id, {})
+        if expected != found:
+            drift[song_id] = {'expected': expected, 'stored': found}
+
+    if drift and not dry_run:
+        now = datetime.now()
+        operations = [
+            ReplaceOne({'_id': song_id}, {**values['expected'], 'updated_at': now}, upsert=True)
+            for song_id, values in drift.items()
+        ]
+        get_rollups_collection(db).bulk_write(operations, ordered=False)
+
+    return {
+        'songs_checked': len(set(actual) | set(stored)),
+        'drifted': len(drift),
+        'drift': drift,
+        'repaired': bool(drift) and not dry_run
+    }
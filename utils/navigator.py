@@ -0,0 +1,132 @@
+import re
+import threading
+import unicodedata
+import weakref
+from bisect import bisect_left
+from collections import defaultdict
+from typing import List, Sequence, Optional
+
+TITLE_MAX_CHARS = 25
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize(text) -> str:
+    """Lowercase and strip accents so 'Canción' matches 'cancion'"""
+    decomposed = unicodedata.normalize('NFKD', str(text or ''))
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def short_title(title) -> str:
+    title = str(title or '')
+    if len(title) > TITLE_MAX_CHARS:
+        title = title[:TITLE_MAX_CHARS] + "..."
+    return title
+
+
+class SongSearchIndex:
+    """Inverted index over title and artist tokens with prefix lookup.
+
+    Tokens are kept sorted, so every token starting with a prefix is a
+    contiguous range found with bisect; each token maps to the catalog slots
+    of the songs containing it.
+    """
+
+    def __init__(self, songs: Sequence):
+        postings = defaultdict(list)
+        for slot, song in enumerate(songs):
+            text = f"{song.get('title_songs_new', '')} {song.get('artist', '')}"
+            for token in set(tokenize(text)):
+                postings[token].append(slot)
+        self._tokens = sorted(postings)
+        self._postings = [postings[token] for token in self._tokens]
+        # Truncated titles are computed once per catalog version, not on every rerun
+        self.short_titles = tuple(short_title(song.get('title_songs_new')) for song in songs)
+
+    def _prefix_slots(self, prefix) -> set:
+        slots = set()
+        i = bisect_left(self._tokens, prefix)
+        while i < len(self._tokens) and self._tokens[i].startswith(prefix):
+            slots.update(self._postings[i])
+            i += 1
+        return slots
+
+    def search(self, query) -> List[int]:
+        """Catalog slots whose title/artist contain every query word as a prefix"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # Most selective term first keeps the intersection small
+        candidate_sets = sorted((self._prefix_slots(term) for term in terms), key=len)
+        result = candidate_sets[0]
+        for slots in candidate_sets[1:]:
+            if not result:
+                break
+            result = result & slots
+        return sorted(result)
+
+
+_indexes = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(catalog) -> SongSearchIndex:
+    """Search index for a catalog snapshot, built once and shared by every session"""
+    index = _indexes.get(catalog)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(catalog)
+            if index is None:
+                index = SongSearchIndex(catalog.songs)
+                _indexes[catalog] = index
+    return index
+
+
+class SongNavigator:
+    """Sidebar navigation over a session's song order: labels, pages and search.
+
+    Holds no per-song state of its own: titles come from the catalog's search
+    index and positions from the session's SessionSongs.
+    """
+
+    def __init__(self, songs, page_size=50):
+        self.catalog = songs.catalog
+        self.index = get_search_index(self.catalog)
+        self.songs = songs
+        self.page_size = max(1, page_size)
+
+    def title(self, position) -> str:
+        """"i. title" label of a position, before the status prefix"""
+        return f"{position + 1}. {self.index.short_titles[self.songs.slot(position)]}"
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-len(self.songs) // self.page_size))
+
+    def page_of(self, position) -> int:
+        return position // self.page_size + 1
+
+    def page(self, page_number) -> range:
+        start = (page_number - 1) * self.page_size
+        return range(start, min(start + self.page_size, len(self.songs)))
+
+    def search(self, query, limit: Optional[int] = None) -> List[int]:
+        """Session positions of the songs matching the query, in session order"""
+        positions = []
+        for slot in self.index.search(query):
+            position = self.songs.position_of_slot(slot)
+            if position is not None:
+                positions.append(position)
+        positions.sort()
+        return positions if limit is None else positions[:limit]
+
+    def label(self, position, progress) -> str:
+        if progress.is_completed(position):
+            return "✅ " + self.title(position)
+        if progress.is_skipped(position):
+            return "⏭️ " + self.title(position)
+        return self.title(position)
@@ -0,0 +1,131 @@
+import os
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_password(password: bytes, rounds: int) -> bytes:
+    import bcrypt
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _check_password(password: bytes, hashed: bytes) -> bool:
+    import bcrypt
+    try:
+        return bcrypt.checkpw(password, hashed)
+    except Exception:
+        return False
+
+
+def hash_cost(hashed: bytes) -> Optional[int]:
+    """Cost factor encoded in a bcrypt hash ($2b$<cost>$...), or None if unreadable"""
+    try:
+        return int(hashed.split(b"$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class HasherBusy(RuntimeError):
+    """The worker pool did not finish a hash within BCRYPT_TIMEOUT_SECONDS (backlog too long)"""
+
+
+class PasswordHasher:
+    """Run bcrypt in a bounded process pool so a login burst cannot starve the script threads.
+
+    BCRYPT_WORKERS=0 hashes in the calling thread (useful for tests and
+    single-user deployments).
+    """
+
+    def __init__(self, rounds=12, workers=2, timeout=30.0):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: never fork a process that is running Streamlit and pymongo threads
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._executor
+
+    def _run(self, fn, *args):
+        executor = self._get_executor()
+        if executor is None:
+            return fn(*args)
+        future = executor.submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except BrokenProcessPool:
+            self._disable_pool()
+            return fn(*args)
+        except FutureTimeoutError:
+            # Drop the job if it is still queued so the backlog does not grow further
+            future.cancel()
+            raise HasherBusy(f"bcrypt pool did not answer within {self.timeout}s")
+
+    def _disable_pool(self):
+        # Workers could not start (e.g. no importable __main__); stop using the pool
+        logger.warning("bcrypt worker pool is broken; hashing in the calling thread from now on")
+        with self._lock:
+            self._executor = None
+            self.workers = 0
+
+    def hash(self, password: str) -> bytes:
+        return self._run(_hash_password, password.encode("utf-8"), self.rounds)
+
+    def verify(self, password: str, hashed: bytes) -> bool:
+        return self._run(_check_password, password.encode("utf-8"), hashed)
+
+    def needs_rehash(self, hashed: bytes) -> bool:
+        """True when the stored hash uses a different cost factor than configured"""
+        return hash_cost(hashed) != self.rounds
+
+    def warm_up(self):
+        """Start every worker process now (each imports bcrypt) instead of on the first login"""
+        executor = self._get_executor()
+        if executor is None:
+            _check_password(b"", b"")
+            return
+        try:
+            futures = [executor.submit(_check_password, b"", b"") for _ in range(self.workers)]
+            for future in futures:
+                future.result(timeout=self.timeout)
+        except BrokenProcessPool:
+            self._disable_pool()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_hasher: Optional[PasswordHasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Get the process-wide password hasher"""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher(
+                    rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+                    workers=int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1)))),
+                    timeout=float(os.getenv("BCRYPT_TIMEOUT_SECONDS", "30"))
+                )
+    return _hasher
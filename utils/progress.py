@@ -0,0 +1,160 @@
+from array import array
+from typing import Optional, Dict, Callable
+
+UNVISITED = 0
+COMPLETED = 1
+SKIPPED = 2
+
+STATUS_CODES = {'completed': COMPLETED, 'skipped': SKIPPED}
+STATUS_NAMES = {COMPLETED: 'completed', SKIPPED: 'skipped'}
+
+
+class FenwickTree:
+    """Binary indexed tree over 0/1 flags: prefix counts and k-th set flag in O(log n)."""
+
+    __slots__ = ('_n', '_tree', '_top')
+
+    def __init__(self, n, fill=1):
+        self._n = n
+        tree = array('I', [0]) * (n + 1)
+        if fill:
+            # O(n) build: every node covers (i & -i) ones
+            for i in range(1, n + 1):
+                tree[i] = i & -i
+        self._tree = tree
+        top = 1
+        while top * 2 <= n:
+            top *= 2
+        self._top = top
+
+    def add(self, position, delta):
+        i = position + 1
+        tree = self._tree
+        while i <= self._n:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, position) -> int:
+        """Number of set flags in [0, position]"""
+        i = min(position + 1, self._n)
+        total = 0
+        tree = self._tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def total(self) -> int:
+        return self.prefix(self._n - 1) if self._n else 0
+
+    def find_kth(self, k) -> Optional[int]:
+        """Position of the k-th set flag (1-based k), or None"""
+        if k <= 0:
+            return None
+        pos = 0
+        step = self._top
+        tree = self._tree
+        while step:
+            nxt = pos + step
+            if nxt <= self._n and tree[nxt] < k:
+                pos = nxt
+                k -= tree[nxt]
+            step //= 2
+        return pos if pos < self._n else None
+
+
+class ProgressTracker:
+    """Completed/skipped state of a session's songs, keyed by song id.
+
+    Status is one byte per song; a Fenwick tree over unvisited songs answers
+    "next unvisited after the current one" in O(log n), and the counters are
+    updated on every change so statistics are O(1). Song ids are resolved to
+    positions with position_of (SessionSongs.position_of in the app).
+    """
+
+    __slots__ = ('_position_of', '_status', '_unvisited', 'total', 'completed', 'skipped')
+
+    def __init__(self, total, position_of: Optional[Callable[[str], Optional[int]]] = None):
+        self._position_of = position_of or (lambda song_id: None)
+        self._status = bytearray(total)
+        self._unvisited = FenwickTree(total)
+        self.total = total
+        self.completed = 0
+        self.skipped = 0
+
+    def _set(self, position, code):
+        previous = self._status[position]
+        if previous == code:
+            return
+        if previous == UNVISITED:
+            self._unvisited.add(position, -1)
+        elif previous == COMPLETED:
+            self.completed -= 1
+        else:
+            self.skipped -= 1
+
+        if code == UNVISITED:
+            self._unvisited.add(position, 1)
+        elif code == COMPLETED:
+            self.completed += 1
+        else:
+            self.skipped += 1
+        self._status[position] = code
+
+    def mark(self, position, action='completed'):
+        """Mark a position as completed/skipped; the latest action wins, as in the database"""
+        if 0 <= position < self.total and action in STATUS_CODES:
+            self._set(position, STATUS_CODES[action])
+
+    def unmark(self, position):
+        if 0 <= position < self.total:
+            self._set(position, UNVISITED)
+
+    def position_of(self, song_id) -> Optional[int]:
+        return self._position_of(song_id)
+
+    def mark_song(self, song_id, action='completed') -> bool:
+        position = self._position_of(song_id)
+        if position is None:
+            return False
+        self.mark(position, action)
+        return True
+
+    def status(self, position) -> Optional[str]:
+        return STATUS_NAMES.get(self._status[position])
+
+    def status_of(self, song_id) -> Optional[str]:
+        position = self._position_of(song_id)
+        return None if position is None else self.status(position)
+
+    def is_completed(self, position) -> bool:
+        return self._status[position] == COMPLETED
+
+    def is_skipped(self, position) -> bool:
+        return self._status[position] == SKIPPED
+
+    @property
+    def remaining(self) -> int:
+        return self.total - self.completed - self.skipped
+
+    def next_unvisited(self, current) -> Optional[int]:
+        """First unvisited position after current, wrapping to the start; never current itself"""
+        unvisited = self._unvisited
+        remaining = self.remaining
+        if remaining == 0:
+            return None
+        before = unvisited.prefix(current) if current >= 0 else 0
+        if before < remaining:
+            return unvisited.find_kth(before + 1)
+        first = unvisited.find_kth(1)
+        return None if first == current else first
+
+    def stats(self) -> Dict[str, float]:
+        total = self.total
+        return {
+            'total': total,
+            'completed': self.completed,
+            'skipped': self.skipped,
+            'remaining': self.remaining,
+            'progress_percentage': (self.completed / total * 100) if total > 0 else 0
+        }
@@ -0,0 +1,94 @@
+import os
+from datetime import datetime
+from typing import Dict, Any
+
+from pymongo import ReplaceOne, UpdateOne
+
+
+def get_counts_collection(db):
+    return db[os.getenv('COUNTS_COLLECTION', 'song_response_counts')]
+
+
+def increment_response_count(db, song_id, amount=1):
+    """Atomically bump the response counter of a song (called on first insert only)"""
+    get_counts_collection(db).update_one(
+        {'_id': song_id},
+        {'$inc': {'count': amount}, '$currentDate': {'updated_at': True}},
+        upsert=True
+    )
+
+
+def increment_response_counts(db, increments: Dict[str, int]):
+    """Bump several song counters in one unordered bulk_write"""
+    if not increments:
+        return
+    operations = [
+        UpdateOne(
+            {'_id': song_id},
+            {'$inc': {'count': amount}, '$currentDate': {'updated_at': True}},
+            upsert=True
+        )
+        for song_id, amount in increments.items()
+    ]
+    get_counts_collection(db).bulk_write(operations, ordered=False)
+
+
+def get_response_counts(db) -> Dict[str, int]:
+    """Read per-song response counters. Cost is O(#songs), independent of #responses."""
+    return {
+        doc['_id']: doc.get('count', 0)
+        for doc in get_counts_collection(db).find({}, {'count': 1})
+    }
+
+
+def bootstrap_response_counts(db) -> bool:
+    """Build the counters when there are none yet but responses exist (deployments predating them).
+
+    True if they were built.
+    """
+    if get_counts_collection(db).find_one({}, {'_id': 1}) is not None:
+        return False
+    if db[os.getenv('RESPONSES_COLLECTION', 'user_responses')].find_one({}, {'_id': 1}) is None:
+        return False
+    rebuild_response_counts(db)
+    return True
+
+
+def rebuild_response_counts(db, dry_run=False) -> Dict[str, Any]:
+    """Recompute counters from user_responses and repair any drift.
+
+    Returns a summary with the number of songs checked and the counters that
+    differed from the raw data. With dry_run=True nothing is written.
+    """
+    responses_collection = db[os.getenv('RESPONSES_COLLECTION', 'user_responses')]
+    counts_collection = get_counts_collection(db)
+
+    # Sorting on song_id first lets the server walk the song_id index instead of the collection
+    pipeline = [
+        {"$sort": {"song_id": 1}},
+        {"$group": {"_id": "$song_id", "count": {"$sum": 1}}}
+    ]
+    actual = {doc["_id"]: doc["count"] for doc in responses_collection.aggregate(pipeline, allowDiskUse=True)}
+    stored = get_response_counts(db)
+
+    drift = {}
+    for song_id in set(actual) | set(stored):
+        expected = actual.get(song_id, 0)
+        found = stored.get(song_id, 0)
+        if expected != found:
+            drift[song_id] = {'expected': expected, 'stored': found}
+
+    if drift and not dry_run:
+        now = datetime.now()
+        operations = [
+            ReplaceOne({'_id': song_id}, {'count': values['expected'], 'updated_at': now}, upsert=True)
+            for song_id, values in drift.items()
+        ]
+        counts_collection.bulk_write(operations, ordered=False)
+
+    return {
+        'songs_checked': len(set(actual) | set(stored)),
+        'drifted': len(drift),
+        'drift': drift,
+        'repaired': bool(drift) and not dry_run
+    }
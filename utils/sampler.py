@@ -0,0 +1,89 @@
+import os
+import random
+from typing import Optional, Sequence, List, Dict
+
+import numpy as np
+
+
+class Sampler:
+    """Order catalog positions given per-song weights (higher weight = earlier)."""
+
+    name = 'base'
+
+    def sample(self, weights: Sequence[float], k: Optional[int] = None, rng=None) -> List[int]:
+        raise NotImplementedError
+
+
+class AResSampler(Sampler):
+    """Efraimidis–Spirakis A-Res weighted sampling without replacement.
+
+    Each item gets the key u ** (1 / w) with u ~ U(0, 1); the items with the k
+    largest keys form a weighted sample and their key order is a weighted
+    random permutation. Keys are computed in log space (log(u) / w) with NumPy,
+    and top-k selection uses argpartition, so choosing k items is O(n + k log k).
+    """
+
+    name = 'ares'
+
+    def sample(self, weights, k=None, rng=None):
+        weights = np.asarray(weights, dtype=np.float64)
+        n = weights.shape[0]
+        if n == 0:
+            return []
+        rng = rng if rng is not None else np.random.default_rng()
+
+        # 1 - random() is in (0, 1], so log never sees 0
+        keys = np.log1p(-rng.random(n)) / weights
+
+        if k is None or k >= n:
+            order = np.argsort(-keys, kind='stable')
+        else:
+            top = np.argpartition(-keys, k - 1)[:k]
+            order = top[np.argsort(-keys[top], kind='stable')]
+        return order.tolist()
+
+
+class LegacySortSampler(Sampler):
+    """Previous heuristic: sort on random() / weight. Kept for comparison."""
+
+    name = 'legacy'
+
+    def sample(self, weights, k=None, rng=None):
+        rand = rng.random if rng is not None else random.random
+        order = sorted(range(len(weights)), key=lambda i: rand() / weights[i])
+        return order if k is None else order[:k]
+
+
+SAMPLERS: Dict[str, Sampler] = {
+    AResSampler.name: AResSampler(),
+    LegacySortSampler.name: LegacySortSampler(),
+}
+
+
+def register_sampler(sampler: Sampler):
+    SAMPLERS[sampler.name] = sampler
+
+
+def get_sampler(name: Optional[str] = None) -> Sampler:
+    """Get a sampler by name (defaults to SONG_SAMPLER, then 'ares')"""
+    name = name or os.getenv('SONG_SAMPLER', AResSampler.name)
+    try:
+        return SAMPLERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown song sampler: {name}")
+
+
+def get_session_song_limit() -> Optional[int]:
+    """Number of songs per session (MAX_SONGS_PER_SESSION), or None for the whole catalog"""
+    value = os.getenv('MAX_SONGS_PER_SESSION')
+    if not value:
+        return None
+    limit = int(value)
+    return limit if limit > 0 else None
+
+
+def response_weights(song_ids: Sequence[str], response_counts: Dict[str, int]) -> np.ndarray:
+    """Weight 1 / (responses + 1): songs with fewer answers are favoured"""
+    counts = np.fromiter((response_counts.get(song_id, 0) for song_id in song_ids),
+                         dtype=np.float64, count=len(song_ids))
+    return 1.0 / (counts + 1.0)
@@ -3,6 +3,9 @@ import uuid
 import json
 from datetime import datetime, timedelta
 
+from utils.catalog import SessionSongs
+from utils.progress import ProgressTracker
+
 class SessionManager:
     """Manage user session state and persistence"""
 
@@ -35,18 +38,16 @@ class SessionManager:
         if 'current_song_index' not in st.session_state:
             st.session_state.current_song_index = 0
 
-        if 'completed_songs' not in st.session_state:
-            st.session_state.completed_songs = set()
-
-        if 'skipped_songs' not in st.session_state:
-            st.session_state.skipped_songs = set()
-
-        # Study data
+        # Study data: this session's order over the shared catalog
         if 'songs_data' not in st.session_state:
-            st.session_state.songs_data = []
+            st.session_state.songs_data = SessionSongs.empty()
 
-        if 'song_id_to_index' not in st.session_state:
-            st.session_state.song_id_to_index = {}
+        # Completed/skipped state of the loaded songs (kept songs survive logout/reset)
+        if 'progress' not in st.session_state:
+            st.session_state.progress = ProgressTracker(
+                len(st.session_state.songs_data),
+                st.session_state.songs_data.position_of
+            )
 
         # Session metadata
         if 'session_start_time' not in st.session_state:
@@ -62,6 +63,10 @@ class SessionManager:
         if 'progress_synced' not in st.session_state:
             st.session_state.progress_synced = False
 
+        # Background writes not yet confirmed by the database
+        if 'pending_writes' not in st.session_state:
+            st.session_state.pending_writes = []
+
     @staticmethod
     def update_activity():
         """Update last activity timestamp"""
@@ -78,48 +83,20 @@ class SessionManager:
 
     @staticmethod
     def mark_song_completed(song_index, action='completed'):
-        """Mark a song as completed or skipped"""
-        if action == 'completed':
-            st.session_state.completed_songs.add(song_index)
-            # Remove from skipped if it was there
-            st.session_state.skipped_songs.discard(song_index)
-        elif action == 'skipped':
-            st.session_state.skipped_songs.add(song_index)
-            # Don't remove from completed in case user wants to revisit
+        """Mark a song as completed or skipped (the latest action wins, as in the database)"""
+        st.session_state.progress.mark(song_index, action)
 
     @staticmethod
     def get_progress_stats():
         """Get progress statistics"""
-        total_songs = len(st.session_state.songs_data)
-        completed = len(st.session_state.completed_songs)
-        skipped = len(st.session_state.skipped_songs)
-        remaining = total_songs - completed - skipped
-
-        return {
-            'total': total_songs,
-            'completed': completed,
-            'skipped': skipped,
-            'remaining': remaining,
-            'progress_percentage': (completed / total_songs * 100) if total_songs > 0 else 0
-        }
+        # Counters are maintained incrementally by the tracker: O(1)
+        return st.session_state.progress.stats()
 
     @staticmethod
     def get_next_song_index():
         """Get the next song that hasn't been completed or skipped"""
-        total_songs = len(st.session_state.songs_data)
-
-        # Start from current index + 1 and look forward
-        for i in range(st.session_state.current_song_index + 1, total_songs):
-            if i not in st.session_state.completed_songs and i not in st.session_state.skipped_songs:
-                return i
-
-        # If no forward songs found, look backward
-        for i in range(0, st.session_state.current_song_index):
-            if i not in st.session_state.completed_songs and i not in st.session_state.skipped_songs:
-                return i
-
-        # All songs completed or skipped
-        return None
+        # Forward from the current song, then wrapping to the start; O(log n)
+        return st.session_state.progress.next_unvisited(st.session_state.current_song_index)
 
     @staticmethod
     def navigate_to_song(song_index):
@@ -189,7 +166,7 @@ class SessionManager:
     @staticmethod
     def logout():
         """Log out the current user but keep loaded songs."""
-        keys_to_keep = ['songs_data', 'song_id_to_index']
+        keys_to_keep = ['songs_data']
         keys = list(st.session_state.keys())
         for key in keys:
             if key not in keys_to_keep:
@@ -197,23 +174,58 @@ class SessionManager:
         SessionManager.initialize_session()
 
     @staticmethod
-    def set_song_id_map(songs):
-        st.session_state.song_id_to_index = {str(song['_id']): idx for idx, song in enumerate(songs)}
+    def set_session_songs(songs):
+        """Install the session's song order and a fresh progress tracker for it"""
+        st.session_state.songs_data = songs
+        st.session_state.progress = ProgressTracker(len(songs), songs.position_of)
 
     @staticmethod
-    def sync_progress_from_db(responses):
-        """Mark completed/skipped based on past responses."""
-        for resp in responses:
-            song_id = resp.get('song_id')
-            status = resp.get('status') or 'completed'
-            idx = st.session_state.song_id_to_index.get(song_id)
-            if idx is None:
-                continue
-            if status == 'skipped':
-                st.session_state.skipped_songs.add(idx)
-            else:
-                st.session_state.completed_songs.add(idx)
+    def sync_progress_from_db(progress):
+        """Mark completed/skipped based on past (song_id, status) pairs.
+
+        progress is None when it could not be read; the session then stays
+        unsynced so the next rerun tries again. Returns whether it synced.
+        """
+        if progress is None:
+            return False
+        tracker = st.session_state.progress
+        for song_id, status in progress:
+            tracker.mark_song(song_id, 'skipped' if status == 'skipped' else 'completed')
         st.session_state.progress_synced = True
+        return True
+
+    @staticmethod
+    def track_pending_write(event_id, title, action, song_index=None):
+        """Remember a queued classification until the writer confirms it"""
+        st.session_state.pending_writes.append({
+            'event_id': event_id,
+            'title': title,
+            'action': action,
+            'song_index': song_index
+        })
+
+    @staticmethod
+    def refresh_pending_writes(status_fn):
+        """Split tracked writes into (pending, newly flushed, failed); only pending ones are kept"""
+        pending, flushed, failed = [], [], []
+        for item in st.session_state.pending_writes:
+            state = status_fn(item['event_id'])
+            if state == 'flushed':
+                flushed.append(item)
+            elif state == 'failed':
+                failed.append(item)
+            elif state is not None:
+                pending.append(item)
+        st.session_state.pending_writes = pending
+        return pending, flushed, failed
+
+    @staticmethod
+    def unmark_song(song_index):
+        """Undo an optimistic completed/skipped mark (e.g. the write failed)"""
+        if song_index is None:
+            return
+        st.session_state.progress.unmark(song_index)
+        st.session_state.study_completed = False
 
     @staticmethod
     def save_local_progress():
@@ -225,10 +237,9 @@ class SessionManager:
     @staticmethod
     def check_study_completion():
         """Check if the study is completed and update status"""
-        total_songs = len(st.session_state.songs_data)
-        completed_songs = len(st.session_state.completed_songs)
+        tracker = st.session_state.progress
 
-        if total_songs > 0 and completed_songs >= total_songs:
+        if tracker.total > 0 and tracker.completed >= tracker.total:
             st.session_state.study_completed = True
             return True
 
@@ -0,0 +1,400 @@
+import os
+import json
+import time
+import uuid
+import random
+import functools
+import logging
+import threading
+import multiprocessing
+import contextvars
+from bisect import bisect_left
+from typing import Dict, Any, Optional, Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Prometheus' default latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PHASE_METRIC = 'app_phase_duration_seconds'
+
+# Streamlit's st.stop()/st.rerun() unwind with these exceptions; the phase still ended normally
+CONTROL_FLOW_EXCEPTIONS = ('StopException', 'RerunException')
+
+# (trace id, sampled) of the rerun running in this thread/context
+_trace: contextvars.ContextVar = contextvars.ContextVar('telemetry_trace', default=None)
+
+
+def _env_flag(name, default) -> bool:
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics, seconds)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative, running = [], 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            running += n
+            cumulative.append((bound, running))
+        return {'buckets': cumulative, 'sum': total, 'count': count}
+
+
+def _format_bound(bound) -> str:
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: Dict[str, Any], **extra) -> str:
+    pairs = [f'{key}="{_escape(value)}"' for key, value in {**labels, **extra}.items()]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def histogram_lines(metric, description, series) -> List[str]:
+    """Exposition lines of a histogram; series yields (labels dict, Histogram.snapshot())"""
+    lines = [f"# HELP {metric} {description}", f"# TYPE {metric} histogram"]
+    for labels, snapshot in series:
+        for bound, count in snapshot['buckets']:
+            lines.append(f"{metric}_bucket{format_labels(labels, le=_format_bound(bound))} {count}")
+        lines.append(f"{metric}_sum{format_labels(labels)} {snapshot['sum']!r}")
+        lines.append(f"{metric}_count{format_labels(labels)} {snapshot['count']}")
+    return lines
+
+
+class SpanLog:
+    """Append-only JSONL file of sampled spans, one JSON object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, separators=(',', ':'), default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """Times a block; the duration feeds the phase histogram and, when sampled, the span log."""
+
+    __slots__ = ('_telemetry', 'name', 'attrs', '_started')
+
+    def __init__(self, telemetry, name, attrs):
+        self._telemetry = telemetry
+        self.name = name
+        self.attrs = attrs
+        self._started = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        error = exc_type is not None and exc_type.__name__ not in CONTROL_FLOW_EXCEPTIONS
+        self._telemetry.record(self.name, time.perf_counter() - self._started, self.attrs, error=error)
+        return False
+
+
+class RerunTrace:
+    """Marks one script rerun: picks the sampling decision and times the whole rerun.
+
+    Nested inside another rerun (a fragment during a full run) it is a plain
+    span of the enclosing trace.
+    """
+
+    __slots__ = ('_telemetry', '_span', '_token', '_hooks')
+
+    def __init__(self, telemetry, name):
+        self._telemetry = telemetry
+        self._span = Span(telemetry, name, None)
+        self._token = None
+        self._hooks = ()
+
+    def __enter__(self):
+        if _trace.get() is None:
+            sampled = random.random() < self._telemetry.sample_rate
+            self._token = _trace.set((uuid.uuid4().hex[:16] if sampled else None, sampled))
+            self._hooks = [hook(self._span.name) for hook in self._telemetry.rerun_hooks]
+            for hook in self._hooks:
+                hook.__enter__()
+        return self._span.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            return self._span.__exit__(exc_type, exc, tb)
+        finally:
+            for hook in reversed(self._hooks):
+                try:
+                    hook.__exit__(exc_type, exc, tb)
+                except Exception as e:
+                    logger.warning("Rerun hook failed: %s", e)
+            self._hooks = ()
+            if self._token is not None:
+                _trace.reset(self._token)
+                self._token = None
+
+
+class Telemetry:
+    """Per-phase latency histograms with Prometheus text export and sampled JSONL spans.
+
+    Histograms are always updated (a perf_counter pair, a bisect and a lock
+    per span); spans are written to the log only for sampled reruns, so with
+    TELEMETRY_SAMPLE_RATE=0 nothing touches the disk.
+    """
+
+    def __init__(self, enabled=True, sample_rate=0.0, span_log: Optional[SpanLog] = None,
+                 buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.span_log = span_log
+        self.buckets = buckets
+        self._histograms: Dict[str, Histogram] = {}
+        self._errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._collectors: List[Callable[[], List[str]]] = []
+        self.rerun_hooks: Tuple[Callable[[str], Any], ...] = ()
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attrs or None)
+
+    def rerun(self, name='rerun'):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return RerunTrace(self, name)
+
+    def _histogram(self, name) -> Histogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram(self.buckets))
+        return histogram
+
+    def record(self, name, seconds, attrs=None, error=False):
+        self._histogram(name).observe(seconds)
+        if error:
+            with self._lock:
+                self._errors[name] = self._errors.get(name, 0) + 1
+        if self.span_log is None:
+            return
+        trace = _trace.get()
+        if trace is None:
+            # Outside a rerun (e.g. a widget callback): sample the span on its own
+            if random.random() >= self.sample_rate:
+                return
+            trace = (uuid.uuid4().hex[:16], True)
+        if trace[1]:
+            record = {
+                'ts': time.time(),
+                'trace': trace[0],
+                'span': name,
+                'duration_ms': round(seconds * 1000, 3),
+            }
+            if error:
+                record['error'] = True
+            if attrs:
+                record['attrs'] = attrs
+            try:
+                self.span_log.write(record)
+            except OSError as e:
+                logger.warning("Could not write span log: %s", e)
+
+    def register_collector(self, collector: Callable[[], List[str]]):
+        """Add a callable returning extra exposition lines (with their # HELP/# TYPE headers)"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def register_rerun_hook(self, hook: Callable[[str], Any]):
+        """Add a factory called with the rerun name; the context manager it returns wraps each rerun"""
+        with self._lock:
+            self.rerun_hooks = self.rerun_hooks + (hook,)
+
+    def phase_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {name: histogram.snapshot() for name, histogram in sorted(histograms.items())}
+
+    def render_prometheus(self) -> str:
+        """Current metrics in the Prometheus text exposition format (version 0.0.4)"""
+        lines = histogram_lines(
+            PHASE_METRIC, "Time spent in each phase of a script rerun.",
+            (({'phase': phase}, snapshot) for phase, snapshot in self.phase_snapshot().items())
+        )
+
+        with self._lock:
+            errors = dict(self._errors)
+            collectors = list(self._collectors)
+        lines.append("# HELP app_phase_errors_total Phases that ended with an exception.")
+        lines.append("# TYPE app_phase_errors_total counter")
+        for phase, count in sorted(errors.items()):
+            lines.append(f'app_phase_errors_total{{phase="{_escape(phase)}"}} {count}')
+
+        for collector in collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                logger.warning("Metrics collector failed: %s", e)
+        return '\n'.join(lines) + '\n'
+
+
+def write_metrics_file(telemetry: Telemetry, path):
+    """Write the exposition text atomically (node_exporter textfile collector friendly)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(telemetry.render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def _serve_metrics(telemetry: Telemetry, host, port):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = telemetry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def _export_loop(telemetry: Telemetry, path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_metrics_file(telemetry, path)
+        except OSError as e:
+            logger.warning("Could not write metrics file %s: %s", path, e)
+
+
+_telemetry: Optional[Telemetry] = None
+_telemetry_lock = threading.Lock()
+_exporters_started = False
+
+
+def get_telemetry() -> Telemetry:
+    """Get the process-wide telemetry registry"""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                sample_rate = float(os.getenv('TELEMETRY_SAMPLE_RATE', '0'))
+                spans_path = os.getenv('TELEMETRY_SPANS_PATH', '.telemetry/spans.jsonl')
+                _telemetry = Telemetry(
+                    enabled=_env_flag('TELEMETRY_ENABLED', 'true'),
+                    sample_rate=sample_rate,
+                    span_log=SpanLog(spans_path) if sample_rate > 0 and spans_path else None
+                )
+    return _telemetry
+
+
+def start_telemetry_exporters() -> Tuple[bool, bool]:
+    """Start the HTTP endpoint (TELEMETRY_HTTP_PORT) and file export (TELEMETRY_METRICS_PATH) once"""
+    global _exporters_started
+    telemetry = get_telemetry()
+    if _exporters_started or not telemetry.enabled or multiprocessing.current_process().name != 'MainProcess':
+        return False, False
+    with _telemetry_lock:
+        if _exporters_started:
+            return False, False
+        _exporters_started = True
+
+    http_started = file_started = False
+    port = int(os.getenv('TELEMETRY_HTTP_PORT', '0'))
+    if port:
+        host = os.getenv('TELEMETRY_HTTP_HOST', '127.0.0.1')
+        try:
+            _serve_metrics(telemetry, host, port)
+            http_started = True
+        except OSError as e:
+            # Another process of the deployment may already own the port
+            logger.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+
+    path = os.getenv('TELEMETRY_METRICS_PATH')
+    if path:
+        interval = float(os.getenv('TELEMETRY_EXPORT_INTERVAL_SECONDS', '15'))
+        threading.Thread(target=_export_loop, args=(telemetry, path, interval),
+                         name="metrics-file", daemon=True).start()
+        file_started = True
+    return http_started, file_started
+
+
+def span(name, **attrs):
+    """Time a phase: `with span('sidebar'): ...`"""
+    return get_telemetry().span(name, **attrs)
+
+
+def rerun_trace(name='rerun'):
+    """Wrap a whole rerun; spans inside it share one trace id and sampling decision"""
+    return get_telemetry().rerun(name)
+
+
+def traced(name):
+    """Decorator form of rerun_trace, for functions Streamlit reruns on their own (fragments)"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with rerun_trace(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
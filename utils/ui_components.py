@@ -1,250 +1,123 @@
+import os
+import re
+import hashlib
+from functools import lru_cache
+from urllib.parse import quote
+
 import streamlit as st
 
+STYLESHEET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'styles.css')
+# Served by Streamlit's static file route (server.enableStaticServing) at app/static/<name>,
+# as text/css since the Starlette server (the floor in requirements.txt); older Tornado releases
+# sent text/plain with nosniff and browsers dropped it
+STYLESHEET_URL = 'app/static/styles.css'
+
+@lru_cache(maxsize=1)
+def get_stylesheet():
+    """Stylesheet text (comments and indentation stripped) and its content hash, read once per process"""
+    with open(STYLESHEET_PATH, encoding='utf-8') as f:
+        css = f.read()
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s*\n\s*', '\n', css).strip()
+    return css, hashlib.sha256(css.encode('utf-8')).hexdigest()[:12]
+
+def get_stylesheet_tag():
+    """Markup that applies the app stylesheet (CSS_DELIVERY=static links it, inline embeds it)"""
+    css, digest = get_stylesheet()
+    if os.getenv('CSS_DELIVERY', 'static').lower() == 'static':
+        # The hash in the URL lets the browser keep its cached copy until the file changes
+        return f'<link rel="stylesheet" href="{STYLESHEET_URL}?v={digest}">'
+    return f"<style>{css}</style>"
+
 def load_custom_css():
     """Load custom CSS styles"""
-    st.markdown("""
-    <style>
-    :root {
-        /* Force light palette */
-        --bg: #ffffff;
-        --bg2: #f8f9fa;
-        --text: #1f2328;
-        --muted: #525860;
-        --primary: #667eea;
-        --primary2: #764ba2;
-        --border: #e3e5e8;
-        --card-shadow: rgba(0,0,0,0.08);
-    }
-
-    .main > div { padding-top: 2rem; }
-
-    /* Header styling */
-    .main-header {
-        background: linear-gradient(90deg, var(--primary) 0%, var(--primary2) 100%);
-        padding: 1rem;
-        border-radius: 10px;
-        margin-bottom: 2rem;
-        color: white;
-        text-align: center;
-    }
-
-    /* Song card styling */
-    .song-card {
-        background: var(--bg2);
-        padding: 1.5rem;
-        border-radius: 10px;
-        border-left: 4px solid var(--primary);
-        margin-bottom: 1rem;
-        box-shadow: 0 2px 4px var(--card-shadow);
-    }
-
-    /* Compact song card styling */
-    .song-card-compact {
-        background: #f7f7fa;
-        padding: 0.3rem 0.8rem 0.3rem 0.8rem;
-        border-radius: 6px;
-        border-left: 3px solid #a78bfa;
-        margin-bottom: 0.3rem;
-        font-size: 0.93rem;
-        box-shadow: 0 1px 2px #eee;
-    }
-    .song-title-compact {
-        font-size: 1rem;
-        font-weight: 600;
-        margin-bottom: 0.05rem;
-        margin-top: 0.05rem;
-    }
-    .song-artist-compact {
-        font-size: 0.93rem;
-        color: #555;
-        margin-bottom: 0.05rem;
-    }
-    .song-meta-compact {
-        font-size: 0.85rem;
-        color: #888;
-        margin-bottom: 0.05rem;
-    }
-
-    /* Classification form styling */
-    .classification-form {
-        background: var(--bg);
-        padding: 1.5rem;
-        border-radius: 10px;
-        border: 1px solid var(--border);
-        margin-top: 1rem;
-    }
-    /* Ensure high-contrast text inside forms */
-    .stForm, .stForm p, .stForm label, .stForm span,
-    .stForm h1, .stForm h2, .stForm h3, .stForm h4, .stForm h5, .stForm h6,
-    .stForm .stMarkdown p {
-        color: var(--text) !important;
-    }
-    .stForm em, .stForm small { color: var(--muted) !important; }
-    /* Inputs */
-    .stTextArea textarea, .stNumberInput input, .stSelectbox div[data-baseweb="select"] { color: var(--text) !important; }
-
-    /* Input borders (text/password/number) */
-    div[data-baseweb="input"] {
-        background: var(--bg) !important;
-        border: 1px solid var(--border) !important;
-        border-radius: 8px !important;
-        transition: border-color 0.2s ease, box-shadow 0.2s ease;
-    }
-    div[data-baseweb="input"]:hover { border-color: var(--primary) !important; }
-    div[data-baseweb="input"]:focus-within {
-        border-color: var(--primary) !important;
-        box-shadow: 0 0 0 0.2rem rgba(102,126,234,0.18) !important;
-    }
-
-    /* Select borders */
-    div[data-baseweb="select"] > div {
-        background: var(--bg) !important;
-        border: 1px solid var(--border) !important;
-        border-radius: 8px !important;
-        transition: border-color 0.2s ease, box-shadow 0.2s ease;
-    }
-    div[data-baseweb="select"]:hover > div { border-color: var(--primary) !important; }
-    div[data-baseweb="select"]:focus-within > div {
-        border-color: var(--primary) !important;
-        box-shadow: 0 0 0 0.2rem rgba(102,126,234,0.18) !important;
-    }
-
-    /* Textarea border */
-    .stTextArea textarea {
-        background: var(--bg) !important;
-        border: 1px solid var(--border) !important;
-        border-radius: 8px !important;
-    }
-
-    /* Progress bar custom styling */
-    .stProgress > div > div > div {
-        background: linear-gradient(90deg, var(--primary) 0%, var(--primary2) 100%);
-    }
-
-    /* Button styling */
-    .stButton > button {
-        border-radius: 8px;
-        border: none;
-        font-weight: 600;
-        transition: all 0.3s ease;
-    }
-
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-    }
-
-    /* Primary button */
-    .stButton > button[kind="primary"] {
-        background: linear-gradient(45deg, #28a745, #20c997);
-    }
-
-    /* Secondary button */
-    .stButton > button[kind="secondary"] {
-        background: linear-gradient(45deg, #6c757d, #495057);
-    }
+    st.markdown(get_stylesheet_tag(), unsafe_allow_html=True)
 
-    /* Success message styling */
-    .stSuccess {
-        background: linear-gradient(45deg, #d4edda, #c3e6cb);
-        border-left: 4px solid #28a745;
-    }
-
-    /* Info message styling */
-    .stInfo {
-        background: linear-gradient(45deg, #cce7ff, #b3d9ff);
-        border-left: 4px solid #007bff;
-    }
-
-    /* Error message styling */
-    .stError {
-        background: linear-gradient(45deg, #f8d7da, #f5c6cb);
-        border-left: 4px solid #dc3545;
-    }
-
-    /* Sidebar styling */
-    .css-1d391kg, .stSidebarContent {
-        background: linear-gradient(180deg, var(--bg2) 0%, var(--bg) 100%);
-    }
-
-    /* Radio button styling */
-    .stRadio > div > label > div:first-child {
-        border: 2px solid var(--primary);
-    }
-
-    .stRadio > div > label > div:first-child[data-checked="true"] {
-        background: var(--primary);
-    }
-
-    /* Metric styling */
-    .metric-container {
-        background: var(--bg);
-        padding: 1rem;
-        border-radius: 8px;
-        border: 1px solid var(--border);
-        text-align: center;
-    }
-
-    /* Form styling */
-    .stForm {
-        background: var(--bg2);
-        padding: 1.5rem;
-        border-radius: 10px;
-        border: 1px solid var(--border);
-    }
-
-    /* Hide Streamlit branding */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    .stDeployButton {visibility: hidden;}
-
-    /* Responsive design */
-    @media (max-width: 768px) {
-    .main > div { padding-left: 1rem; padding-right: 1rem; }
-
-    .song-card { padding: 1rem; }
-
-    .classification-form { padding: 1rem; }
-    }
-    </style>
-    """, unsafe_allow_html=True)
-
-def render_song_info_card(song):
-    """Render compact song information card"""
-    st.markdown(f"""
-    <style>
-    .song-card-compact {{
-        background: #f7f7fa;
-        padding: 0.3rem 0.8rem 0.3rem 0.8rem;
-        border-radius: 6px;
-        border-left: 3px solid #a78bfa;
-        margin-bottom: 0.3rem;
-        font-size: 0.93rem;
-        box-shadow: 0 1px 2px #eee;
-    }}
-    .song-title-compact {{
-        font-size: 1rem;
-        font-weight: 600;
-        margin-bottom: 0.05rem;
-        margin-top: 0.05rem;
-    }}
-    .song-artist-compact {{
-        font-size: 0.93rem;
-        color: #555;
-        margin-bottom: 0.05rem;
-    }}
-    .song-meta-compact {{
-        font-size: 0.85rem;
-        color: #888;
-        margin-bottom: 0.05rem;
-    }}
-    </style>
+@lru_cache(maxsize=int(os.getenv('SONG_CARD_CACHE_SIZE', '4096')))
+def _song_card_html(song_id, title, artist, release_date):
+    year = f'<div class="song-meta-compact">Año: {release_date[:4]}</div>' if release_date else ''
+    return f"""
     <div class="song-card-compact">
-        <div class="song-title-compact">{song['title_songs_new']}</div>
-        <div class="song-artist-compact">{song['artist']}</div>
-        {f'<div class="song-meta-compact">Año: {song["release_date"][:4]}</div>' if song.get('release_date') else ''}
+        <div class="song-title-compact">{title}</div>
+        <div class="song-artist-compact">{artist}</div>
+        {year}
     </div>
-    """, unsafe_allow_html=True)
+    """
+
+def build_song_card_html(song):
+    """Build the compact song card markup (memoized per song id; styles live in the stylesheet)"""
+    return _song_card_html(
+        str(song['_id']), song['title_songs_new'], song['artist'], song.get('release_date')
+    )
+
+PLAYER_HEIGHT = 315
+
+# Thumbnail + play button; the YouTube iframe (and its player JavaScript) is only created on click
+_FACADE_TEMPLATE = """
+<style>
+html, body {{ margin: 0; height: 100%; background: #000; }}
+.yt-lite {{
+    position: relative; display: block; width: 100%; height: {height}px;
+    border: 0; padding: 0; cursor: pointer;
+    background: #000 url('https://i.ytimg.com/vi/{video_id}/hqdefault.jpg') center / cover no-repeat;
+}}
+.yt-lite svg {{ position: absolute; left: 50%; top: 50%; width: 68px; height: 48px; transform: translate(-50%, -50%); }}
+.yt-lite:hover svg path:first-child, .yt-lite:focus svg path:first-child {{ fill: #f00; }}
+</style>
+<button class="yt-lite" id="yt-lite" aria-label="Reproducir canción">
+    <svg viewBox="0 0 68 48"><path fill="#212121" fill-opacity="0.8" d="M66.5 7.7c-.8-2.9-2.5-5.4-5.4-6.2C55.8.1 34 0 34 0S12.2.1 6.9 1.6c-3 .7-4.6 3.2-5.4 6.1C.1 13 0 24 0 24s.1 11 1.5 16.3c.8 2.9 2.5 5.4 5.4 6.2C12.2 47.9 34 48 34 48s21.8-.1 27.1-1.6c3-.7 4.6-3.2 5.4-6.1C67.9 35 68 24 68 24s-.1-11-1.5-16.3z"/><path fill="#fff" d="M45 24 27 14v20"/></svg>
+</button>
+<script>
+(function () {{
+    var button = document.getElementById('yt-lite');
+    button.addEventListener('pointerover', function () {{
+        var hint = document.createElement('link');
+        hint.rel = 'preconnect';
+        hint.href = 'https://www.youtube.com';
+        document.head.appendChild(hint);
+    }}, {{ once: true }});
+    button.addEventListener('click', function () {{
+        var frame = document.createElement('iframe');
+        frame.width = '100%';
+        frame.height = '{height}';
+        frame.src = 'https://www.youtube.com/embed/{video_id}?autoplay=1';
+        frame.setAttribute('frameborder', '0');
+        frame.setAttribute('allow', 'accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture');
+        frame.setAttribute('allowfullscreen', '');
+        button.replaceWith(frame);
+    }});
+}})();
+</script>
+"""
+
+@lru_cache(maxsize=int(os.getenv('SONG_CARD_CACHE_SIZE', '4096')))
+def _player_html(video_id, mode):
+    if mode == 'iframe':
+        return f'''
+        <iframe width="100%" height="{PLAYER_HEIGHT}"
+            src="https://www.youtube.com/embed/{video_id}"
+            frameborder="0"
+            allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture"
+            allowfullscreen>
+        </iframe>
+        '''
+    return _FACADE_TEMPLATE.format(video_id=video_id, height=PLAYER_HEIGHT)
+
+def build_player_html(song):
+    """Build the YouTube player markup for a song (empty if it has no id_yt).
+
+    YT_PLAYER=facade (default) shows the thumbnail and loads the player on
+    click; YT_PLAYER=iframe embeds the player right away. The markup depends
+    only on the video id, so reruns send identical deltas and the frontend
+    keeps the existing player.
+    """
+    if not song.get('id_yt'):
+        return ""
+    return _player_html(quote(str(song['id_yt']), safe=''), os.getenv('YT_PLAYER', 'facade').lower())
+
+def render_song_info_card(song, card_html=None):
+    """Render compact song information card"""
+    st.markdown(card_html or build_song_card_html(song), unsafe_allow_html=True)
 
 def render_completion_animation():
     """Render completion animation"""
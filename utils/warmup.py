@@ -0,0 +1,116 @@
+import os
+import logging
+import multiprocessing
+import threading
+import time
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _import_modules():
+    # Heavy modules used after login (pymongo/bson, numpy, the write queue and navigator)
+    import utils.database  # noqa: F401
+    import utils.auth  # noqa: F401
+    import utils.write_queue  # noqa: F401
+    import utils.navigator  # noqa: F401
+
+
+def _connect():
+    # Through the registry rather than DatabaseConnection: no Streamlit calls outside a script run
+    from utils.connection import ClientRegistry
+    from utils.indexes import ensure_derived_data_once, ensure_indexes_once
+    db = ClientRegistry.get_database()
+    db.command('ping')
+    ensure_indexes_once(db)
+    ensure_derived_data_once(db)
+
+
+def _first_probe():
+    from utils.health import get_health_monitor
+    get_health_monitor().wait_for_first_probe(timeout=float(os.getenv('HEALTH_INITIAL_WAIT_SECONDS', '5')))
+
+
+def _catalog():
+    from utils.connection import ClientRegistry
+    from utils.catalog import get_song_catalog
+    from utils.navigator import get_search_index
+    catalog = get_song_catalog(ClientRegistry.get_database())
+    get_search_index(catalog)
+
+
+def _password_workers():
+    from utils.passwords import get_password_hasher
+    get_password_hasher().warm_up()
+
+
+WARMUP_STEPS = (
+    ('imports', _import_modules),
+    ('database', _connect),
+    ('health_probe', _first_probe),
+    ('catalog', _catalog),
+    ('password_workers', _password_workers),
+)
+
+
+def warm_up() -> Dict[str, Any]:
+    """Run every warm-up step in order; returns seconds per step and the errors of failed steps.
+
+    A failed step is logged and skipped, so a database that is still down
+    never prevents the app from starting.
+    """
+    timings, errors = {}, {}
+    for name, step in WARMUP_STEPS:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            errors[name] = str(e)
+            logger.warning("Warm-up step %s failed: %s", name, e)
+        finally:
+            timings[name] = time.perf_counter() - started
+    return {'timings': timings, 'errors': errors}
+
+
+_status: Dict[str, Any] = {'state': 'idle', 'timings': {}, 'errors': {}}
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+def _run():
+    _status['state'] = 'running'
+    started = time.perf_counter()
+    result = warm_up()
+    _status.update(result)
+    _status['total'] = time.perf_counter() - started
+    _status['state'] = 'done'
+    logger.info("Warm-up finished in %.2fs: %s", _status['total'], result['timings'])
+
+
+def start_warmup() -> bool:
+    """Warm up this process in a background thread, once (PREWARM_ON_START). True if started now."""
+    global _thread
+    # bcrypt workers are spawned processes that re-import the app as __mp_main__: only the server warms up
+    if multiprocessing.current_process().name != 'MainProcess':
+        return False
+    if _thread is not None or os.getenv('PREWARM_ON_START', 'true').lower() not in ('1', 'true', 'yes'):
+        return False
+    with _lock:
+        if _thread is not None:
+            return False
+        _thread = threading.Thread(target=_run, name="warmup", daemon=True)
+        _thread.start()
+    return True
+
+
+def wait_for_warmup(timeout: Optional[float] = None) -> bool:
+    """Block until the background warm-up is done (False on timeout or if it never started)"""
+    thread = _thread
+    if thread is None:
+        return False
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def get_warmup_status() -> Dict[str, Any]:
+    return dict(_status)
@@ -0,0 +1,359 @@
+import os
+import logging
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from bson import json_util
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, one process per journal is up to the operator
+    fcntl = None
+
+from utils.connection import ClientRegistry
+from utils.database import build_response_document, progress_cache, record_progress, ResponseBatcher
+from utils.health import CONNECTION_ERRORS, get_circuit_breaker
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+RETRYING = 'retrying'
+FLUSHED = 'flushed'
+FAILED = 'failed'
+
+
+class ClassificationJournal:
+    """Append-only JSONL journal; an event is durable before it is queued for Mongo.
+
+    Each line is either {"op": "event", "id", "doc"} or {"op": "ack", "id"}.
+    Events without an ack are replayed when the process starts again. Events
+    that fail permanently are acked and copied to a dead-letter file next to
+    the journal (<name>.failed.jsonl) for manual inspection.
+    """
+
+    def __init__(self, path, fsync=True, compact_bytes=1_000_000):
+        self.path = path
+        self.fsync = fsync
+        self.compact_bytes = compact_bytes
+        root, ext = os.path.splitext(path)
+        self.dead_letter_path = f"{root}.failed{ext}"
+        self._lock = threading.Lock()
+        self._lock_file = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def try_lock(self) -> bool:
+        """Take an exclusive lock on <path>.lock for the life of the process; False if another process holds it"""
+        if fcntl is None:
+            return True
+        lock_file = open(f"{self.path}.lock", 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    @classmethod
+    def claim(cls, path, max_slots=64, **kwargs) -> 'ClassificationJournal':
+        """First journal slot (path, then <name>.1.jsonl, ...) no other process has locked.
+
+        Processes started from the same directory each get their own file, and
+        a restarted process takes over (and replays) a slot left by one that
+        crashed.
+        """
+        root, ext = os.path.splitext(path)
+        for slot in range(max_slots):
+            journal = cls(path if slot == 0 else f"{root}.{slot}{ext}", **kwargs)
+            if journal.try_lock():
+                return journal
+        raise RuntimeError(f"Every journal slot of {path} is locked by another process")
+
+    def _append_lines(self, records):
+        lines = ''.join(json_util.dumps(record) + '\n' for record in records)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as fh:
+                fh.write(lines)
+                fh.flush()
+                if self.fsync:
+                    os.fsync(fh.fileno())
+
+    def append_event(self, event_id, doc):
+        self._append_lines([{'op': 'event', 'id': event_id, 'doc': doc}])
+
+    def append_acks(self, event_ids):
+        """Acknowledge several flushed events with a single write + fsync"""
+        if event_ids:
+            self._append_lines([{'op': 'ack', 'id': event_id} for event_id in event_ids])
+
+    def dead_letter(self, record, error):
+        """Move a permanently failed event out of the journal so no replay writes it again"""
+        line = json_util.dumps({**record, 'error': error, 'failed_at': datetime.now()}) + '\n'
+        with self._lock:
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as fh:
+                fh.write(line)
+                fh.flush()
+                if self.fsync:
+                    os.fsync(fh.fileno())
+        self.append_acks([record['id']])
+
+    def replay(self) -> List[Dict[str, Any]]:
+        """Return un-acked events in journal order"""
+        if not os.path.exists(self.path):
+            return []
+
+        events: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            raw = ''
+            with open(self.path, 'r', encoding='utf-8') as fh:
+                for raw in fh:
+                    line = raw.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json_util.loads(line)
+                    except ValueError:
+                        # Torn last line after a crash
+                        logger.warning("Skipping unreadable journal line in %s", self.path)
+                        continue
+                    if record.get('op') == 'event':
+                        events[record['id']] = record
+                    elif record.get('op') == 'ack':
+                        events.pop(record['id'], None)
+            if raw and not raw.endswith('\n'):
+                # End the torn line, or the next ack would be appended to it and lost
+                with open(self.path, 'a', encoding='utf-8') as fh:
+                    fh.write('\n')
+        return list(events.values())
+
+    def compact(self):
+        """Truncate the journal once it is large; callers guarantee every event is acked"""
+        with self._lock:
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.compact_bytes:
+                open(self.path, 'w').close()
+
+
+class ClassificationWriter:
+    """Background writer: journal first, then flush to Mongo in batches with retry and backoff."""
+
+    def __init__(self, journal: ClassificationJournal, batcher: Optional[ResponseBatcher] = None,
+                 backoff_base=0.5, backoff_max=30.0, max_item_attempts=5, max_tracked=10000):
+        self.journal = journal
+        self.batcher = batcher or ResponseBatcher()
+        self.max_item_attempts = max_item_attempts
+        self.max_tracked = max_tracked
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Events taken off the queue and not yet flushed (in the batch or waiting for a retry)
+        self._in_flight: Dict[str, Dict[str, Any]] = {}
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            # Resume events that were journaled but never acknowledged
+            for record in self.journal.replay():
+                self._status[record['id']] = {'state': PENDING, 'attempts': 0, 'error': None}
+                self._queue.put(record)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="classification-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, response_document) -> str:
+        """Journal and enqueue a response document; returns its event id"""
+        event_id = uuid.uuid4().hex
+        # Held across journal + queue so compaction never drops a journaled, unqueued event
+        with self._lock:
+            self.journal.append_event(event_id, response_document)
+            self._status[event_id] = {'state': PENDING, 'attempts': 0, 'error': None}
+            self._queue.put({'op': 'event', 'id': event_id, 'doc': response_document})
+            self._prune_status()
+        return event_id
+
+    def status(self, event_id) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            status = self._status.get(event_id)
+            return dict(status) if status else None
+
+    def pending_count(self) -> int:
+        return self._queue.qsize() + len(self._in_flight)
+
+    def _prune_status(self):
+        # Forget the oldest flushed events; pending ones are always kept
+        if len(self._status) <= self.max_tracked:
+            return
+        for event_id in [eid for eid, status in self._status.items() if status['state'] == FLUSHED]:
+            del self._status[event_id]
+            if len(self._status) <= self.max_tracked // 2:
+                break
+
+    def _maybe_compact(self):
+        # Nothing queued or in flight: every journaled event is acked (or dead-lettered)
+        with self._lock:
+            if self._queue.unfinished_tasks == 0:
+                self.journal.compact()
+
+    def _set_status(self, event_id, **fields):
+        with self._lock:
+            self._status.setdefault(event_id, {'state': PENDING, 'attempts': 0, 'error': None}).update(fields)
+
+    def _flush_batch(self) -> bool:
+        """Flush the current batch; returns False when it (or part of it) must be retried"""
+        breaker = get_circuit_breaker()
+        if not breaker.allow_request():
+            return False
+
+        db = ClientRegistry.get_database()
+        try:
+            results = self.batcher.flush(db)
+        except Exception as e:
+            breaker.record_error(e)
+            exhausted = False
+            for event_id in self._in_flight:
+                attempts = self._status.get(event_id, {}).get('attempts', 0) + 1
+                self._set_status(event_id, state=RETRYING, attempts=attempts, error=str(e))
+                exhausted = exhausted or attempts >= self.max_item_attempts
+            logger.warning("Classification batch of %s failed: %s", len(self._in_flight), e)
+            if isinstance(e, CONNECTION_ERRORS) or not exhausted:
+                return False
+            # The batch keeps failing while the server is reachable (e.g. DocumentTooLarge or
+            # InvalidDocument from one item): write the items one by one to isolate it
+            results = self._flush_one_by_one(db)
+        else:
+            breaker.record_success()
+
+        flushed, retry = [], []
+        for event_id, error in results.items():
+            record = self._in_flight.pop(event_id)
+            attempts = self._status.get(event_id, {}).get('attempts', 0) + 1
+            if error is None:
+                flushed.append(event_id)
+                self._set_status(event_id, state=FLUSHED, attempts=attempts, error=None)
+            elif attempts >= self.max_item_attempts:
+                logger.error("Classification write %s failed permanently: %s", event_id, error)
+                # The cache already shows this song as answered: drop it so a resume reads Mongo
+                progress_cache.invalidate(record['doc']['user_id'])
+                self.journal.dead_letter(record, error)
+                self._set_status(event_id, state=FAILED, attempts=attempts, error=error)
+                self._queue.task_done()
+            else:
+                self._set_status(event_id, state=RETRYING, attempts=attempts, error=error)
+                retry.append(record)
+
+        self.journal.append_acks(flushed)
+        for _ in flushed:
+            self._queue.task_done()
+        for record in retry:
+            self._in_flight[record['id']] = record
+            self.batcher.add(record['id'], record['doc'])
+
+        self._maybe_compact()
+        return not self._in_flight
+
+    def _flush_one_by_one(self, db) -> Dict[str, Optional[str]]:
+        """Write every in-flight event in its own bulk write; returns {event_id: None | error}.
+
+        Stops at a connection error: the events not written yet go back into
+        the batch for the regular retry.
+        """
+        self.batcher.clear()
+        results = {}
+        records = list(self._in_flight.values())
+        for position, record in enumerate(records):
+            single = ResponseBatcher(max_batch=1, metrics=self.batcher.metrics)
+            single.add(record['id'], record['doc'])
+            try:
+                results.update(single.flush(db))
+            except CONNECTION_ERRORS:
+                for pending in records[position:]:
+                    self.batcher.add(pending['id'], pending['doc'])
+                break
+            except Exception as e:
+                results[record['id']] = str(e)
+        return results
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            timeout = self.batcher.time_until_due() if self.batcher.pending else 1.0
+            try:
+                record = self._queue.get(timeout=timeout)
+                self._in_flight[record['id']] = record
+                self.batcher.add(record['id'], record['doc'])
+            except queue.Empty:
+                pass
+
+            if self.batcher.pending and (self.batcher.full or self.batcher.due):
+                if self._flush_batch():
+                    failures = 0
+                else:
+                    failures += 1
+                    self._stop.wait(min(self.backoff_max, self.backoff_base * (2 ** (failures - 1))))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued event has been written (tests, shutdown)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+
+_writer: Optional[ClassificationWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_classification_writer() -> ClassificationWriter:
+    """Get the process-wide classification writer, starting it on first use"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                journal = ClassificationJournal.claim(
+                    os.getenv('JOURNAL_PATH', os.path.join('.journal', 'classifications.jsonl')),
+                    fsync=os.getenv('JOURNAL_FSYNC', 'true').lower() in ('1', 'true', 'yes'),
+                    compact_bytes=int(os.getenv('JOURNAL_COMPACT_BYTES', '1000000'))
+                )
+                batcher = ResponseBatcher(
+                    max_batch=int(os.getenv('BULK_WRITE_MAX_BATCH', '100')),
+                    window_ms=float(os.getenv('BULK_WRITE_WINDOW_MS', '50'))
+                )
+                writer = ClassificationWriter(
+                    journal,
+                    batcher=batcher,
+                    max_item_attempts=int(os.getenv('WRITE_MAX_ITEM_ATTEMPTS', '5')),
+                    backoff_base=float(os.getenv('WRITE_RETRY_BACKOFF_SECONDS', '0.5')),
+                    backoff_max=float(os.getenv('WRITE_RETRY_BACKOFF_MAX_SECONDS', '30'))
+                )
+                writer.start()
+                _writer = writer
+    return _writer
+
+
+def enqueue_classification(user_data, song_data, classification_data) -> str:
+    """Queue a classification for background persistence; returns the event id"""
+    response_document = build_response_document(user_data, song_data, classification_data)
+    event_id = get_classification_writer().submit(response_document)
+    # The journal makes the write durable, so the cached progress can reflect it right away
+    record_progress(response_document)
+    return event_id
+
+
+def get_write_status(event_id) -> Optional[str]:
+    status = get_classification_writer().status(event_id)
+    return status['state'] if status else None